@@ -0,0 +1,113 @@
+import calendar
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from api.models.arrow_schema import BASIN_MEASURE_COLUMNS
+
+GRANULARITIES = ("week", "month", "year")
+DEFAULT_METRIC = "ena_bruta_bacia_mwmed"
+PERIOD_COLUMN = "period_start"
+# Partial aggregates kept per measure in a summary; they can be merged across summaries
+_PARTIALS = {"count": "sum", "min": "min", "max": "max", "sum": "sum"}
+
+
+def validate_aggregation(granularity: str, metric: str) -> None:
+    """
+    Raises:
+        ValueError: If the granularity or the metric is not supported.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}.")
+    if metric not in BASIN_MEASURE_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}'. Use one of: {', '.join(BASIN_MEASURE_COLUMNS)}.")
+
+
+def period_start(day: date, granularity: str) -> date:
+    """First day of the period holding `day`; weeks start on Monday."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def period_end(day: date, granularity: str) -> date:
+    """Last day of the period holding `day`."""
+    start = period_start(day, granularity)
+    if granularity == "week":
+        return start + timedelta(days=6)
+    if granularity == "month":
+        return start.replace(day=calendar.monthrange(start.year, start.month)[1])
+    return start.replace(month=12, day=31)
+
+
+def expand_to_periods(start_date: date, end_date: date, granularity: str) -> tuple[date, date]:
+    """
+    Widens a date range to whole periods, so every period reported is aggregated over
+    all of its days and can be served from a precomputed summary.
+    """
+    return period_start(start_date, granularity), period_end(end_date, granularity)
+
+
+def summarize(table: pa.Table, granularity: str) -> pa.Table:
+    """
+    Per (nom_bacia, period_start) partial aggregates of every measure: the count of
+    non-null values, min, max and sum, in columns named `<measure>_<aggregate>`.
+    """
+    periods = pc.floor_temporal(table.column("ena_data"), unit=granularity, week_starts_monday=True)
+    basins = table.column("nom_bacia")
+    if pa.types.is_dictionary(basins.type):
+        basins = basins.cast(basins.type.value_type)
+    keyed = pa.table({"nom_bacia": basins, PERIOD_COLUMN: periods,
+                      **{measure: table.column(measure) for measure in BASIN_MEASURE_COLUMNS}})
+    summary = keyed.group_by(["nom_bacia", PERIOD_COLUMN], use_threads=False).aggregate(
+        [(measure, aggregate) for measure in BASIN_MEASURE_COLUMNS for aggregate in _PARTIALS]
+    )
+    return _sorted(summary)
+
+
+def merge_summaries(summaries: Iterable[pa.Table]) -> pa.Table:
+    """
+    Combines partial aggregates of the same periods, e.g. a week split across the
+    summaries of two years: counts and sums are added, minima and maxima compared.
+    """
+    combined = pa.concat_tables(list(summaries))
+    merged = combined.group_by(["nom_bacia", PERIOD_COLUMN], use_threads=False).aggregate(
+        [(f"{measure}_{aggregate}", combine)
+         for measure in BASIN_MEASURE_COLUMNS for aggregate, combine in _PARTIALS.items()]
+    )
+    # group_by suffixes the combined columns again, e.g. x_count_sum -> x_count
+    renamed = [name.rsplit("_", 1)[0] if name not in ("nom_bacia", PERIOD_COLUMN) else name
+               for name in merged.column_names]
+    return _sorted(merged.rename_columns(renamed))
+
+
+def to_aggregates(summary: pa.Table, metric: str, start_date: Optional[date] = None,
+                  end_date: Optional[date] = None) -> pa.Table:
+    """
+    Final aggregates of one metric: nom_bacia, period_start, count, min, max, mean and
+    sum. When a range is given, only the periods starting within it are kept.
+    """
+    if start_date is not None and end_date is not None:
+        periods = summary.column(PERIOD_COLUMN)
+        summary = summary.filter(pc.and_(pc.greater_equal(periods, pa.scalar(start_date, pa.date32())),
+                                         pc.less_equal(periods, pa.scalar(end_date, pa.date32()))))
+    count, total = summary.column(f"{metric}_count"), summary.column(f"{metric}_sum")
+    # Periods without any value keep a null mean instead of dividing by zero
+    mean = pc.divide(total, pc.if_else(pc.equal(count, 0), None, count).cast(pa.float64()))
+    return pa.table({
+        "nom_bacia": summary.column("nom_bacia"),
+        PERIOD_COLUMN: summary.column(PERIOD_COLUMN),
+        "count": count,
+        "min": summary.column(f"{metric}_min"),
+        "max": summary.column(f"{metric}_max"),
+        "mean": mean,
+        "sum": total,
+    })
+
+
+def _sorted(summary: pa.Table) -> pa.Table:
+    return summary.sort_by([(PERIOD_COLUMN, "ascending"), ("nom_bacia", "ascending")])
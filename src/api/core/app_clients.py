@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+import pyarrow.fs as pafs
+from google.cloud import bigquery, storage
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HTTP_TIMEOUT_SECONDS = 40
+DEFAULT_HTTP_MAX_CONNECTIONS = 20
+DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+# Same as the requests default, used by the Google API clients
+DEFAULT_GCP_HTTP_POOL_SIZE = 10
+
+
+class AppClients:
+    """
+    Network clients shared by every request of the application: the httpx client used
+    for the ONS downloads, the Cloud Storage and BigQuery clients, and the Arrow GCS
+    filesystem. Each one is built on first use, so the application starts without
+    credentials, and then reused, so authentication, TLS handshakes and connection
+    pools are paid once. `close()` releases them when the application shuts down.
+    """
+
+    def __init__(self, http_timeout: float = DEFAULT_HTTP_TIMEOUT_SECONDS,
+                 http_max_connections: int = DEFAULT_HTTP_MAX_CONNECTIONS,
+                 http_max_keepalive_connections: int = DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                 gcp_pool_size: int = DEFAULT_GCP_HTTP_POOL_SIZE,
+                 http_client: Optional[httpx.Client] = None,
+                 storage_client: Optional[storage.Client] = None,
+                 bigquery_client: Optional[bigquery.Client] = None,
+                 gcs_filesystem: Optional[pafs.FileSystem] = None):
+        """
+        Args:
+            http_timeout (float): Timeout in seconds of the ONS HTTP requests.
+            http_max_connections (int): Connection limit of the httpx pool.
+            http_max_keepalive_connections (int): Idle connections kept by the httpx pool.
+            gcp_pool_size (int): Connections per host of the Storage and BigQuery clients.
+            http_client, storage_client, bigquery_client, gcs_filesystem: Prebuilt
+                clients to use instead of building them, e.g. fakes in tests.
+        """
+        self.http_timeout = http_timeout
+        self.http_max_connections = http_max_connections
+        self.http_max_keepalive_connections = http_max_keepalive_connections
+        self.gcp_pool_size = gcp_pool_size
+        self._http_client = http_client
+        self._storage_client = storage_client
+        # A prebuilt BigQuery client serves every project
+        self._bigquery_client = bigquery_client
+        self._bigquery_clients: Dict[Optional[str], bigquery.Client] = {}
+        self._gcs_filesystem = gcs_filesystem
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AppClients":
+        """Reads the pool sizes and timeout from the environment."""
+        return cls(
+            http_timeout=float(os.getenv("ONS_HTTP_TIMEOUT", DEFAULT_HTTP_TIMEOUT_SECONDS)),
+            http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", DEFAULT_HTTP_MAX_CONNECTIONS)),
+            http_max_keepalive_connections=int(
+                os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS)),
+            gcp_pool_size=int(os.getenv("GCP_HTTP_POOL_SIZE", DEFAULT_GCP_HTTP_POOL_SIZE)),
+        )
+
+    def _size_pool(self, client):
+        """Resizes the connection pool of a Google API client's authorized session."""
+        adapter = HTTPAdapter(pool_connections=self.gcp_pool_size, pool_maxsize=self.gcp_pool_size)
+        client._http.mount("https://", adapter)
+        return client
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                limits = httpx.Limits(max_connections=self.http_max_connections,
+                                      max_keepalive_connections=self.http_max_keepalive_connections)
+                self._http_client = httpx.Client(timeout=self.http_timeout, limits=limits)
+            return self._http_client
+
+    def storage_client(self) -> storage.Client:
+        with self._lock:
+            if self._storage_client is None:
+                self._storage_client = self._size_pool(storage.Client())
+            return self._storage_client
+
+    def bigquery_client(self, project_id: Optional[str] = None) -> bigquery.Client:
+        with self._lock:
+            if self._bigquery_client is not None:
+                return self._bigquery_client
+            if project_id not in self._bigquery_clients:
+                self._bigquery_clients[project_id] = self._size_pool(bigquery.Client(project=project_id))
+            return self._bigquery_clients[project_id]
+
+    def gcs_filesystem(self) -> pafs.FileSystem:
+        with self._lock:
+            if self._gcs_filesystem is None:
+                self._gcs_filesystem = pafs.GcsFileSystem()
+            return self._gcs_filesystem
+
+    def close(self) -> None:
+        """Closes the clients that were built, releasing their connection pools."""
+        with self._lock:
+            clients = [self._http_client, self._storage_client, self._bigquery_client,
+                       *self._bigquery_clients.values()]
+            self._http_client, self._storage_client, self._bigquery_client = None, None, None
+            self._bigquery_clients = {}
+            self._gcs_filesystem = None
+        for client in clients:
+            if client is None:
+                continue
+            try:
+                client.close()
+            except Exception as e:
+                logging.warning(f"Falha ao fechar o cliente {type(client).__name__}: {e}")
@@ -0,0 +1,188 @@
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Iterable, List, Optional, Union
+
+import httpx
+import pandas as pd
+
+from api.core.backoff import full_jitter_delay
+from api.core.exceptions import ONSClientError, ONSResourceNotFoundError, ONSDataProcessingError
+from api.core.metrics import ONS_DOWNLOAD_BYTES, ONS_METADATA_SECONDS
+from api.core.ons_client import (
+    DEFAULT_BACKOFF_BASE_SECONDS, DEFAULT_BACKOFF_MAX_SECONDS, DEFAULT_MAX_RETRIES, ONS_API_URL, PACKAGE_ID,
+    DownloadedFile, parse_downloaded_file
+)
+from api.core.ons_metadata import ONSMetadataCache, ONSResource, shared_metadata_cache
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class AsyncONSClient:
+    """
+    Asynchronous counterpart of ONSClient, built on httpx.AsyncClient.
+    Requests share a keep-alive connection pool, are bounded by a concurrency
+    semaphore and are retried with jittered exponential backoff on 5xx responses
+    and timeouts. Errors are raised with the same ONSClientError hierarchy.
+
+    The client must be used from a single event loop, e.g. the download loop of
+    the ingestion pipeline.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 40,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE_SECONDS,
+        backoff_max: float = DEFAULT_BACKOFF_MAX_SECONDS,
+        http2: bool = False,
+        metadata_cache: Optional[ONSMetadataCache] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Initializes the client and its shared connection pool.
+
+        Args:
+            timeout (float): The timeout in seconds for HTTP requests.
+            max_concurrency (int): Maximum number of requests in flight at once.
+            max_retries (int): Retries for a request after a 5xx response or a timeout.
+            backoff_base (float): Base delay in seconds of the exponential backoff.
+            backoff_max (float): Upper bound in seconds of a single backoff delay.
+            http2 (bool): Enables HTTP/2 when the optional `h2` package is installed.
+            metadata_cache (Optional[ONSMetadataCache]): Cache for the package metadata.
+                Defaults to the process-wide cache shared with ONSClient.
+            transport (Optional[httpx.AsyncBaseTransport]): Custom transport, mainly for tests.
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            logging.warning("HTTP/2 solicitado, mas o pacote 'h2' não está instalado. Usando HTTP/1.1.")
+            http2 = False
+
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.metadata_cache = metadata_cache or shared_metadata_cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._metadata_lock = asyncio.Lock()
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncONSClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Closes the underlying connection pool."""
+        await self.client.aclose()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return full_jitter_delay(attempt, self.backoff_base, self.backoff_max)
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Performs a GET request under the concurrency semaphore, retrying transient failures.
+
+        Raises:
+            httpx.HTTPError: When the request still fails after all retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await self.client.get(url, **kwargs)
+                if response.status_code < 500 or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                logging.warning(f"ONS respondeu {response.status_code} para {url} (tentativa {attempt + 1}). Tentando novamente...")
+            except httpx.TimeoutException:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Timeout ao acessar {url} (tentativa {attempt + 1}). Tentando novamente...")
+            await asyncio.sleep(self._backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+    async def _get_resource_index(self) -> Dict[int, ONSResource]:
+        """Returns the shared year -> resource index, fetching it once per TTL window."""
+        index = self.metadata_cache.peek()
+        if index is not None:
+            return index
+        async with self._metadata_lock:
+            # Another task may have refreshed the cache while we waited for the lock
+            index = self.metadata_cache.peek()
+            if index is not None:
+                return index
+            try:
+                logging.info(f"Fetching metadata for package: {PACKAGE_ID}")
+                with ONS_METADATA_SECONDS.time():
+                    response = await self._get(ONS_API_URL, params={"id": PACKAGE_ID})
+                return self.metadata_cache.store(response.json()["result"]["resources"])
+            except httpx.HTTPError as e:
+                raise ONSClientError("A network error occurred while communicating with the ONS API.") from e
+            except KeyError as e:
+                raise ONSClientError("Unexpected response format from the ONS API.") from e
+
+    async def get_resource_for_year(self, year: int) -> ONSResource:
+        """
+        Finds the CSV resource for a given year.
+
+        Raises:
+            ONSResourceNotFoundError: If no resource matching the year is found.
+            ONSClientError: For network issues or unexpected API responses.
+        """
+        resource = (await self._get_resource_index()).get(year)
+        if resource is None:
+            raise ONSResourceNotFoundError(f"No resource found for year {year}.")
+        return resource
+
+    async def download_year(self, year: int) -> DownloadedFile:
+        """
+        Download stage of an ingestion: fetches the CSV file of a year without parsing
+        it, like `ONSClient.download_year` without a cache or a download directory.
+
+        Raises:
+            ONSResourceNotFoundError: If no resource matching the year is found.
+            ONSDataProcessingError: If the data fails to download.
+        """
+        resource = await self.get_resource_for_year(year)
+        try:
+            logging.info(f"Downloading data from: {resource.url}")
+            response = await self._get(resource.url)
+        except httpx.HTTPError as e:
+            raise ONSDataProcessingError(f"Network failure while downloading data for year {year}.") from e
+        ONS_DOWNLOAD_BYTES.labels(year=str(year)).inc(len(response.content))
+        return DownloadedFile(year, content=response.content)
+
+    async def get_data_for_year(self, year: int) -> pd.DataFrame:
+        """
+        Downloads the basin data for a specific year and loads it into a pandas DataFrame.
+        Parsing runs in a worker thread so it does not block the event loop.
+
+        Raises:
+            ONSResourceNotFoundError: If no resource matching the year is found.
+            ONSDataProcessingError: If the data fails to download or be parsed into a DataFrame.
+        """
+        return await asyncio.to_thread(parse_downloaded_file, await self.download_year(year))
+
+    async def get_data_for_years(self, years: Iterable[int]) -> Dict[int, Union[pd.DataFrame, ONSClientError]]:
+        """
+        Downloads several years concurrently, bounded by the client's semaphore.
+        A failing year does not cancel the others.
+
+        Returns:
+            Dict[int, Union[pd.DataFrame, ONSClientError]]: The DataFrame of each year,
+            or the error raised while fetching it.
+        """
+        years_list: List[int] = list(years)
+        results = await asyncio.gather(
+            *(self.get_data_for_year(year) for year in years_list), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, ONSClientError):
+                raise result
+        return dict(zip(years_list, results))
@@ -0,0 +1,14 @@
+import random
+
+
+def full_jitter_delay(attempt: int, base: float, maximum: float) -> float:
+    """
+    Full-jitter exponential backoff: a random delay up to base * 2^attempt, capped at
+    `maximum`. The randomness spreads out clients that failed at the same moment.
+
+    Args:
+        attempt (int): Zero-based number of the attempt that just failed.
+        base (float): Base delay in seconds.
+        maximum (float): Upper bound in seconds of a single delay.
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
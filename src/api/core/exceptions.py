@@ -17,4 +17,38 @@ class ONSDataProcessingError(ONSClientError):
     Raised when an error occurs during the download or processing
     of data from the ONS.
     """
-    pass
\ No newline at end of file
+    pass
+
+class ONSCacheMissError(ONSClientError):
+    """
+    Raised in offline replay mode when a requested URL is not available
+    in the local HTTP cache.
+    """
+    pass
+
+class GCSIntegrityError(Exception):
+    """
+    Raised when an object uploaded to Google Cloud Storage does not match
+    the checksum of the data that was sent.
+    """
+    pass
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor is malformed or was issued for another query.
+    """
+    pass
+
+class IngestQueueFullError(Exception):
+    """
+    Raised when an ingestion job is submitted while the maximum number of running
+    and queued jobs has been reached.
+    """
+    pass
+
+class IngestConflictError(Exception):
+    """
+    Raised when a compaction is requested while an ingestion job is running or
+    queued, or an ingestion is submitted while a compaction runs.
+    """
+    pass
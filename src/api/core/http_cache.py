@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+from api.core.exceptions import ONSCacheMissError
+from api.core.metrics import record_cache_lookup
+
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+# Checked-out files left behind by a crash are removed once they are this old
+STALE_CHECKOUT_SECONDS = 24 * 3600
+
+
+class HTTPDiskCache:
+    """
+    Content-addressed on-disk cache for HTTP GET responses.
+
+    Bodies are stored once per SHA-256 digest under `blobs/`, and an index maps each
+    request URL to its digest plus the ETag/Last-Modified validators returned by the
+    server. Cached entries are revalidated with conditional GETs, the total size is
+    bounded by evicting the least recently used entries, and in offline mode the
+    cache replays stored responses without touching the network.
+
+    A body that is read later, e.g. by the parse stage of an ingestion, is checked
+    out as a private hard link under `checkout/`, so evicting its entry meanwhile does
+    not delete the file being read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES, offline: bool = False):
+        """
+        Args:
+            directory (str): Directory where bodies and the index are kept.
+            max_bytes (int): Maximum total size of the cached bodies.
+            offline (bool): If True, never contact the server and fail on cache misses.
+        """
+        self.directory = Path(directory)
+        self.blobs_dir = self.directory / "blobs"
+        self.checkout_dir = self.directory / "checkout"
+        self.index_path = self.directory / "index.json"
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.checkout_dir.mkdir(exist_ok=True)
+        self._remove_stale_checkouts()
+        self._index: Dict[str, dict] = self._load_index()
+
+    # --- Index handling ---
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            index = json.loads(self.index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # Drop entries whose body was removed from disk
+        return {key: entry for key, entry in index.items() if self._blob_path(entry["sha256"]).exists()}
+
+    def _save_index(self):
+        """Atomically rewrites the index file. Must be called with the lock held."""
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._index))
+        os.replace(tmp_path, self.index_path)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest
+
+    @staticmethod
+    def cache_key(url: str, params: Optional[dict] = None) -> str:
+        """Canonical key for a request: the full URL with its query parameters."""
+        return str(httpx.URL(url, params=params))
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the distinct bodies currently cached."""
+        with self._lock:
+            return sum({entry["sha256"]: entry["size"] for entry in self._index.values()}.values())
+
+    # --- Public API ---
+
+    def get_cached_path(self, url: str, params: Optional[dict] = None) -> Optional[Path]:
+        """Returns the cached body for a request, if present, without revalidating it."""
+        with self._lock:
+            entry = self._index.get(self.cache_key(url, params))
+            return self._blob_path(entry["sha256"]) if entry else None
+
+    def fetch(self, client: httpx.Client, url: str, params: Optional[dict] = None, checkout: bool = False) -> Path:
+        """
+        Returns the path of an up-to-date copy of the response body, downloading it
+        only when it is not cached or the server reports it has changed.
+
+        Args:
+            client (httpx.Client): Client used for the (conditional) request.
+            url (str): The URL to fetch.
+            params (Optional[dict]): Query parameters of the request.
+            checkout (bool): If True, returns a private copy of the body (a hard link)
+                that eviction cannot remove; the caller deletes it once read.
+
+        Returns:
+            Path: The cached file holding the response body, or its checked-out copy.
+
+        Raises:
+            ONSCacheMissError: In offline mode, if the request is not cached.
+            httpx.HTTPError: For network failures or error responses.
+        """
+        key = self.cache_key(url, params)
+        with self._lock:
+            entry = self._index.get(key)
+
+        if self.offline:
+            if entry is None:
+                raise ONSCacheMissError(f"Offline mode: '{key}' is not in the local cache.")
+            record_cache_lookup("ons_http", True)
+            return self._touch(key, entry, checkout)
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with client.stream("GET", url, params=params, headers=headers) as response:
+            if response.status_code == 304 and entry:
+                logging.info(f"Cache HTTP válido para {key}.")
+                record_cache_lookup("ons_http", True)
+                return self._touch(key, entry, checkout)
+            response.raise_for_status()
+            record_cache_lookup("ons_http", False)
+            return self._store(key, response, checkout)
+
+    def clear(self):
+        """Removes every cached entry and body."""
+        with self._lock:
+            for entry in self._index.values():
+                self._blob_path(entry["sha256"]).unlink(missing_ok=True)
+            self._index = {}
+            self._save_index()
+
+    # --- Internals ---
+
+    def _remove_stale_checkouts(self):
+        cutoff = time.time() - STALE_CHECKOUT_SECONDS
+        for path in self.checkout_dir.iterdir():
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _checkout(self, source: Path, digest: str) -> Path:
+        """Links `source` to a new file under `checkout/`, copying it where hard links are not supported."""
+        target = self.checkout_dir / f"{digest}.{uuid.uuid4().hex}"
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+        return target
+
+    def _touch(self, key: str, entry: dict, checkout: bool = False) -> Path:
+        with self._lock:
+            entry["last_access"] = time.time()
+            self._index[key] = entry
+            self._save_index()
+            # Under the lock, so the body cannot be evicted before it is checked out
+            if checkout:
+                return self._checkout(self._blob_path(entry["sha256"]), entry["sha256"])
+        return self._blob_path(entry["sha256"])
+
+    def _store(self, key: str, response: httpx.Response, checkout: bool = False) -> Path:
+        """Streams the response body to disk, then registers it under its digest."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    size += len(chunk)
+            blob_path = self._blob_path(digest.hexdigest())
+            # Checked out before the body is registered, where it could already be evicted
+            checkout_path = self._checkout(Path(tmp_name), digest.hexdigest()) if checkout else None
+            os.replace(tmp_name, blob_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        entry = {
+            "sha256": digest.hexdigest(),
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "last_access": time.time(),
+        }
+        with self._lock:
+            previous = self._index.get(key)
+            self._index[key] = entry
+            if previous and previous["sha256"] != entry["sha256"]:
+                self._release_blob(previous["sha256"])
+            self._evict(keep=key)
+            self._save_index()
+        logging.info(f"Resposta de {key} salva no cache HTTP ({size} bytes).")
+        return checkout_path or blob_path
+
+    def _release_blob(self, digest: str):
+        """Deletes a body once no index entry references it. Must be called with the lock held."""
+        if not any(entry["sha256"] == digest for entry in self._index.values()):
+            self._blob_path(digest).unlink(missing_ok=True)
+
+    def _evict(self, keep: str):
+        """Evicts least recently used entries until the cache fits in max_bytes."""
+        def total() -> int:
+            return sum({entry["sha256"]: entry["size"] for entry in self._index.values()}.values())
+
+        lru_keys = sorted((k for k in self._index if k != keep), key=lambda k: self._index[k]["last_access"])
+        for lru_key in lru_keys:
+            if total() <= self.max_bytes:
+                break
+            evicted = self._index.pop(lru_key)
+            self._release_blob(evicted["sha256"])
+            logging.info(f"Entrada {lru_key} removida do cache HTTP (LRU).")
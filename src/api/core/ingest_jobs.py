@@ -0,0 +1,229 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Iterator, Optional
+
+from api.core.exceptions import IngestConflictError, IngestQueueFullError
+from api.models.basin import IngestJob
+from api.repositories.gcs_repository import GCSRepository
+
+JOB_PENDING = "PENDENTE"
+JOB_RUNNING = "EM_ANDAMENTO"
+JOB_SUCCEEDED = "CONCLUIDO"
+JOB_FAILED = "FALHA"
+
+DEFAULT_MAX_CONCURRENT_JOBS = 1
+DEFAULT_MAX_QUEUED_JOBS = 10
+DEFAULT_MAX_RETAINED_JOBS = 1000
+
+# ingest(start_date, end_date, progress=...) -> report, e.g. BasinService.ingest_data
+IngestFunction = Callable[..., dict]
+
+
+class InMemoryJobStore:
+    """
+    Keeps the job states in the memory of the API instance. Only the most recent
+    `max_jobs` jobs are kept; the oldest ones are dropped first.
+    """
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_RETAINED_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, job: IngestJob) -> None:
+        with self._lock:
+            self._jobs[job.job_id] = job.model_copy(deep=True)
+            self._jobs.move_to_end(job.job_id)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job is not None else None
+
+
+class GCSJobStore(InMemoryJobStore):
+    """
+    Also persists every job state under `basin_state/ingest_jobs/` in the bucket, so
+    the status of a job can be polled from any API instance and outlives a restart.
+    Jobs started by this instance are read from memory.
+    """
+
+    def __init__(self, gcs_repository: GCSRepository, max_jobs: int = DEFAULT_MAX_RETAINED_JOBS):
+        super().__init__(max_jobs)
+        self.gcs_repository = gcs_repository
+
+    def save(self, job: IngestJob) -> None:
+        super().save(job)
+        try:
+            self.gcs_repository.save_job_state(job.job_id, job.model_dump(mode="json"))
+        except Exception as e:
+            # The job itself keeps running; only other instances miss this update
+            logging.warning(f"Não foi possível salvar o estado do job {job.job_id} no GCS: {e}")
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        job = super().get(job_id)
+        if job is not None:
+            return job
+        state = self.gcs_repository.load_job_state(job_id)
+        return IngestJob.model_validate(state) if state is not None else None
+
+
+class IngestJobManager:
+    """
+    Runs ingestions in the background so the request that submits one returns
+    immediately. At most `max_concurrent_jobs` jobs run at a time (each already
+    downloads its years in parallel) and at most `max_queued_jobs` more wait for a
+    slot; further submissions are rejected.
+
+    Each job has its own lock, held while its state is updated and saved, so a slow
+    store (e.g. GCS) only delays the updates of that job.
+    """
+
+    def __init__(self, store: InMemoryJobStore, max_concurrent_jobs: int = DEFAULT_MAX_CONCURRENT_JOBS,
+                 max_queued_jobs: int = DEFAULT_MAX_QUEUED_JOBS):
+        """
+        Args:
+            store (InMemoryJobStore): Where the job states are kept.
+            max_concurrent_jobs (int): Jobs running at the same time.
+            max_queued_jobs (int): Jobs waiting for a free slot.
+        """
+        if max_concurrent_jobs < 1 or max_queued_jobs < 0:
+            raise ValueError("At least one concurrent job is required and the queue size cannot be negative.")
+        self.store = store
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="ingest-job")
+        self._active_jobs = 0
+        # Set while an operation that must not overlap an ingestion (e.g. compaction) runs
+        self._exclusive = False
+        self._lock = threading.Lock()
+
+    def submit(self, start_date: date, end_date: date, ingest: IngestFunction) -> IngestJob:
+        """
+        Queues an ingestion of the date range.
+
+        Args:
+            start_date (date): The start of the ingestion period.
+            end_date (date): The end of the ingestion period.
+            ingest: Runs the ingestion, e.g. BasinService.ingest_data; it receives a
+                `progress(year, detail)` callback to report each year.
+
+        Returns:
+            IngestJob: The pending job, whose `job_id` is used to poll its status.
+
+        Raises:
+            IngestQueueFullError: If the running and queued jobs are at their limit.
+            IngestConflictError: If an exclusive operation, such as a compaction, is running.
+        """
+        with self._lock:
+            if self._exclusive:
+                raise IngestConflictError("A compaction is running; try the ingestion again once it finishes.")
+            if self._active_jobs >= self.max_concurrent_jobs + self.max_queued_jobs:
+                raise IngestQueueFullError(
+                    f"{self._active_jobs} ingestion jobs are already running or queued; try again later."
+                )
+            self._active_jobs += 1
+        job = IngestJob(
+            job_id=uuid.uuid4().hex,
+            status=JOB_PENDING,
+            start_date=start_date,
+            end_date=end_date,
+            submitted_at=datetime.now(),
+            years={year: JOB_PENDING for year in range(start_date.year, end_date.year + 1)},
+        )
+        submitted = job.model_copy(deep=True)
+        job_lock = threading.Lock()
+        try:
+            self.store.save(job)
+            # The worker updates `job`; the caller gets the state at submission
+            future = self._executor.submit(self._run, job, job_lock, ingest)
+            future.add_done_callback(lambda future: self._on_cancelled(future, job, job_lock))
+        except Exception:
+            self._release()
+            raise
+        logging.info(f"Job de ingestão {job.job_id} enfileirado para {start_date} a {end_date}.")
+        return submitted
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.store.get(job_id)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """
+        Runs a block while no ingestion job of this instance runs or waits, rejecting
+        new submissions until it ends. Used by operations that rewrite the stored
+        files, such as compaction.
+
+        Raises:
+            IngestConflictError: If a job is running or queued, or another exclusive
+                block is running.
+        """
+        with self._lock:
+            if self._active_jobs or self._exclusive:
+                raise IngestConflictError(
+                    f"{self._active_jobs} ingestion jobs are running or queued; try again once they finish."
+                    if self._active_jobs else "Another compaction is already running."
+                )
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._exclusive = False
+
+    def _release(self):
+        with self._lock:
+            self._active_jobs -= 1
+
+    def _update(self, job: IngestJob, job_lock: threading.Lock, **changes) -> None:
+        # Years of one job report from several threads at once; saving under the lock
+        # keeps the stored states in the order of the updates
+        with job_lock:
+            for field, value in changes.items():
+                setattr(job, field, value)
+            self.store.save(job)
+
+    def _report_year(self, job: IngestJob, job_lock: threading.Lock, year: int, detail: dict) -> None:
+        with job_lock:
+            job.years[year] = detail.get("status", JOB_RUNNING)
+            if "year" in detail:
+                job.details.append(detail)
+            self.store.save(job)
+
+    def _run(self, job: IngestJob, job_lock: threading.Lock, ingest: IngestFunction) -> None:
+        try:
+            self._update(job, job_lock, status=JOB_RUNNING, started_at=datetime.now())
+            report = ingest(job.start_date, job.end_date,
+                            progress=lambda year, detail: self._report_year(job, job_lock, year, detail))
+            self._update(job, job_lock, status=JOB_SUCCEEDED, finished_at=datetime.now(),
+                         summary=report["summary"], details=report["details"])
+            logging.info(f"Job de ingestão {job.job_id} concluído.")
+        except Exception as e:
+            logging.error(f"Job de ingestão {job.job_id} falhou: {e}", exc_info=True)
+            self._update(job, job_lock, status=JOB_FAILED, finished_at=datetime.now(), error=str(e))
+        finally:
+            self._release()
+
+    def _on_cancelled(self, future: Future, job: IngestJob, job_lock: threading.Lock) -> None:
+        """Marks a queued job cancelled by `shutdown` as failed, so it is not left pending."""
+        if not future.cancelled():
+            return
+        logging.warning(f"Job de ingestão {job.job_id} cancelado antes de iniciar.")
+        try:
+            self._update(job, job_lock, status=JOB_FAILED, finished_at=datetime.now(),
+                         error="Cancelled before it started: the API instance shut down.")
+        except Exception as e:
+            logging.warning(f"Não foi possível salvar o cancelamento do job {job.job_id}: {e}")
+        finally:
+            self._release()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stops accepting jobs; queued jobs that have not started are cancelled and marked as failed."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
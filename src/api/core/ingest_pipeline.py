@@ -0,0 +1,297 @@
+import asyncio
+import inspect
+import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, List, NamedTuple, Optional, Set
+
+from api.core.metrics import INGEST_STAGE_SECONDS, timed
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+DEFAULT_PARSE_WORKERS = 2
+DEFAULT_UPLOAD_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 2
+
+_STOP = object()
+
+
+class Finished(NamedTuple):
+    """Returned by a stage to complete its task early, e.g. a year skipped before the download."""
+    result: Any
+
+
+class Parsed(NamedTuple):
+    """Returned by the download stage when its data needs no parsing, e.g. a file parsed while it streamed."""
+    value: Any
+
+
+class _Task(NamedTuple):
+    # A plain function, run by a download worker, or a coroutine function, run on the download loop
+    download: Callable[[], Any]
+    parse: Optional[Callable[[Any], Any]]
+    upload: Callable[[Any], Any]
+    future: Future
+    label: str
+
+
+class IngestPipeline:
+    """
+    Long-lived, stage-separated executor for the yearly ingestions.
+
+    Each task goes through three stages, each with its own pool of workers:
+    download (network bound), parse (CPU bound) and upload (network bound). The
+    stages are connected by bounded queues, so a slow stage holds back the stages
+    before it instead of piling up downloaded files in memory, while one year can
+    upload as another downloads or parses. The parse stage can run in worker
+    processes, in which case its function and data must be picklable. The time of
+    each stage is recorded in the `basin_ingest_stage_seconds` metric.
+
+    A download given as a coroutine function runs on an event loop owned by the
+    pipeline instead of a download worker, so an async client can keep many
+    downloads in flight on one thread; the download worker count still bounds them.
+    """
+
+    def __init__(self, download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+                 parse_workers: int = DEFAULT_PARSE_WORKERS,
+                 upload_workers: int = DEFAULT_UPLOAD_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 parse_in_processes: bool = False):
+        """
+        Args:
+            download_workers (int): Tasks downloading at the same time.
+            parse_workers (int): Tasks parsing at the same time.
+            upload_workers (int): Tasks uploading at the same time.
+            queue_size (int): Finished downloads (and parses) that may wait for the
+                next stage before the workers of the previous stage block.
+            parse_in_processes (bool): If True, parsing runs in a pool of
+                `parse_workers` processes instead of threads, so it is not limited by
+                the GIL.
+        """
+        if min(download_workers, parse_workers, upload_workers, queue_size) < 1:
+            raise ValueError("Every stage needs at least one worker and a queue of at least one item.")
+        self.download_workers = download_workers
+        self.parse_workers = parse_workers
+        self.upload_workers = upload_workers
+        self.queue_size = queue_size
+        self.parse_in_processes = parse_in_processes
+        self._download_queue: "queue.Queue" = queue.Queue()
+        self._parse_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._upload_queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        # Spawned, not forked: forking this multi-threaded process could copy locks held by other threads
+        self._processes = (
+            ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+            if parse_in_processes else None
+        )
+        self._threads = (
+            self._start_workers("download", download_workers, self._download_queue, self._download)
+            + self._start_workers("parse", parse_workers, self._parse_queue, self._parse)
+            + self._start_workers("upload", upload_workers, self._upload_queue, self._upload)
+        )
+        self._closed = False
+        self._lock = threading.Lock()
+        # Started on the first coroutine download
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._download_slots = asyncio.Semaphore(download_workers)
+        self._async_downloads: Set[Future] = set()
+        self._on_shutdown: List[Callable[[], Awaitable[None]]] = []
+        self._cancelling = False
+
+    @staticmethod
+    def _start_workers(stage: str, count: int, source: "queue.Queue", handle) -> List[threading.Thread]:
+        threads = []
+        for index in range(count):
+            thread = threading.Thread(target=IngestPipeline._work, args=(source, handle),
+                                      name=f"ingest-{stage}-{index}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    @staticmethod
+    def _work(source: "queue.Queue", handle):
+        while True:
+            item = source.get()
+            if item is _STOP:
+                return
+            task, value = item
+            try:
+                handle(task, value)
+            except Exception as e:
+                task.future.set_exception(e)
+
+    def submit(self, download: Callable[[], Any], upload: Callable[[Any], Any],
+               parse: Optional[Callable[[Any], Any]] = None, label: str = "") -> Future:
+        """
+        Queues a task: `upload(parse(download()))`, each call made by the pool of its stage.
+
+        Args:
+            download: Fetches the raw data.
+            upload: Stores the parsed data; its return value is the task result.
+            parse: Turns the raw data into what `upload` stores. When omitted, or when
+                `download` returns `Parsed(value)`, the downloaded value goes straight
+                to the upload stage.
+            label (str): Identifies the task in the stage metrics, e.g. its year.
+
+        Returns:
+            Future: Resolved with the task result, or with the exception of the failed
+                stage. A stage that returns `Finished(result)` resolves it immediately.
+
+        Raises:
+            RuntimeError: If the pipeline was shut down.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The ingestion pipeline was shut down.")
+            task = _Task(download, parse, upload, Future(), label)
+            task.future.set_running_or_notify_cancel()
+            if inspect.iscoroutinefunction(download):
+                running = asyncio.run_coroutine_threadsafe(self._download_async(task), self._start_loop())
+                self._async_downloads.add(running)
+                running.add_done_callback(self._forget_download)
+            else:
+                self._download_queue.put((task, None))
+        return task.future
+
+    def close_on_shutdown(self, close: Callable[[], Awaitable[None]]) -> None:
+        """
+        Registers a coroutine function awaited on the download loop when the pipeline
+        shuts down, e.g. the `aclose` of an async client used by the downloads.
+        """
+        with self._lock:
+            self._on_shutdown.append(close)
+
+    def _start_loop(self) -> asyncio.AbstractEventLoop:
+        """Starts the event loop of the coroutine downloads, once. Called with the lock held."""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name="ingest-download-loop", daemon=True)
+            self._loop_thread.start()
+        return self._loop
+
+    def _forget_download(self, running: Future) -> None:
+        with self._lock:
+            self._async_downloads.discard(running)
+
+    @staticmethod
+    def _complete(task: _Task, value) -> bool:
+        if isinstance(value, Finished):
+            task.future.set_result(value.result)
+            return True
+        return False
+
+    def _download(self, task: _Task, _):
+        with timed(INGEST_STAGE_SECONDS, stage="download", year=task.label):
+            raw = task.download()
+        self._hand_over(task, raw)
+
+    async def _download_async(self, task: _Task):
+        try:
+            async with self._download_slots:
+                if self._cancelling:
+                    raise RuntimeError("The ingestion pipeline was shut down before the task started.")
+                with timed(INGEST_STAGE_SECONDS, stage="download", year=task.label):
+                    raw = await task.download()
+                # The hand-over blocks while the parse stage is behind, so it runs off the loop;
+                # the slot is held meanwhile, like a download worker waiting on the queue
+                await asyncio.to_thread(self._hand_over, task, raw)
+        except Exception as e:
+            task.future.set_exception(e)
+
+    def _hand_over(self, task: _Task, raw):
+        if self._complete(task, raw):
+            return
+        if isinstance(raw, Parsed):
+            self._upload_queue.put((task, raw.value))
+        elif task.parse is None:
+            self._upload_queue.put((task, raw))
+        else:
+            # Blocks while the parse stage is behind: the backpressure on the downloads
+            self._parse_queue.put((task, raw))
+
+    def _parse(self, task: _Task, raw):
+        with timed(INGEST_STAGE_SECONDS, stage="parse", year=task.label):
+            if self._processes is not None:
+                parsed = self._processes.submit(task.parse, raw).result()
+            else:
+                parsed = task.parse(raw)
+        if not self._complete(task, parsed):
+            self._upload_queue.put((task, parsed))
+
+    def _upload(self, task: _Task, parsed):
+        with timed(INGEST_STAGE_SECONDS, stage="upload", year=task.label):
+            result = task.upload(parsed)
+        task.future.set_result(result)
+
+    def _cancel_pending(self) -> None:
+        while True:
+            try:
+                task, _ = self._download_queue.get_nowait()
+            except queue.Empty:
+                return
+            task.future.set_exception(RuntimeError("The ingestion pipeline was shut down before the task started."))
+
+    def shutdown(self, cancel_pending: bool = False) -> None:
+        """
+        Stops the workers and closes the process pool. The tasks already downloading or
+        past the download stage are completed first. The download loop is stopped last,
+        after awaiting the hooks registered with `close_on_shutdown`.
+
+        Args:
+            cancel_pending (bool): If True, the tasks still waiting for a download worker
+                fail with a RuntimeError instead of being run.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if cancel_pending:
+            # Coroutine downloads still waiting for a slot fail once they get it
+            self._cancelling = True
+            self._cancel_pending()
+        # Each stage is stopped after the previous one has drained, so no task is left behind
+        stages = [(self._download_queue, self.download_workers), (self._parse_queue, self.parse_workers),
+                  (self._upload_queue, self.upload_workers)]
+        workers = iter(self._threads)
+        for source, count in stages:
+            stage_threads = [next(workers) for _ in range(count)]
+            for _ in range(count):
+                source.put(_STOP)
+            for thread in stage_threads:
+                thread.join()
+            if source is self._download_queue:
+                # The coroutine downloads belong to the download stage too
+                with self._lock:
+                    running = list(self._async_downloads)
+                wait(running)
+        if self._processes is not None:
+            self._processes.shutdown()
+        self._stop_loop()
+        logging.info("Pipeline de ingestão encerrado.")
+
+    def _stop_loop(self) -> None:
+        """Awaits the shutdown hooks on the download loop, then stops it."""
+        with self._lock:
+            hooks = list(self._on_shutdown)
+            loop = self._start_loop() if hooks else self._loop
+        if loop is None:
+            return
+        for close in hooks:
+            try:
+                asyncio.run_coroutine_threadsafe(close(), loop).result()
+            except Exception as e:
+                logging.warning(f"Falha ao encerrar um recurso do pipeline de ingestão: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join()
+        loop.close()
+
+
+@lru_cache(maxsize=1)
+def default_pipeline() -> IngestPipeline:
+    """
+    Pipeline with the default pool sizes, shared by the services built without one,
+    e.g. in scripts. The API passes its own pipeline, owned by the application lifespan.
+    """
+    return IngestPipeline()
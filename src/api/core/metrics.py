@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Ingestion stages take from milliseconds (skipped years) to minutes (large downloads)
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+_ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+ONS_METADATA_SECONDS = Histogram(
+    "basin_ons_metadata_fetch_seconds",
+    "Time to fetch the ONS package metadata (cache misses only).",
+    buckets=_STAGE_BUCKETS,
+)
+ONS_DOWNLOAD_BYTES = Counter(
+    "basin_ons_download_bytes",
+    "Bytes of ONS CSV files fetched for ingestion (including HTTP cache hits), per year.",
+    ["year"],
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "basin_ingest_stage_seconds",
+    "Time a year spends in each ingestion pipeline stage: download, parse and upload.",
+    ["stage", "year"],
+    buckets=_STAGE_BUCKETS,
+)
+PARQUET_WRITE_SECONDS = Histogram(
+    "basin_parquet_write_seconds",
+    "Time spent writing a yearly Parquet file to GCS, split into serialization and transfer.",
+    ["phase", "year"],
+    buckets=_STAGE_BUCKETS,
+)
+BIGQUERY_JOB_SECONDS = Histogram(
+    "basin_bigquery_job_seconds",
+    "Time from the submission of a BigQuery job to its downloaded result.",
+    ["query"],
+    buckets=_STAGE_BUCKETS,
+)
+BIGQUERY_ROWS = Histogram(
+    "basin_bigquery_rows_returned",
+    "Rows returned by each BigQuery job.",
+    ["query"],
+    buckets=_ROW_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "basin_cache_requests",
+    "Lookups in the application caches, by cache and result (hit or miss).",
+    ["cache", "result"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "basin_http_request_duration_seconds",
+    "Latency of the HTTP requests, per route template, method and status code.",
+    ["method", "route", "status"],
+)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observes the duration of the block, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """The current value of every metric, and the content type of the text format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,34 +1,255 @@
-from typing import Optional
+from typing import Callable, Iterator, List, NamedTuple, Optional, TypeVar, Union
+import json
+import time
 import httpx
 import pandas as pd
-from io import StringIO
-from datetime import date
+import pyarrow as pa
+from pyarrow import csv as pa_csv
+from io import BufferedReader, RawIOBase
+from pathlib import Path
 import logging
+from api.core.backoff import full_jitter_delay
 from api.core.exceptions import ONSClientError, ONSResourceNotFoundError, ONSDataProcessingError
+from api.core.http_cache import HTTPDiskCache
+from api.core.resumable_download import DEFAULT_MAX_ATTEMPTS, ResumableDownloader
+from api.core.ons_metadata import ONSMetadataCache, ONSResource, shared_metadata_cache
+from api.core.row_hashing import CONTENT_FINGERPRINT_ATTR, content_fingerprint
+from api.core.metrics import ONS_DOWNLOAD_BYTES, ONS_METADATA_SECONDS
+from api.models.arrow_schema import ONS_BASIN_SCHEMA, conform_table, csv_convert_options
 
 ONS_API_URL = "https://dados.ons.org.br/api/3/action/package_show"
 PACKAGE_ID = "a0ec7472-1da3-4bb5-b501-5bfd2fdf26a8"
 
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE_SECONDS = 0.5
+DEFAULT_BACKOFF_MAX_SECONDS = 30.0
+CSV_PARSE_OPTIONS = pa_csv.ParseOptions(delimiter=';')
+
+T = TypeVar("T")
+
+
+def read_csv_table(source) -> pa.Table:
+    """
+    Parses an ONS yearly CSV file straight into the typed basin schema
+    (dictionary-encoded basin name, date32 dates and float64 measures).
+
+    Args:
+        source: The raw CSV content (bytes) or a readable binary file object.
+
+    Raises:
+        pa.ArrowInvalid: If the content is not a valid CSV or a value cannot be converted.
+        KeyError: If one of the key columns is missing.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = pa.BufferReader(source)  # Zero-copy view over the response body
+    table = pa_csv.read_csv(source, parse_options=CSV_PARSE_OPTIONS, convert_options=csv_convert_options())
+    return conform_table(table)
+
+
+def parse_csv_bytes(content: bytes) -> pd.DataFrame:
+    """Parses the raw content of an ONS yearly CSV file into a typed DataFrame."""
+    return read_csv_table(content).to_pandas()
+
+
+class DownloadedFile(NamedTuple):
+    """The raw CSV of one year, in memory or on disk, waiting to be parsed."""
+    year: int
+    content: Optional[bytes] = None
+    path: Optional[str] = None
+    # Resumable downloads and checked-out copies of HTTP cache files are deleted once parsed
+    temporary: bool = False
+
+
+def parse_downloaded_file(download: Union[DownloadedFile, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Parse stage of an ingestion: turns a downloaded CSV into the typed DataFrame,
+    fingerprinted in `attrs`. A module-level function, so it can run in a worker
+    process. Data already parsed while streaming is returned as is.
+
+    Raises:
+        ONSDataProcessingError: If the content cannot be parsed.
+    """
+    if isinstance(download, pd.DataFrame):
+        return download
+    try:
+        df = read_csv_table(download.content if download.content is not None else download.path).to_pandas()
+    except (pa.ArrowInvalid, KeyError) as e:
+        raise ONSDataProcessingError(f"Failed to parse or process data for year {download.year}.") from e
+    finally:
+        if download.temporary:
+            Path(download.path).unlink(missing_ok=True)
+    # Fingerprinted here so callers can tell whether the content changed without comparing rows
+    df.attrs[CONTENT_FINGERPRINT_ATTR] = content_fingerprint(df)
+    logging.info(f"Data for year {download.year} processed successfully.")
+    return df
+
+
+class _ByteChunkReader(RawIOBase):
+    """
+    Adapts an iterator of byte chunks (e.g. `httpx.Response.iter_bytes`) into a
+    readable file object, so a parser can pull data as it arrives from the network.
+    """
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._view = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._view:
+            try:
+                self._view = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._view))
+        buffer[:size] = self._view[:size]
+        self._view = self._view[size:]
+        return size
+
 
 class ONSClient:
     """
     A client responsible for all interactions with the ONS (National System Operator)
     open data API. It handles fetching metadata and downloading data files.
+    Requests are retried with jittered exponential backoff on 5xx responses and
+    timeouts; how many run at once is bounded by the download workers of the
+    ingestion pipeline and the connection pool of the shared httpx client.
     """
 
-    def __init__(self, timeout: int = 40):
+    def __init__(self, timeout: int = 40, metadata_cache: Optional[ONSMetadataCache] = None,
+                 streaming: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 http_cache: Optional[HTTPDiskCache] = None, download_dir: Optional[str] = None,
+                 max_download_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 http_client: Optional[httpx.Client] = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX_SECONDS):
         """
         Initializes the client with a shared httpx.Client instance for connection pooling.
 
         Args:
             timeout (int): The timeout in seconds for HTTP requests.
+            metadata_cache (Optional[ONSMetadataCache]): Cache for the package metadata.
+                Defaults to the process-wide cache shared by all clients.
+            streaming (bool): If True, CSV files are parsed incrementally while they
+                are downloaded instead of being buffered in memory first.
+            chunk_size (int): Size in bytes of the network chunks and parser blocks
+                used in streaming mode.
+            http_cache (Optional[HTTPDiskCache]): Optional on-disk cache for the metadata
+                and CSV downloads, revalidated with conditional GETs.
+            download_dir (Optional[str]): If set (and no HTTP cache is used), CSV files are
+                downloaded to this directory with resumable Range requests.
+            max_download_attempts (int): Attempts per resumable download.
+            http_client (Optional[httpx.Client]): Application-scoped client to reuse, owned
+                and closed by the caller. When omitted, a client with `timeout` is created.
+            max_retries (int): Retries of a request after a 5xx response or a timeout.
+            backoff_base (float): Base delay in seconds of the exponential backoff.
+            backoff_max (float): Upper bound in seconds of a single backoff delay.
         """
-        self.client = httpx.Client(timeout=timeout)
+        self.client = http_client or httpx.Client(timeout=timeout)
+        self.metadata_cache = metadata_cache or shared_metadata_cache
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.http_cache = http_cache
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.downloader = (
+            ResumableDownloader(self.client, download_dir, max_attempts=max_download_attempts)
+            if download_dir else None
+        )
+
+    @property
+    def streams_batches(self) -> bool:
+        """
+        Whether `stream_year` reads the network stream. With an HTTP cache or a download
+        directory, files are written to disk first and parsed by the parse stage instead.
+        """
+        return self.streaming and self.http_cache is None and self.downloader is None
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return full_jitter_delay(attempt, self.backoff_base, self.backoff_max)
+
+    def _with_retries(self, url: str, request: Callable[[], T]) -> T:
+        """
+        Runs a request to `url`, retrying transient failures (5xx responses and timeouts).
+
+        Raises:
+            httpx.HTTPError: When the request still fails after all retries, or fails
+                with an error that is not transient.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return request()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500 or attempt == self.max_retries:
+                    raise
+                logging.warning(f"ONS respondeu {e.response.status_code} para {url} (tentativa {attempt + 1}). Tentando novamente...")
+            except httpx.TimeoutException:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Timeout ao acessar {url} (tentativa {attempt + 1}). Tentando novamente...")
+            time.sleep(self._backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+    def _get(self, url: str, **kwargs) -> httpx.Response:
+        def request():
+            response = self.client.get(url, **kwargs)
+            response.raise_for_status()
+            return response
+        return self._with_retries(url, request)
+
+    def _fetch_package_resources(self) -> List[dict]:
+        """
+        Fetches the raw resources list of the ONS data package.
+
+        Returns:
+            List[dict]: The `result.resources` entries returned by `package_show`.
+        """
+        logging.info(f"Fetching metadata for package: {PACKAGE_ID}")
+        params = {"id": PACKAGE_ID}
+        with ONS_METADATA_SECONDS.time():
+            if self.http_cache is not None:
+                cached = self._with_retries(ONS_API_URL, lambda: self.http_cache.fetch(self.client, ONS_API_URL, params=params))
+                package_data = json.loads(cached.read_bytes())
+            else:
+                package_data = self._get(ONS_API_URL, params=params).json()
+        return package_data["result"]["resources"]
+
+    def get_resource_for_year(self, year: int) -> ONSResource:
+        """
+        Finds the CSV resource for a given year using the shared metadata cache,
+        so the package metadata is fetched at most once per TTL window.
+
+        Args:
+            year (int): The year for which to find the resource.
+
+        Returns:
+            ONSResource: The resource, including its URL and version information.
+
+        Raises:
+            ONSResourceNotFoundError: If no resource matching the year is found.
+            ONSClientError: For network issues or unexpected API responses.
+        """
+        try:
+            index = self.metadata_cache.get_index(self._fetch_package_resources)
+        except httpx.HTTPError as e:
+            raise ONSClientError("A network error occurred while communicating with the ONS API.") from e
+        except KeyError as e:
+            raise ONSClientError("Unexpected response format from the ONS API.") from e
+
+        resource = index.get(year)
+        if resource is None:
+            raise ONSResourceNotFoundError(f"No resource found for year {year}.")
+        logging.info(f"Recurso encontrado para o ano {year}: {resource.url}")
+        return resource
 
     def _get_csv_url_for_year(self, year: int) -> str:
         """
-        Fetches the metadata for the ONS data package and finds the specific CSV file URL
-        for a given year.
+        Finds the specific CSV file URL for a given year.
 
         Args:
             year (int): The year for which to find the data URL.
@@ -40,27 +261,51 @@ class ONSClient:
             ONSResourceNotFoundError: If no resource matching the year is found.
             ONSClientError: For network issues or unexpected API responses.
         """
-        try:
-            logging.info(f"Fetching metadata for package: {PACKAGE_ID}")
-            response = self.client.get(ONS_API_URL, params={"id": PACKAGE_ID})
-            response.raise_for_status()
-            package_data = response.json()
+        return self.get_resource_for_year(year).url
 
-            resources = package_data["result"]["resources"]
+    def download_year(self, year: int) -> Union[DownloadedFile, pd.DataFrame]:
+        """
+        Download stage of an ingestion: fetches the CSV file of a year without parsing
+        it, so parsing can run elsewhere (see `parse_downloaded_file`). In streaming
+        mode the file is parsed while it downloads and the DataFrame is returned.
 
-            for resource in resources:
-                resource_name = resource.get("name", "")
-                if resource.get("format", "").upper() == 'CSV' and str(year) in resource_name:
-                    url = resource['url']
-                    logging.info(f"Recurso encontrado para o ano {year}: {url}")
-                    return url
+        Args:
+            year (int): The year of the data to download.
 
-            raise ONSResourceNotFoundError(f"No resource found for year {year}.")
+        Raises:
+            ONSDataProcessingError: If the data fails to download (or, when streaming, to be parsed).
+        """
+        resource = self.get_resource_for_year(year)
+        csv_url = resource.url
 
-        except httpx.RequestError as e:
-            raise ONSClientError("A network error occurred while communicating with the ONS API.") from e
-        except KeyError as e:
-            raise ONSClientError("Unexpected response format from the ONS API.") from e
+        try:
+            if self.http_cache is not None:
+                # Parse the cached copy, downloading it only if ONS reports a change. The
+                # private checkout survives an eviction while the file waits for the parse stage
+                cached = self._with_retries(csv_url, lambda: self.http_cache.fetch(self.client, csv_url, checkout=True))
+                ONS_DOWNLOAD_BYTES.labels(year=str(year)).inc(cached.stat().st_size)
+                return DownloadedFile(year, path=str(cached), temporary=True)
+            if self.downloader is not None:
+                # The downloader resumes interrupted transfers; 5xx responses are retried here,
+                # and each new attempt resumes from the bytes already on disk
+                csv_path = self._with_retries(csv_url, lambda: self.downloader.download(
+                    csv_url, expected_size=resource.size, expected_hash=resource.hash))
+                ONS_DOWNLOAD_BYTES.labels(year=str(year)).inc(csv_path.stat().st_size)
+                return DownloadedFile(year, path=str(csv_path), temporary=True)
+            if self.streaming:
+                # A failed stream is read again from the start
+                df = self._with_retries(csv_url, lambda: self._read_streaming(csv_url, year))
+                df.attrs[CONTENT_FINGERPRINT_ATTR] = content_fingerprint(df)
+                return df
+            logging.info(f"Downloading data from: {csv_url}")
+            response = self._get(csv_url)
+            ONS_DOWNLOAD_BYTES.labels(year=str(year)).inc(len(response.content))
+            return DownloadedFile(year, content=response.content)
+
+        except httpx.HTTPError as e:
+            raise ONSDataProcessingError(f"Network failure while downloading data for year {year}.") from e
+        except (pa.ArrowInvalid, KeyError) as e:
+            raise ONSDataProcessingError(f"Failed to parse or process data for year {year}.") from e
 
     def get_data_for_year(self, year: int) -> pd.DataFrame:
         """
@@ -75,25 +320,68 @@ class ONSClient:
         Raises:
             ONSDataProcessingError: If the data fails to download or be parsed into a DataFrame.
         """
+        return parse_downloaded_file(self.download_year(year))
+
+    def stream_year(self, year: int, consume: Callable[[Iterator[pa.RecordBatch]], T]) -> T:
+        """
+        Streams the CSV file of a year and hands its record batches to `consume` as the
+        bytes arrive, so memory is bounded by the chunk size instead of the file size.
+        A failed stream is retried from the start with a new iterator, so `consume` must
+        not keep what it read from a previous attempt.
+
+        Args:
+            year (int): The year of the data to download.
+            consume: Called with the batches of the file, in ONS_BASIN_SCHEMA.
+
+        Returns:
+            The value returned by `consume`.
+
+        Raises:
+            ONSDataProcessingError: If the data fails to download or be parsed.
+        """
         csv_url = self._get_csv_url_for_year(year)
-        
         try:
-            logging.info(f"Downloading data from: {csv_url}")
-            response = self.client.get(csv_url)
-            response.raise_for_status()
-            
-            # Read the CSV content from memory
-            csv_data = StringIO(response.text)
-            df = pd.read_csv(csv_data, delimiter=';')
+            return self._with_retries(csv_url, lambda: consume(self._iter_csv_batches(csv_url, year)))
+        except httpx.HTTPError as e:
+            raise ONSDataProcessingError(f"Network failure while downloading data for year {year}.") from e
+        except (pa.ArrowInvalid, KeyError) as e:
+            raise ONSDataProcessingError(f"Failed to parse or process data for year {year}.") from e
 
-            # Standardize the date column format
-            df['ena_data'] = pd.to_datetime(df['ena_data'], format='%Y-%m-%d').dt.date
-            df = df.astype(str)  # Converting to String
+    def _iter_csv_batches(self, csv_url: str, year: int) -> Iterator[pa.RecordBatch]:
+        """
+        Downloads `csv_url` in chunks and feeds them to an incremental Arrow CSV reader.
+        """
+        logging.info(f"Streaming data from: {csv_url}")
+        downloaded = ONS_DOWNLOAD_BYTES.labels(year=str(year))
 
-            logging.info(f"Data for year {year} processed successfully.")
-            return df
+        def counted(chunks: Iterator[bytes]) -> Iterator[bytes]:
+            for chunk in chunks:
+                downloaded.inc(len(chunk))
+                yield chunk
 
-        except httpx.RequestError as e:
-            raise ONSDataProcessingError(f"Network failure while downloading data for year {year}.") from e
-        except (pd.errors.ParserError, KeyError) as e:
-            raise ONSDataProcessingError(f"Failed to parse or process data for year {year}.") from e
\ No newline at end of file
+        with self.client.stream("GET", csv_url) as response:
+            response.raise_for_status()
+            # BufferedReader turns the short reads of the raw adapter into full blocks
+            chunks = counted(response.iter_bytes(self.chunk_size))
+            yield from self._read_csv_blocks(BufferedReader(_ByteChunkReader(chunks), buffer_size=self.chunk_size))
+
+    def _read_csv_blocks(self, source) -> Iterator[pa.RecordBatch]:
+        """Parses a binary CSV source block by block into ONS_BASIN_SCHEMA batches."""
+        reader = pa_csv.open_csv(
+            source,
+            read_options=pa_csv.ReadOptions(block_size=self.chunk_size),
+            parse_options=CSV_PARSE_OPTIONS,
+            # Fixed column types, so every block parses the same way regardless of its contents
+            convert_options=csv_convert_options(),
+        )
+        for batch in reader:
+            yield from conform_table(pa.Table.from_batches([batch])).to_batches()
+
+    def _read_streaming(self, csv_url: str, year: int) -> pd.DataFrame:
+        """
+        Assembles the streamed record batches of a yearly file into a DataFrame. Only
+        for files that need every row at once (the current year, for its fingerprint
+        and delta); historical years go through `stream_year` instead.
+        """
+        batches = list(self._iter_csv_batches(csv_url, year))
+        return pa.Table.from_batches(batches, schema=ONS_BASIN_SCHEMA).to_pandas()
@@ -0,0 +1,139 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from api.core.metrics import record_cache_lookup
+
+DEFAULT_METADATA_TTL_SECONDS = 900
+
+_YEAR_PATTERN = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+
+
+@dataclass(frozen=True)
+class ONSResource:
+    """
+    A single CSV resource of the ONS data package, as described by `package_show`.
+    Besides the download URL, it keeps the fields ONS publishes to describe the
+    file version (last modification, size and hash).
+    """
+    year: int
+    url: str
+    name: str = ""
+    last_modified: Optional[str] = None
+    size: Optional[int] = None
+    hash: Optional[str] = None
+
+    @property
+    def signature(self) -> Optional[Dict[str, str]]:
+        """
+        A string-only description of the resource version, suitable for storing as
+        object metadata and comparing against later fetches.
+
+        Returns:
+            Optional[Dict[str, str]]: The signature, or None if ONS reported no
+            version information for this resource.
+        """
+        if not (self.last_modified or self.size is not None or self.hash):
+            return None
+        return {
+            "url": self.url,
+            "last_modified": self.last_modified or "",
+            "size": str(self.size) if self.size is not None else "",
+            "hash": self.hash or "",
+        }
+
+
+def build_resource_index(resources: List[dict]) -> Dict[int, ONSResource]:
+    """
+    Builds a year -> resource index from the raw `package_show` resources list.
+    Only CSV resources are considered, and the first resource mentioning a year
+    wins, matching the order in which ONS lists them.
+
+    Args:
+        resources (List[dict]): The `result.resources` list of the package.
+
+    Returns:
+        Dict[int, ONSResource]: The resources indexed by year.
+    """
+    index: Dict[int, ONSResource] = {}
+    for resource in resources:
+        if resource.get("format", "").upper() != 'CSV':
+            continue
+        name = resource.get("name", "")
+        size = resource.get("size")
+        for match in _YEAR_PATTERN.findall(name):
+            year = int(match)
+            if year in index:
+                continue
+            index[year] = ONSResource(
+                year=year,
+                url=resource['url'],
+                name=name,
+                last_modified=resource.get("last_modified") or resource.get("metadata_modified"),
+                size=int(size) if size not in (None, "") else None,
+                hash=resource.get("hash") or None,
+            )
+    return index
+
+
+class ONSMetadataCache:
+    """
+    Thread-safe, TTL-bound cache of the ONS package metadata.
+    The index is built once per TTL window; concurrent callers wait for the
+    in-flight fetch instead of issuing their own `package_show` request.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_METADATA_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[int, ONSResource]] = None
+        self._expires_at = 0.0
+
+    def get_index(self, loader: Callable[[], List[dict]]) -> Dict[int, ONSResource]:
+        """
+        Returns the cached index, calling `loader` to refresh it when it is missing
+        or expired. Errors raised by the loader are propagated and not cached.
+
+        Args:
+            loader (Callable[[], List[dict]]): Fetches the raw resources list.
+
+        Returns:
+            Dict[int, ONSResource]: The resources indexed by year.
+        """
+        with self._lock:
+            fresh = self._index is not None and time.monotonic() < self._expires_at
+            record_cache_lookup("ons_metadata", fresh)
+            if not fresh:
+                self._index = build_resource_index(loader())
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return self._index
+
+    def peek(self) -> Optional[Dict[int, ONSResource]]:
+        """Returns the cached index if it is still fresh, without fetching anything."""
+        with self._lock:
+            if self._index is not None and time.monotonic() < self._expires_at:
+                return self._index
+            return None
+
+    def store(self, resources: List[dict]) -> Dict[int, ONSResource]:
+        """
+        Replaces the cached index with one built from an externally fetched resources
+        list (used by clients that cannot call a blocking loader, such as async ones).
+        """
+        index = build_resource_index(resources)
+        with self._lock:
+            self._index = index
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return index
+
+    def clear(self):
+        """Drops the cached index, forcing the next lookup to hit the ONS API."""
+        with self._lock:
+            self._index = None
+            self._expires_at = 0.0
+
+
+# Process-wide cache shared by every ONSClient instance.
+shared_metadata_cache = ONSMetadataCache()
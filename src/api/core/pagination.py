@@ -0,0 +1,47 @@
+import base64
+import binascii
+import json
+from datetime import date
+from typing import NamedTuple
+
+from api.core.exceptions import InvalidCursorError
+
+
+class PageKey(NamedTuple):
+    """Sort key of a row in the historical data ordering: (ena_data, nom_bacia)."""
+    ena_data: date
+    nom_bacia: str
+
+
+def encode_cursor(key: PageKey, start_date: date, end_date: date) -> str:
+    """
+    Builds an opaque cursor pointing just after `key`. The date range of the query is
+    embedded so the cursor cannot be replayed against a different range.
+    """
+    payload = {
+        "d": key.ena_data.isoformat(),
+        "b": key.nom_bacia,
+        "s": start_date.isoformat(),
+        "e": end_date.isoformat(),
+    }
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, start_date: date, end_date: date) -> PageKey:
+    """
+    Decodes a cursor issued by `encode_cursor` for the same date range.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or belongs to another date range.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw.decode("utf-8"))
+        key = PageKey(date.fromisoformat(payload["d"]), str(payload["b"]))
+        issued_for = (date.fromisoformat(payload["s"]), date.fromisoformat(payload["e"]))
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Malformed pagination cursor.") from e
+    if issued_for != (start_date, end_date):
+        raise InvalidCursorError("The pagination cursor was issued for a different date range.")
+    return key
@@ -0,0 +1,132 @@
+import sys
+import threading
+import time
+from datetime import date
+from typing import Hashable, Iterable, NamedTuple, Optional
+
+from cachetools import TTLCache
+
+from api.core.metrics import record_cache_lookup
+
+DEFAULT_QUERY_CACHE_MAX_BYTES = 64 * 1024 ** 2  # 64 MiB
+DEFAULT_QUERY_CACHE_TTL_SECONDS = 600
+# Rough size of the response envelope, on top of the items
+_RESULT_OVERHEAD_BYTES = 512
+
+
+class QueryCacheKey(NamedTuple):
+    """Identifies one historical-data response: the date range plus every paging option."""
+    start_date: date
+    end_date: date
+    page: int
+    size: int
+    cursor: Optional[str]
+    include_total: bool
+
+
+def estimate_result_size(result: dict) -> int:
+    """
+    Approximate memory held by a historical-data response: the shallow size of each
+    item plus the size of its field values. Used to bound the cache in bytes.
+    """
+    size = _RESULT_OVERHEAD_BYTES
+    for item in result.get("items", ()):
+        size += sys.getsizeof(item) + sum(sys.getsizeof(value) for value in vars(item).values())
+    return size
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts the entries evicted to make room for new ones."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.evictions = 0
+
+    def popitem(self):
+        # cachetools calls popitem only when the cache is over its maxsize
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class QueryResultCache:
+    """
+    Bounded in-memory cache of historical-data responses, shared by the per-request
+    services. Entries expire after `ttl_seconds`, the least recently used ones are
+    evicted once the cached responses exceed `max_bytes`, and an ingestion drops the
+    entries whose date range overlaps the years it changed.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_QUERY_CACHE_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_QUERY_CACHE_TTL_SECONDS, timer=time.monotonic):
+        """
+        Args:
+            max_bytes (int): Maximum estimated size of the cached responses.
+            ttl_seconds (float): How long a response is served from the cache.
+            timer: Clock used to expire the entries.
+        """
+        if max_bytes <= 0 or ttl_seconds <= 0:
+            raise ValueError("The query cache size and TTL must be positive.")
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._cache = _CountingTTLCache(maxsize=max_bytes, ttl=ttl_seconds, timer=timer,
+                                        getsizeof=estimate_result_size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        record_cache_lookup("query_result", result is not None)
+        return result
+
+    def put(self, key: Hashable, result: dict) -> None:
+        with self._lock:
+            try:
+                self._cache[key] = result
+            except ValueError:
+                # A single response larger than the whole cache is simply not cached
+                pass
+
+    def invalidate_years(self, years: Iterable[int]) -> int:
+        """
+        Drops the entries whose date range overlaps any of `years`.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        years = set(years)
+        with self._lock:
+            stale = [key for key in list(self._cache.keys())
+                     if any(key.start_date.year <= year <= key.end_date.year for year in years)]
+            for key in stale:
+                self._cache.pop(key, None)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict:
+        """Hit, miss, eviction and invalidation counters plus the current occupancy."""
+        with self._lock:
+            self._cache.expire()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._cache.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._cache),
+                "current_bytes": self._cache.currsize,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+            }
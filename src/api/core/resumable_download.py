@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from api.core.exceptions import ONSDataProcessingError
+
+DEFAULT_MAX_ATTEMPTS = 5
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+_CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)\s*$")
+# Hash algorithms identified by the length of the hex digest published by ONS/CKAN
+_HASH_BY_LENGTH = {32: "md5", 40: "sha1", 64: "sha256"}
+
+
+class ResumableDownloader:
+    """
+    Downloads large files in chunks, resuming interrupted transfers with HTTP Range
+    requests. The partial file (`.part`) and a small JSON checkpoint survive both the
+    in-process retries and later calls, so a new ingestion continues from the last
+    byte received. The integrity of the file is checked once it is complete.
+    """
+
+    def __init__(self, client: httpx.Client, download_dir: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 chunk_size: int = DOWNLOAD_CHUNK_SIZE, retry_delay: float = 1.0):
+        """
+        Args:
+            client (httpx.Client): Client used for the requests.
+            download_dir (str): Directory for the partial and completed files.
+            max_attempts (int): Maximum number of requests per download.
+            chunk_size (int): Size in bytes of the write buffer and of the hashing reads.
+            retry_delay (float): Base delay in seconds between attempts (doubled each time).
+        """
+        self.client = client
+        self.download_dir = Path(download_dir)
+        self.max_attempts = max_attempts
+        self.chunk_size = chunk_size
+        self.retry_delay = retry_delay
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str):
+        name = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return (
+            self.download_dir / name,
+            self.download_dir / f"{name}.part",
+            self.download_dir / f"{name}.part.json",
+        )
+
+    @staticmethod
+    def _read_checkpoint(checkpoint_path: Path, url: str) -> dict:
+        try:
+            checkpoint = json.loads(checkpoint_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return checkpoint if checkpoint.get("url") == url else {}
+
+    def download(self, url: str, expected_size: Optional[int] = None, expected_hash: Optional[str] = None) -> Path:
+        """
+        Downloads `url` to a local file, resuming a previous partial download if any.
+
+        Args:
+            url (str): The URL of the file.
+            expected_size (Optional[int]): Size published by the source, checked at the end.
+            expected_hash (Optional[str]): Hex digest (md5, sha1 or sha256) published by the source.
+
+        Returns:
+            Path: The completed file. The caller owns it and should delete it when done.
+
+        Raises:
+            httpx.HTTPError: If the transfer still fails after all attempts.
+            ONSDataProcessingError: If the completed file fails the integrity check.
+        """
+        final_path, part_path, checkpoint_path = self._paths(url)
+
+        for attempt in range(1, self.max_attempts + 1):
+            checkpoint = self._read_checkpoint(checkpoint_path, url)
+            offset = part_path.stat().st_size if checkpoint and part_path.exists() else 0
+            try:
+                self._transfer(url, offset, checkpoint, part_path, checkpoint_path)
+                break
+            except httpx.TransportError as e:
+                if attempt == self.max_attempts:
+                    raise
+                received = part_path.stat().st_size if part_path.exists() else 0
+                logging.warning(
+                    f"Download de {url} interrompido após {received} bytes (tentativa {attempt}): {e}. Retomando..."
+                )
+                time.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+        checkpoint = self._read_checkpoint(checkpoint_path, url)
+        self._verify(url, part_path, checkpoint.get("total") or expected_size, expected_hash)
+        os.replace(part_path, final_path)
+        checkpoint_path.unlink(missing_ok=True)
+        return final_path
+
+    def _transfer(self, url: str, offset: int, checkpoint: dict, part_path: Path, checkpoint_path: Path):
+        """Performs one request, appending to the partial file when the server honours the range."""
+        # Byte ranges refer to the stored representation, so ask for it uncompressed
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if checkpoint.get("validator"):
+                # If the file changed on the server, it answers 200 with the full new content
+                headers["If-Range"] = checkpoint["validator"]
+
+        with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 416:
+                # Nothing left to send: the partial file already holds the whole content
+                if checkpoint.get("total") == offset:
+                    return
+                part_path.unlink(missing_ok=True)
+                checkpoint_path.unlink(missing_ok=True)
+                raise httpx.RemoteProtocolError("Range not satisfiable; restarting download.", request=response.request)
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                logging.info(f"Retomando download de {url} a partir do byte {offset}.")
+                mode = "ab"
+                match = _CONTENT_RANGE_TOTAL.search(response.headers.get("Content-Range", ""))
+                total = int(match.group(1)) if match else checkpoint.get("total")
+            else:
+                mode = "wb"
+                length = response.headers.get("Content-Length")
+                total = int(length) if length else None
+
+            checkpoint = {
+                "url": url,
+                "validator": response.headers.get("ETag") or response.headers.get("Last-Modified"),
+                "total": total,
+            }
+            checkpoint_path.write_text(json.dumps(checkpoint))
+
+            # Chunks are written as they arrive, so a dropped connection loses nothing received
+            with open(part_path, mode, buffering=self.chunk_size) as part_file:
+                for chunk in response.iter_bytes():
+                    part_file.write(chunk)
+
+    def _verify(self, url: str, part_path: Path, expected_size: Optional[int], expected_hash: Optional[str]):
+        """Checks the size and, when published, the digest of the completed file."""
+        size = part_path.stat().st_size
+        problem = None
+        if expected_size is not None and size != expected_size:
+            problem = f"expected {expected_size} bytes, got {size}"
+        elif expected_hash and len(expected_hash) in _HASH_BY_LENGTH:
+            digest = hashlib.new(_HASH_BY_LENGTH[len(expected_hash)])
+            with open(part_path, "rb") as part_file:
+                for chunk in iter(lambda: part_file.read(self.chunk_size), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != expected_hash.lower():
+                problem = "checksum mismatch"
+
+        if problem:
+            # A corrupted file cannot be resumed; start over on the next attempt
+            part_path.unlink(missing_ok=True)
+            self._paths(url)[2].unlink(missing_ok=True)
+            raise ONSDataProcessingError(f"Integrity check failed for {url}: {problem}.")
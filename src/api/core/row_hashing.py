@@ -0,0 +1,106 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from api.models.arrow_schema import BASIN_KEY_COLUMNS, BASIN_MEASURE_COLUMNS
+
+ROW_HASH_COLUMN = "row_hash"
+# Key of DataFrame.attrs where the ONS clients store the fingerprint computed while parsing
+CONTENT_FINGERPRINT_ATTR = "content_fingerprint"
+
+
+def row_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the (nom_bacia, ena_data) key of every row, with the basin name as plain text."""
+    return pd.DataFrame({
+        "nom_bacia": df["nom_bacia"].astype(str).to_numpy(),
+        "ena_data": df["ena_data"].to_numpy(),
+    })
+
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """
+    Computes a deterministic 64-bit hash of the measures of every row (vectorized),
+    so rows with the same key can be compared without looking at each value.
+    """
+    measures = [column for column in BASIN_MEASURE_COLUMNS if column in df.columns]
+    if not measures:
+        return pd.Series(0, index=range(len(df)), dtype="uint64")
+    return pd.util.hash_pandas_object(df[measures], index=False).reset_index(drop=True)
+
+
+def build_row_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Builds the (nom_bacia, ena_data, row_hash) index of a DataFrame."""
+    index = row_keys(df)
+    index[ROW_HASH_COLUMN] = row_hashes(df).to_numpy()
+    return index
+
+
+def content_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Computes a fingerprint of the content of a download: the SHA-256 of the sorted
+    per-row hashes of the canonicalised rows (basin name as text, date, measures as
+    float64). It does not depend on row order, column order or dtypes, so a republished
+    file with the same rows has the same fingerprint.
+    """
+    canonical = pd.DataFrame({
+        "nom_bacia": df["nom_bacia"].astype(str).to_numpy(),
+        "ena_data": pd.to_datetime(df["ena_data"]).to_numpy().astype("datetime64[D]"),
+    })
+    for column in BASIN_MEASURE_COLUMNS:
+        values = df[column] if column in df.columns else np.nan
+        canonical[column] = pd.to_numeric(pd.Series(values, index=df.index), errors="coerce").to_numpy(dtype="float64")
+    hashes = np.sort(pd.util.hash_pandas_object(canonical, index=False).to_numpy())
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+@dataclass
+class RowDelta:
+    """Result of comparing a fresh download with the rows already ingested."""
+    changed_rows: pd.DataFrame
+    index: pd.DataFrame
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+def compute_row_delta(df: pd.DataFrame, previous_index: Optional[pd.DataFrame]) -> RowDelta:
+    """
+    Compares a fresh download with the index of the rows already ingested.
+
+    Args:
+        df (pd.DataFrame): The freshly downloaded data.
+        previous_index (Optional[pd.DataFrame]): The (nom_bacia, ena_data, row_hash) index
+            of the data already ingested, or None if there is none.
+
+    Returns:
+        RowDelta: The new or changed rows, the updated index and the row counts.
+    """
+    current_index = build_row_index(df)
+    if previous_index is None or previous_index.empty:
+        return RowDelta(changed_rows=df, index=current_index, inserted=len(df), updated=0, unchanged=0)
+
+    # Nullable UInt64 keeps the 64-bit hashes exact when a key has no previous match
+    previous = previous_index.rename(columns={ROW_HASH_COLUMN: "previous_hash"})
+    previous["previous_hash"] = previous["previous_hash"].astype("UInt64")
+    merged = current_index.merge(previous, on=list(BASIN_KEY_COLUMNS), how="left", indicator=True)
+    is_new = (merged["_merge"] == "left_only").to_numpy()
+    same_hash = (merged["previous_hash"] == merged[ROW_HASH_COLUMN].astype("UInt64")).fillna(False)
+    is_unchanged = (~is_new) & same_hash.to_numpy(dtype=bool)
+    is_updated = ~(is_new | is_unchanged)
+
+    # Keys that disappeared from the new download stay in the index
+    kept = previous_index.merge(current_index[list(BASIN_KEY_COLUMNS)], on=list(BASIN_KEY_COLUMNS),
+                                how="left", indicator=True)
+    kept = kept[kept["_merge"] == "left_only"].drop(columns="_merge")
+    new_index = pd.concat([kept, current_index], ignore_index=True)
+
+    return RowDelta(
+        changed_rows=df[is_new | is_updated].reset_index(drop=True),
+        index=new_index,
+        inserted=int(is_new.sum()),
+        updated=int(is_updated.sum()),
+        unchanged=int(is_unchanged.sum()),
+    )
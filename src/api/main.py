@@ -1,17 +1,81 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
+from api.core.app_clients import AppClients
+from api.core.metrics import HTTP_REQUEST_SECONDS, render_latest
 from api.routers import basin
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the network clients shared by all requests on startup. On shutdown, stops
+    the background ingestion jobs that have not started, stops the ingestion pipeline
+    (its queued years are failed, the ones in progress finish), stops the summary
+    reader pool and closes the clients, with their connection pools.
+    """
+    app.state.clients = AppClients.from_env()
+    try:
+        yield
+    finally:
+        ingest_jobs = getattr(app.state, "ingest_jobs", None)
+        if ingest_jobs is not None:
+            ingest_jobs.shutdown()
+            app.state.ingest_jobs = None
+        ingest_pipeline = getattr(app.state, "ingest_pipeline", None)
+        if ingest_pipeline is not None:
+            ingest_pipeline.shutdown(cancel_pending=True)
+            app.state.ingest_pipeline = None
+            # Closed by the pipeline, on the loop its downloads ran on
+            app.state.async_ons_client = None
+        summary_executor = getattr(app.state, "summary_executor", None)
+        if summary_executor is not None:
+            summary_executor.shutdown()
+            app.state.summary_executor = None
+        app.state.clients.close()
+
 # Initialize the FastAPI application
 app = FastAPI(
     title="Sauter Basin Data API",
     description="An API to download and query basin data from Brazil's National System Operator (ONS).",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Include the routes defined in the basin router module.
 # This keeps the main application file clean and organized.
 app.include_router(basin.router)
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Records the latency of every request per route template (e.g. `/ingest/{job_id}`),
+    so the metric labels do not grow with the path parameters.
+    """
+    start = time.perf_counter()
+    status = "500"  # An exception escaping the app is answered with a 500
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        ).observe(time.perf_counter() - start)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Exposes the ingestion, BigQuery, cache and request metrics in the Prometheus
+    text format, to be scraped by a Prometheus server.
+    """
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/")
 async def read_root():
     """
@@ -0,0 +1,195 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+# --- Arrow schema of the basin data files ---
+
+BASIN_KEY_COLUMNS = ("nom_bacia", "ena_data")
+_EPOCH = date(1970, 1, 1)
+
+BASIN_MEASURE_COLUMNS = (
+    "ena_bruta_bacia_mwmed",
+    "ena_bruta_bacia_percentualmlt",
+    "ena_armazenavel_bacia_mwmed",
+    "ena_armazenavel_bacia_percentualmlt",
+)
+
+ONS_BASIN_SCHEMA = pa.schema(
+    [
+        pa.field("nom_bacia", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("ena_data", pa.date32()),
+    ]
+    + [pa.field(column, pa.float64()) for column in BASIN_MEASURE_COLUMNS]
+)
+
+
+def csv_convert_options() -> pa_csv.ConvertOptions:
+    """
+    Conversion options for reading an ONS CSV file straight into the basin schema.
+    The measures are read as text first, so decimal commas can be normalized by
+    `conform_table` before they are cast to float64.
+    """
+    column_types = {
+        "nom_bacia": pa.dictionary(pa.int32(), pa.string()),
+        "ena_data": pa.date32(),
+    }
+    column_types.update({column: pa.string() for column in BASIN_MEASURE_COLUMNS})
+    return pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+
+
+# Numbers accepted in a text measure once its decimal comma is replaced by a dot
+_NUMBER_PATTERN = r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$"
+
+
+def _parse_decimal(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Casts a text measure to float64, accepting both '1.5' and '1,5'. Empty cells and
+    text that is not a number become null, as SAFE_CAST does in the silver query, so
+    one bad cell does not fail the whole file.
+    """
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        return column.cast(pa.float64())
+    normalized = pc.replace_substring(pc.utf8_trim_whitespace(column), ",", ".")
+    is_number = pc.match_substring_regex(normalized, _NUMBER_PATTERN)
+    return pc.if_else(is_number, normalized, pa.scalar(None, normalized.type)).cast(pa.float64())
+
+
+def has_legacy_types(schema: pa.Schema) -> bool:
+    """
+    Whether a stored file predates the typed schema, i.e. holds its dates or measures
+    as text. Such files are rewritten by the compaction (see CompactionService).
+    """
+    for field in ONS_BASIN_SCHEMA:
+        if field.name == "nom_bacia":
+            continue  # Text in both layouts; only its encoding differs
+        index = schema.get_field_index(field.name)
+        if index != -1 and schema.field(index).type != field.type:
+            return True
+    return False
+
+
+def _clean_measure(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Column-wise equivalent of BasinSilverData's measure validator: NaN and nulls
+    become null, '1,5' becomes 1.5 and text that is not a number becomes 0.0.
+    """
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        normalized = pc.replace_substring(pc.utf8_trim_whitespace(column), ",", ".")
+        is_number = pc.match_substring_regex(normalized, _NUMBER_PATTERN)
+        numbers = pc.if_else(is_number, normalized, pa.scalar(None, normalized.type)).cast(pa.float64())
+        return pc.if_else(is_number, numbers, pa.scalar(0.0))
+    column = column.cast(pa.float64())
+    return pc.if_else(pc.is_nan(column), pa.scalar(None, pa.float64()), column)
+
+
+def clean_response_rows(table: pa.Table) -> tuple[pa.Table, pa.ChunkedArray]:
+    """
+    Prepares a page of query results for the response model in a few vectorized
+    passes: dictionary names are decoded, dates cast to date32 and measures cleaned,
+    with missing measure columns filled with nulls.
+
+    Returns:
+        tuple[pa.Table, pa.ChunkedArray]: The cleaned table, with the columns of
+            BasinSilverData only, and the mask of its valid rows (both key columns set).
+
+    Raises:
+        pa.ArrowInvalid: If a key column cannot be converted, e.g. a malformed date.
+    """
+    names = table.column("nom_bacia") if "nom_bacia" in table.column_names else pa.nulls(table.num_rows, pa.string())
+    if pa.types.is_dictionary(names.type):
+        names = names.cast(names.type.value_type)
+    days = table.column("ena_data") if "ena_data" in table.column_names else pa.nulls(table.num_rows, pa.date32())
+    columns = {"nom_bacia": names, "ena_data": days.cast(pa.date32())}
+    for column in BASIN_MEASURE_COLUMNS:
+        columns[column] = (_clean_measure(table.column(column)) if column in table.column_names
+                           else pa.nulls(table.num_rows, pa.float64()))
+    cleaned = pa.table(columns)
+    valid = pc.and_(pc.is_valid(cleaned.column("nom_bacia")), pc.is_valid(cleaned.column("ena_data")))
+    return cleaned, valid
+
+
+def to_response_rows(table: pa.Table) -> list[dict]:
+    """
+    Row dicts of a cleaned page (see clean_response_rows) without nulls in the key
+    columns, built column by column: each distinct date is converted once and null
+    measures come out as NaN, which BasinSilverData maps back to None. This is
+    about twice as fast as `Table.to_pylist` on a page of a thousand rows.
+    """
+    names = table.column("nom_bacia").to_pylist()
+    days, positions = np.unique(table.column("ena_data").cast(pa.int32()).to_numpy(), return_inverse=True)
+    distinct_dates = [_EPOCH + timedelta(days=int(day)) for day in days]
+    dates = [distinct_dates[position] for position in positions]
+    measures = [table.column(column).to_numpy(zero_copy_only=False).tolist() for column in BASIN_MEASURE_COLUMNS]
+    columns = ("nom_bacia", "ena_data") + BASIN_MEASURE_COLUMNS
+    return [dict(zip(columns, row)) for row in zip(names, dates, *measures)]
+
+
+def conform_table(table: pa.Table) -> pa.Table:
+    """
+    Converts a freshly parsed ONS table to ONS_BASIN_SCHEMA: column order is fixed,
+    missing measure columns are filled with nulls and unknown columns are dropped.
+
+    Measures that are not numbers become null.
+
+    Raises:
+        KeyError: If one of the key columns (`nom_bacia`, `ena_data`) is missing.
+        pa.ArrowInvalid: If a key value cannot be converted to the schema type.
+    """
+    columns = []
+    for field in ONS_BASIN_SCHEMA:
+        if field.name not in table.column_names:
+            if field.name in BASIN_KEY_COLUMNS:
+                raise KeyError(field.name)
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table.column(field.name)
+        if field.name in BASIN_MEASURE_COLUMNS:
+            column = _parse_decimal(column)
+        columns.append(column.cast(field.type))
+    return pa.Table.from_arrays(columns, schema=ONS_BASIN_SCHEMA)
+
+
+def to_basin_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Converts a DataFrame to an Arrow table, restoring the basin schema types for the
+    columns it knows about (pandas turns dictionaries into categoricals and dates into
+    objects). Any other column, such as `data_carga_bronze`, keeps its inferred type.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for field in ONS_BASIN_SCHEMA:
+        index = table.schema.get_field_index(field.name)
+        if index != -1 and table.schema.field(index).type != field.type:
+            table = table.set_column(index, field, table.column(index).cast(field.type))
+    return table
+
+
+# Column added while reading several partitions, holding the partition of each row
+PARTITION_COLUMN = "_partition"
+# Historical files rank below any current-year partition, as in the silver table
+HISTORICAL_PARTITION = "1900-01-01"
+
+
+def keep_latest_rows(table: pa.Table, partition_column: str) -> pa.Table:
+    """
+    Deduplicates rows loaded from several partitions: for each (nom_bacia, ena_data)
+    only the row of the newest partition (the greatest `partition_column` value) is
+    kept, matching the silver table's deduplication. The result is ordered by
+    (ena_data, nom_bacia).
+    """
+    if table.num_rows == 0:
+        return table
+    # Dictionary columns cannot be sorted directly, so the keys are decoded first
+    keys = {}
+    for column in ("ena_data", "nom_bacia", partition_column):
+        values = table.column(column)
+        keys[column] = values.cast(values.type.value_type) if pa.types.is_dictionary(values.type) else values
+    keys = pa.table(keys)
+    order = pc.sort_indices(keys, sort_keys=[("ena_data", "ascending"), ("nom_bacia", "ascending"),
+                                             (partition_column, "descending")])
+    sorted_keys = keys.take(order).select(["ena_data", "nom_bacia"]).to_pandas()
+    is_latest = ~sorted_keys.duplicated(keep="first").to_numpy()
+    return table.take(order).filter(pa.array(is_latest))
@@ -1,6 +1,6 @@
 import math
-from typing import Any, List, Generic, TypeVar, Optional
-from datetime import date
+from typing import Any, Dict, List, Generic, TypeVar, Optional
+from datetime import date, datetime
 from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
 
 
@@ -19,6 +19,24 @@ class IngestDataRequest(BaseModel):
             raise ValueError('End date cannot be earlier than start date.')
         return self
 
+class IngestJob(BaseModel):
+    """
+    State of a background ingestion job, as returned by POST /ingest and polled with
+    GET /ingest/{job_id}. `years` holds the status of each requested year while the
+    job runs; `summary` and `details` are the ingestion report once it finishes.
+    """
+    job_id: str
+    status: str = Field(..., description="PENDENTE, EM_ANDAMENTO, CONCLUIDO or FALHA.")
+    start_date: date
+    end_date: date
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    years: Dict[int, str] = Field(default_factory=dict, description="Status of each requested year.")
+    summary: Optional[Dict[str, Any]] = None
+    details: List[Dict[str, Any]] = Field(default_factory=list)
+    error: Optional[str] = None
+
 # --- Data Transfer Object (DTO) Models ---
 
 class BasinSilverData(BaseModel):
@@ -48,7 +66,10 @@ class BasinSilverData(BaseModel):
         A pre-validator that cleans the 'volume_percent_useful' field.
         It handles None, NaN, and comma-decimal values before the main validation.
         """
-        if v is None or (isinstance(v, float) and math.isnan(v)):
+        if isinstance(v, float):
+            # Fast path for values already cleaned column-wise (see clean_response_rows)
+            return None if math.isnan(v) else v
+        if v is None:
             return None
         try:
             # Convert comma-separated decimals to dot-separated and then to float
@@ -57,17 +78,43 @@ class BasinSilverData(BaseModel):
             # If conversion fails (e.g., for an empty string), return None
             return 0.0
 
+class BasinAggregate(BaseModel):
+    """Aggregates of one metric for a basin over one period (week, month or year)."""
+    nom_bacia: str
+    period_start: date
+    count: int = Field(..., description="Number of daily values aggregated.")
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    sum: Optional[float] = None
+
+class AggregatesResponse(BaseModel):
+    """
+    Per-basin aggregates of a metric. The requested range is widened to whole periods,
+    reported in `start_date`/`end_date`; `source` tells whether the precomputed
+    summaries or the raw rows were read.
+    """
+    granularity: str
+    metric: str
+    start_date: date
+    end_date: date
+    source: str
+    items: List[BasinAggregate]
+
 # --- Paginated Response Models ---
 
 T = TypeVar('T') # Generic type variable for paginated items
 
 class PaginatedResponse(BaseModel, Generic[T]):
     """
-    A generic model for offset/limit paginated API responses.
+    A generic model for paginated API responses, by page number or by cursor.
     Provides metadata about the pagination state along with the data items.
+    The totals are omitted in cursor mode when they were not requested, and
+    `next_cursor` is absent on the last page.
     """
-    total_items: int
-    total_pages: int
-    current_page: int
+    total_items: Optional[int] = None
+    total_pages: Optional[int] = None
+    current_page: Optional[int] = None
     items_on_page: int
-    items: List[T]
\ No newline at end of file
+    items: List[T]
+    next_cursor: Optional[str] = None
\ No newline at end of file
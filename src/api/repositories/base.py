@@ -0,0 +1,49 @@
+from datetime import date
+from typing import Optional, Protocol
+
+import pyarrow as pa
+
+from api.core.pagination import PageKey
+
+
+class BasinDataRepository(Protocol):
+    """
+    Contract of the repositories that serve the historical basin data queries.
+    Implemented by BigQueryRepository and GCSParquetRepository.
+    """
+
+    def find_by_date_range(self, start_date: date, end_date: date, page: int, size: int) -> tuple[pa.Table, int]:
+        """
+        Returns one page of the rows with `ena_data` between the two dates (inclusive),
+        ordered by (ena_data, nom_bacia), and the total number of matching rows.
+        Pages are Arrow tables holding the BasinSilverData columns.
+        """
+        ...
+
+    def count_by_date_range(self, start_date: date, end_date: date) -> int:
+        """Counts the rows with `ena_data` between the two dates (inclusive)."""
+        ...
+
+    def find_page_after(self, start_date: date, end_date: date, size: int,
+                        after: Optional[PageKey] = None) -> tuple[pa.Table, bool]:
+        """
+        Keyset pagination: returns up to `size` rows that follow `after` in
+        (ena_data, nom_bacia) order, and whether more rows follow.
+        """
+        ...
+
+    def find_page_after_with_count(self, start_date: date, end_date: date, size: int,
+                                   after: Optional[PageKey] = None) -> tuple[pa.Table, bool, int]:
+        """
+        Same as `find_page_after`, also returning the total number of rows in the range,
+        without paying for the count and the page one after the other.
+        """
+        ...
+
+    def aggregate_by_period(self, start_date: date, end_date: date, granularity: str, metric: str) -> pa.Table:
+        """
+        Aggregates one metric per basin and period (week, month or year) over the rows
+        with `ena_data` in the range: nom_bacia, period_start, count, min, max, mean
+        and sum, ordered by (period_start, nom_bacia).
+        """
+        ...
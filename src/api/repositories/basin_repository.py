@@ -1,14 +1,19 @@
 import pandas as pd
+import pyarrow.parquet as pq
 from datetime import date
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+
+from api.core.parquet_profiles import ParquetWriterProfile, get_parquet_profile
+from api.models.arrow_schema import to_basin_table
 
 class BasinRepository:
     """Repository that persists and reads basin data in annual files,
     organized by ingestion date."""
 
-    def __init__(self, base_dir: str = "basin_data"):
+    def __init__(self, base_dir: str = "basin_data", parquet_profile: Optional[ParquetWriterProfile] = None):
         self.base_dir = Path(base_dir)
+        self.parquet_profile = parquet_profile or get_parquet_profile()
 
     def _get_path_for_ingestion(self, ingestion_date: date, year: int) -> Path:
         date_folder = ingestion_date.strftime('%Y-%m-%d')
@@ -18,7 +23,10 @@ class BasinRepository:
         file_path = self._get_path_for_ingestion(ingestion_date, year)
         file_path.parent.mkdir(parents=True, exist_ok=True)
         print(f"Saving data for year {year} to '{file_path}'")
-        df.to_parquet(file_path, index=False)
+        table = to_basin_table(df)
+        with pq.ParquetWriter(file_path, table.schema, **self.parquet_profile.writer_kwargs()) as writer:
+            for batch in self.parquet_profile.iter_row_groups(table):
+                writer.write_batch(batch, row_group_size=self.parquet_profile.row_group_size)
 
     def find_by_date_range(self, start_date: date, end_date: date) -> pd.DataFrame:
         """Busca dados lendo apenas os arquivos Parquet dos anos necessários."""
@@ -1,60 +1,222 @@
-import pandas as pd
+import time
+import pyarrow as pa
 from datetime import date
+from typing import NamedTuple, Optional
 from google.cloud import bigquery
 
+from api.core.aggregation import validate_aggregation
+from api.core.metrics import BIGQUERY_JOB_SECONDS, BIGQUERY_ROWS
+from api.core.pagination import PageKey
+from api.models.arrow_schema import BASIN_KEY_COLUMNS, BASIN_MEASURE_COLUMNS
+
+# Window-count column added to the page query; dropped before the page is returned
+TOTAL_COUNT_COLUMN = "_total_count"
+# Only the columns served by the API (BasinSilverData) are read
+SELECT_COLUMNS = ", ".join(BASIN_KEY_COLUMNS + BASIN_MEASURE_COLUMNS)
+# BigQuery truncation parts of the aggregation granularities; weeks start on Monday
+_DATE_TRUNC_PARTS = {"week": "WEEK(MONDAY)", "month": "MONTH", "year": "YEAR"}
+# Pages of at least this many rows are downloaded through the BigQuery Storage Read API
+DEFAULT_STORAGE_API_MIN_ROWS = 1000
+
+
+class _SubmittedJob(NamedTuple):
+    """A running query job, with what is needed to record its latency once its result is read."""
+    job: bigquery.QueryJob
+    query: str
+    submitted_at: float
+
+
 class BigQueryRepository:
     """
     Repository for interacting with Google BigQuery.
     Abstracts query logic to the historical data table.
     """
-    def __init__(self, project_id: str, dataset_id: str, table_id: str):
+    def __init__(self, project_id: str, dataset_id: str, table_id: str,
+                 client: Optional[bigquery.Client] = None,
+                 storage_api_min_rows: int = DEFAULT_STORAGE_API_MIN_ROWS):
+        """
+        Args:
+            project_id (str): The GCP project of the table.
+            dataset_id (str): The BigQuery dataset.
+            table_id (str): The historical data table.
+            client (Optional[bigquery.Client]): Client used to run the jobs. Defaults to a
+                client for `project_id` with the default credentials.
+            storage_api_min_rows (int): Smallest page fetched through the Storage Read API,
+                which streams Arrow record batches in parallel instead of paging JSON rows.
+                Smaller pages use the REST download, which avoids opening a read session.
+        """
         if not all([project_id, dataset_id, table_id]):
             raise ValueError("IDs de Projeto, Dataset e Tabela são necessários para o BigQuery.")
-        self.client = bigquery.Client(project=project_id)
+        self.client = client or bigquery.Client(project=project_id)
         self.table_ref = f"`{project_id}.{dataset_id}.{table_id}`"
+        self.storage_api_min_rows = storage_api_min_rows
 
-    def find_by_date_range(self, start_date: date, end_date: date, page: int, size: int) -> tuple[pd.DataFrame, int]:
+    @staticmethod
+    def _range_params(start_date: date, end_date: date) -> list:
+        return [
+            bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
+            bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
+        ]
+
+    def _submit(self, query: str, sql: str, job_config: bigquery.QueryJobConfig) -> _SubmittedJob:
+        """Starts a job; `query` names it in the BigQuery metrics."""
+        submitted_at = time.perf_counter()
+        return _SubmittedJob(self.client.query(sql, job_config=job_config), query, submitted_at)
+
+    @staticmethod
+    def _record(submitted: _SubmittedJob, rows: int) -> None:
+        """Records the time from the submission to the downloaded result, and its rows."""
+        BIGQUERY_JOB_SECONDS.labels(query=submitted.query).observe(time.perf_counter() - submitted.submitted_at)
+        BIGQUERY_ROWS.labels(query=submitted.query).observe(rows)
+
+    def _fetch_arrow(self, submitted: _SubmittedJob, rows: int) -> pa.Table:
         """
-        Fetches paginated data directly from BigQuery using SELECT *.
-        Delegates filtering, sorting, and pagination to the BQ engine.
+        Downloads a query result as an Arrow table, without building a DataFrame.
+        When the Storage API client library is not installed, BigQuery falls back to REST.
         """
-        offset = (page - 1) * size
+        table = submitted.job.to_arrow(create_bqstorage_client=rows >= self.storage_api_min_rows)
+        self._record(submitted, table.num_rows)
+        return table
 
+    def _submit_count(self, start_date: date, end_date: date) -> _SubmittedJob:
         # Query para contar o total de itens (para metadados da paginação)
         count_query = f"""
             SELECT COUNT(*) as total
             FROM {self.table_ref}
             WHERE ena_data BETWEEN @start_date AND @end_date
         """
-        query_params_count = [
-            bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
-            bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
-        ]
-        job_config_count = bigquery.QueryJobConfig(query_parameters=query_params_count)
-        
-        total_items_result = self.client.query(count_query, job_config=job_config_count).to_dataframe()
-        total_items = total_items_result['total'][0] if not total_items_result.empty else 0
+        job_config_count = bigquery.QueryJobConfig(query_parameters=self._range_params(start_date, end_date))
+        return self._submit("count", count_query, job_config_count)
+
+    def _count_result(self, submitted: _SubmittedJob) -> int:
+        total_items_result = submitted.job.to_dataframe()
+        self._record(submitted, len(total_items_result))
+        return int(total_items_result['total'][0]) if not total_items_result.empty else 0
+
+    def count_by_date_range(self, start_date: date, end_date: date) -> int:
+        """Counts the rows with `ena_data` between the two dates (inclusive)."""
+        return self._count_result(self._submit_count(start_date, end_date))
+
+    def find_by_date_range(self, start_date: date, end_date: date, page: int, size: int) -> tuple[pa.Table, int]:
+        """
+        Fetches one page and the total number of matching rows in a single BigQuery job:
+        the total comes from a `COUNT(*) OVER()` window, evaluated before LIMIT/OFFSET.
+        Delegates filtering, sorting, and pagination to the BQ engine.
 
-        if total_items == 0:
-            return pd.DataFrame(), 0
+        Returns:
+            tuple[pa.Table, int]: The page with the API columns, and the range total.
+        """
+        offset = (page - 1) * size
 
-        # Query to fetch all columns from the current page
+        # Query to fetch the API columns of the current page, along with the range total
         data_query = f"""
             SELECT
-                *
+                {SELECT_COLUMNS},
+                COUNT(*) OVER() AS {TOTAL_COUNT_COLUMN}
             FROM {self.table_ref}
             WHERE ena_data BETWEEN @start_date AND @end_date
             ORDER BY ena_data, nom_bacia
             LIMIT @size OFFSET @offset
         """
-        query_params_data = [
-            bigquery.ScalarQueryParameter("start_date", "DATE", start_date),
-            bigquery.ScalarQueryParameter("end_date", "DATE", end_date),
+        query_params_data = self._range_params(start_date, end_date) + [
             bigquery.ScalarQueryParameter("size", "INT64", size),
             bigquery.ScalarQueryParameter("offset", "INT64", offset),
         ]
         job_config_data = bigquery.QueryJobConfig(query_parameters=query_params_data)
 
-        paginated_df = self.client.query(data_query, job_config=job_config_data).to_dataframe()
-        
-        return paginated_df, total_items
\ No newline at end of file
+        page_table = self._fetch_arrow(self._submit("page", data_query, job_config_data), size)
+
+        if page_table.num_rows == 0:
+            # A page past the end carries no window total; only then a count job is needed
+            total_items = self.count_by_date_range(start_date, end_date) if offset > 0 else 0
+            return page_table.drop_columns([TOTAL_COUNT_COLUMN]), total_items
+
+        total_items = page_table.column(TOTAL_COUNT_COLUMN)[0].as_py()
+        return page_table.drop_columns([TOTAL_COUNT_COLUMN]), total_items
+
+    def _submit_page_after(self, start_date: date, end_date: date, size: int,
+                           after: Optional[PageKey]) -> _SubmittedJob:
+        after_clause = ""
+        query_params = self._range_params(start_date, end_date) + [
+            # One extra row tells whether there is a next page without counting
+            bigquery.ScalarQueryParameter("limit", "INT64", size + 1),
+        ]
+        if after is not None:
+            after_clause = "AND (ena_data > @after_date OR (ena_data = @after_date AND nom_bacia > @after_basin))"
+            query_params += [
+                bigquery.ScalarQueryParameter("after_date", "DATE", after.ena_data),
+                bigquery.ScalarQueryParameter("after_basin", "STRING", after.nom_bacia),
+            ]
+
+        data_query = f"""
+            SELECT
+                {SELECT_COLUMNS}
+            FROM {self.table_ref}
+            WHERE ena_data BETWEEN @start_date AND @end_date
+            {after_clause}
+            ORDER BY ena_data, nom_bacia
+            LIMIT @limit
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=query_params)
+        return self._submit("page_after", data_query, job_config)
+
+    def _page_result(self, submitted: _SubmittedJob, size: int) -> tuple[pa.Table, bool]:
+        table = self._fetch_arrow(submitted, size + 1)
+        # Slicing an Arrow table is zero-copy
+        return table.slice(0, size), table.num_rows > size
+
+    def find_page_after(self, start_date: date, end_date: date, size: int,
+                        after: Optional[PageKey] = None) -> tuple[pa.Table, bool]:
+        """
+        Keyset pagination: fetches the rows that follow `after` in (ena_data, nom_bacia)
+        order. Unlike OFFSET, BigQuery does not have to sort and skip the previous pages.
+
+        Returns:
+            tuple[pa.Table, bool]: Up to `size` rows, and whether more rows follow.
+        """
+        return self._page_result(self._submit_page_after(start_date, end_date, size, after), size)
+
+    def find_page_after_with_count(self, start_date: date, end_date: date, size: int,
+                                   after: Optional[PageKey] = None) -> tuple[pa.Table, bool, int]:
+        """
+        Keyset page plus the range total. The keyset filter would narrow a window count,
+        so the count stays a separate job, but both jobs are submitted before either
+        result is awaited and run concurrently on BigQuery.
+
+        Returns:
+            tuple[pa.Table, bool, int]: The page, whether more rows follow, and the total.
+        """
+        page_job = self._submit_page_after(start_date, end_date, size, after)
+        count_job = self._submit_count(start_date, end_date)
+        df, has_more = self._page_result(page_job, size)
+        return df, has_more, self._count_result(count_job)
+
+    def aggregate_by_period(self, start_date: date, end_date: date, granularity: str, metric: str) -> pa.Table:
+        """
+        Aggregates one metric per basin and period inside BigQuery, so only one row per
+        (basin, period) is transferred instead of the daily rows.
+
+        Raises:
+            ValueError: If the granularity or the metric is not supported.
+        """
+        # Both are interpolated into the SQL, so only known values are accepted
+        validate_aggregation(granularity, metric)
+        aggregate_query = f"""
+            SELECT
+                nom_bacia,
+                DATE_TRUNC(ena_data, {_DATE_TRUNC_PARTS[granularity]}) AS period_start,
+                COUNT({metric}) AS `count`,
+                MIN({metric}) AS `min`,
+                MAX({metric}) AS `max`,
+                AVG({metric}) AS `mean`,
+                SUM({metric}) AS `sum`
+            FROM {self.table_ref}
+            WHERE ena_data BETWEEN @start_date AND @end_date
+            GROUP BY nom_bacia, period_start
+            ORDER BY period_start, nom_bacia
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=self._range_params(start_date, end_date))
+        submitted = self._submit("aggregate", aggregate_query, job_config)
+        table = submitted.job.to_arrow()
+        self._record(submitted, table.num_rows)
+        return table
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from datetime import date
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from api.core.aggregation import summarize, to_aggregates, validate_aggregation
+from api.core.pagination import PageKey
+from api.repositories.gcs_parquet_repository import GCSParquetRepository
+
+DEFAULT_REFRESH_SECONDS = 60
+_EPOCH = date(1970, 1, 1)
+
+
+class _Snapshot(NamedTuple):
+    """Hot copy of the data: the sorted table plus its sort keys as NumPy arrays."""
+    table: pa.Table
+    days: np.ndarray
+    names: np.ndarray
+    signature: tuple
+
+
+class EmbeddedArrowRepository:
+    """
+    In-process columnar serving tier for the historical-data queries.
+
+    Every row of the Parquet layout written by GCSRepository (local directory or GCS
+    bucket) is kept in memory as one deduplicated Arrow table ordered by
+    (ena_data, nom_bacia). Range bounds and keyset positions are then found by binary
+    search over the sort keys, and pages are zero-copy slices of the table, so a query
+    costs no I/O and no sorting. The files are checked every `refresh_seconds` and the
+    table is reloaded when any of them changed.
+
+    Implements the same contract as BigQueryRepository and GCSParquetRepository.
+    """
+
+    def __init__(self, source: GCSParquetRepository, refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 clock=time.monotonic):
+        """
+        Args:
+            source (GCSParquetRepository): Reader of the Parquet files to serve.
+            refresh_seconds (float): Minimum interval between checks for changed files.
+            clock: Monotonic clock used to schedule the checks.
+        """
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._snapshot: Optional[_Snapshot] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    # --- Hot table ---
+
+    def _loaded_span(self) -> tuple[date, date]:
+        """Date range covering every historical file and the current year."""
+        years = self.source.historical_years()
+        first_year = years[0] if years else self.source.current_year
+        return date(first_year, 1, 1), date(self.source.current_year, 12, 31)
+
+    def _load(self, signature: tuple, span: tuple[date, date]) -> _Snapshot:
+        table = self.source.read_sorted_range(*span).combine_chunks()
+        days = table.column("ena_data").cast(pa.int32()).to_numpy()
+        names = table.column("nom_bacia").to_numpy(zero_copy_only=False)
+        logging.info(f"Tabela em memória carregada: {table.num_rows} linhas de {len(signature)} arquivos.")
+        return _Snapshot(table, days, names, signature)
+
+    def snapshot(self) -> _Snapshot:
+        """Returns the hot table, reloading it first if its files changed since the last check."""
+        with self._lock:
+            if self._snapshot is None or self._clock() - self._checked_at >= self.refresh_seconds:
+                span = self._loaded_span()
+                signature = self.source.file_signature(*span)
+                if self._snapshot is None or signature != self._snapshot.signature:
+                    self._snapshot = self._load(signature, span)
+                self._checked_at = self._clock()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Forces a check of the files on the next query, e.g. right after an ingestion."""
+        with self._lock:
+            self._checked_at = float("-inf")
+
+    @staticmethod
+    def _day(value: date) -> int:
+        return (value - _EPOCH).days
+
+    def _bounds(self, snapshot: _Snapshot, start_date: date, end_date: date) -> tuple[int, int]:
+        """Positions [lo, hi) of the rows with `ena_data` in the range."""
+        lo = int(np.searchsorted(snapshot.days, self._day(start_date), side="left"))
+        hi = int(np.searchsorted(snapshot.days, self._day(end_date), side="right"))
+        return lo, max(lo, hi)
+
+    # --- Repository contract ---
+
+    def count_by_date_range(self, start_date: date, end_date: date) -> int:
+        """Counts the rows with `ena_data` between the two dates (inclusive)."""
+        lo, hi = self._bounds(self.snapshot(), start_date, end_date)
+        return hi - lo
+
+    def find_by_date_range(self, start_date: date, end_date: date, page: int, size: int) -> tuple[pa.Table, int]:
+        """
+        Fetches one page of the rows in the date range, ordered by (ena_data, nom_bacia),
+        with the same contract as BigQueryRepository.find_by_date_range.
+        """
+        snapshot = self.snapshot()
+        lo, hi = self._bounds(snapshot, start_date, end_date)
+        start = min(lo + (page - 1) * size, hi)
+        return snapshot.table.slice(start, min(size, hi - start)), hi - lo
+
+    def find_page_after(self, start_date: date, end_date: date, size: int,
+                        after: Optional[PageKey] = None) -> tuple[pa.Table, bool]:
+        """
+        Fetches the rows that follow `after` in (ena_data, nom_bacia) order, with the same
+        contract as BigQueryRepository.find_page_after.
+        """
+        table, has_more, _ = self.find_page_after_with_count(start_date, end_date, size, after)
+        return table, has_more
+
+    def find_page_after_with_count(self, start_date: date, end_date: date, size: int,
+                                   after: Optional[PageKey] = None) -> tuple[pa.Table, bool, int]:
+        """Keyset page plus the range total, both found by binary search."""
+        snapshot = self.snapshot()
+        lo, hi = self._bounds(snapshot, start_date, end_date)
+        start = lo
+        if after is not None:
+            # Rows of the cursor's day are ordered by basin name; continue after the cursor's basin
+            day = self._day(after.ena_data)
+            day_lo = int(np.searchsorted(snapshot.days, day, side="left"))
+            day_hi = int(np.searchsorted(snapshot.days, day, side="right"))
+            position = day_lo + int(np.searchsorted(snapshot.names[day_lo:day_hi], after.nom_bacia, side="right"))
+            start = min(max(lo, position), hi)
+        return snapshot.table.slice(start, min(size, hi - start)), start + size < hi, hi - lo
+
+    def aggregate_by_period(self, start_date: date, end_date: date, granularity: str, metric: str) -> pa.Table:
+        """Aggregates one metric per basin and period over the in-memory rows of the range."""
+        validate_aggregation(granularity, metric)
+        snapshot = self.snapshot()
+        lo, hi = self._bounds(snapshot, start_date, end_date)
+        return to_aggregates(summarize(snapshot.table.slice(lo, hi - lo), granularity), metric)
@@ -0,0 +1,180 @@
+import json
+import logging
+import re
+from datetime import date
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from api.core.aggregation import summarize, to_aggregates, validate_aggregation
+from api.core.pagination import PageKey
+from api.models.arrow_schema import HISTORICAL_PARTITION, ONS_BASIN_SCHEMA, PARTITION_COLUMN, keep_latest_rows
+from api.repositories.gcs_repository import MANIFEST_BLOB_NAME
+
+_HISTORICAL_FILE = re.compile(r"basin_data_(\d{4})\.parquet")
+# Columns of the pages served to the API, with the basin names decoded
+_PAGE_SCHEMA = ONS_BASIN_SCHEMA.set(0, pa.field("nom_bacia", pa.string()))
+
+
+class GCSParquetRepository:
+    """
+    Serves historical basin queries straight from the Parquet files in GCS with an
+    Arrow dataset, avoiding BigQuery job latency and per-query cost for small ranges.
+
+    Only the files of the years in the requested range are opened (partition pruning),
+    and the `ena_data` filter is pushed down so row groups outside the range are skipped
+    using their statistics.
+    """
+
+    def __init__(self, bucket_name: str, filesystem: Optional[pafs.FileSystem] = None,
+                 read_all_partitions: bool = False):
+        """
+        Args:
+            bucket_name (str): The name of the GCS bucket.
+            filesystem (Optional[pafs.FileSystem]): Filesystem holding the bucket.
+                Defaults to Arrow's GCS filesystem with the default credentials.
+            read_all_partitions (bool): Reads every current-year `dt=` partition and keeps
+                the newest copy of each row, instead of only the latest partition. Required
+                when the current year is ingested in delta mode.
+        """
+        if not bucket_name:
+            raise ValueError("The GCS bucket name is required.")
+        self.bucket_name = bucket_name
+        self.filesystem = filesystem or pafs.GcsFileSystem()
+        self.read_all_partitions = read_all_partitions
+        self.current_year = date.today().year
+
+    def _path(self, *parts: str) -> str:
+        return "/".join((self.bucket_name,) + parts)
+
+    def _historical_path(self, year: int) -> str:
+        return self._path("basin_data", "historical", f"basin_data_{year}.parquet")
+
+    def _current_partitions(self) -> List[str]:
+        """Lists the `dt=` partition dates of the current year, oldest first."""
+        selector = pafs.FileSelector(self._path("basin_data", "current", f"year={self.current_year}"),
+                                     allow_not_found=True)
+        partitions = [
+            info.base_name.split("dt=", 1)[1]
+            for info in self.filesystem.get_file_info(selector)
+            if info.type == pafs.FileType.Directory and info.base_name.startswith("dt=")
+        ]
+        return sorted(partitions)
+
+    def _latest_partition(self) -> Optional[str]:
+        """Reads the latest current-year partition from the manifest, listing as a fallback."""
+        try:
+            with self.filesystem.open_input_stream(self._path(MANIFEST_BLOB_NAME)) as stream:
+                entry = json.loads(stream.read()).get("years", {}).get(str(self.current_year)) or {}
+            if entry.get("latest_partition"):
+                return entry["latest_partition"]
+        except (FileNotFoundError, OSError, ValueError) as e:
+            logging.info(f"Manifesto indisponível, listando partições do ano corrente: {e}")
+        partitions = self._current_partitions()
+        return partitions[-1] if partitions else None
+
+    def historical_years(self) -> List[int]:
+        """Years that have a consolidated file under `historical/`, oldest first."""
+        selector = pafs.FileSelector(self._path("basin_data", "historical"), allow_not_found=True)
+        years = []
+        for info in self.filesystem.get_file_info(selector):
+            match = _HISTORICAL_FILE.fullmatch(info.base_name)
+            if info.type == pafs.FileType.File and match:
+                years.append(int(match.group(1)))
+        return sorted(years)
+
+    def file_signature(self, start_date: date, end_date: date) -> tuple:
+        """(path, size, mtime) of the files behind a date range, to detect changed data."""
+        paths = [path for path, _ in self._files_for_range(start_date, end_date)]
+        if not paths:
+            return ()
+        return tuple((info.path, info.size, info.mtime_ns) for info in self.filesystem.get_file_info(paths))
+
+    def _files_for_range(self, start_date: date, end_date: date) -> List[tuple]:
+        """Returns the (path, partition) pairs of the files that may hold rows of the range."""
+        files = []
+        last_historical_year = min(end_date.year, self.current_year - 1)
+        historical = [self._historical_path(year) for year in range(start_date.year, last_historical_year + 1)]
+        if historical:
+            for info in self.filesystem.get_file_info(historical):
+                if info.type == pafs.FileType.File:
+                    files.append((info.path, HISTORICAL_PARTITION))
+
+        if start_date.year <= self.current_year <= end_date.year:
+            if self.read_all_partitions:
+                partitions = self._current_partitions()
+            else:
+                latest = self._latest_partition()
+                partitions = [latest] if latest else []
+            for partition in partitions:
+                path = self._path("basin_data", "current", f"year={self.current_year}", f"dt={partition}",
+                                  f"basin_data_{self.current_year}.parquet")
+                files.append((path, partition))
+        return files
+
+    def _read_range(self, start_date: date, end_date: date) -> pa.Table:
+        """Reads the rows of the range from every relevant file, tagged with their partition."""
+        row_filter = (ds.field("ena_data") >= pa.scalar(start_date, pa.date32())) & \
+                     (ds.field("ena_data") <= pa.scalar(end_date, pa.date32()))
+        tables = []
+        for path, partition in self._files_for_range(start_date, end_date):
+            # The explicit schema drops extra columns such as data_carga_bronze
+            dataset = ds.dataset(path, format="parquet", filesystem=self.filesystem, schema=ONS_BASIN_SCHEMA)
+            table = dataset.to_table(filter=row_filter)
+            table = table.set_column(0, "nom_bacia", table.column("nom_bacia").cast(pa.string()))
+            tables.append(table.append_column(PARTITION_COLUMN, pa.array([partition] * table.num_rows, pa.string())))
+        if not tables:
+            return pa.table({})
+        return pa.concat_tables(tables)
+
+    def read_sorted_range(self, start_date: date, end_date: date) -> pa.Table:
+        """All deduplicated rows of the range, ordered by (ena_data, nom_bacia)."""
+        table = self._read_range(start_date, end_date)
+        if table.num_rows == 0:
+            return _PAGE_SCHEMA.empty_table()
+        return keep_latest_rows(table, PARTITION_COLUMN).drop_columns([PARTITION_COLUMN])
+
+    def count_by_date_range(self, start_date: date, end_date: date) -> int:
+        """Counts the rows with `ena_data` between the two dates (inclusive)."""
+        return self.read_sorted_range(start_date, end_date).num_rows
+
+    def find_by_date_range(self, start_date: date, end_date: date, page: int, size: int) -> tuple[pa.Table, int]:
+        """
+        Fetches one page of the rows in the date range, ordered by (ena_data, nom_bacia),
+        with the same contract as BigQueryRepository.find_by_date_range.
+        """
+        table = self.read_sorted_range(start_date, end_date)
+        offset = (page - 1) * size
+        return table.slice(min(offset, table.num_rows), size), table.num_rows
+
+    def find_page_after(self, start_date: date, end_date: date, size: int,
+                        after: Optional[PageKey] = None) -> tuple[pa.Table, bool]:
+        """
+        Fetches the rows that follow `after` in (ena_data, nom_bacia) order, with the same
+        contract as BigQueryRepository.find_page_after.
+        """
+        table, has_more, _ = self.find_page_after_with_count(start_date, end_date, size, after)
+        return table, has_more
+
+    def find_page_after_with_count(self, start_date: date, end_date: date, size: int,
+                                   after: Optional[PageKey] = None) -> tuple[pa.Table, bool, int]:
+        """Keyset page plus the range total, both taken from a single read of the range."""
+        table = self.read_sorted_range(start_date, end_date)
+        total_items = table.num_rows
+        if after is not None and total_items:
+            after_date = pa.scalar(after.ena_data, pa.date32())
+            dates, basins = table.column("ena_data"), table.column("nom_bacia")
+            table = table.filter(pc.or_(pc.greater(dates, after_date),
+                                        pc.and_(pc.equal(dates, after_date), pc.greater(basins, after.nom_bacia))))
+        return table.slice(0, size), table.num_rows > size, total_items
+
+    def aggregate_by_period(self, start_date: date, end_date: date, granularity: str, metric: str) -> pa.Table:
+        """
+        Aggregates one metric per basin and period with Arrow, over the deduplicated rows
+        of the range (the date filter is pushed down into the Parquet scan).
+        """
+        validate_aggregation(granularity, metric)
+        return to_aggregates(summarize(self.read_sorted_range(start_date, end_date), granularity), metric)
@@ -1,22 +1,128 @@
+import base64
+import json
+import logging
+import re
+import threading
+import time
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud import storage
+import google_crc32c
 import io
 
+from api.core.backoff import full_jitter_delay
+from api.core.exceptions import GCSIntegrityError
+from api.core.metrics import PARQUET_WRITE_SECONDS
+from api.core.parquet_profiles import ParquetWriterProfile, get_parquet_profile
+from api.models.arrow_schema import ONS_BASIN_SCHEMA, conform_table, to_basin_table
+
+# Prefix for the custom object metadata that records which ONS resource version
+# a file was built from.
+SOURCE_METADATA_PREFIX = "ons_"
+HISTORICAL_PREFIX = "basin_data/historical/"
+# Small JSON object with the latest file written for each year; outside basin_data/ so it is never read as data
+MANIFEST_BLOB_NAME = "basin_state/manifest.json"
+MANIFEST_MAX_ATTEMPTS = 5
+MANIFEST_BACKOFF_BASE_SECONDS = 0.1
+MANIFEST_BACKOFF_MAX_SECONDS = 2.0
+_HISTORICAL_BLOB_YEAR = re.compile(r"basin_data_(\d{4})\.parquet$")
+CURRENT_PREFIX = "basin_data/current/"
+_CURRENT_PARTITION = re.compile(r"year=(\d{4})/dt=(\d{4}-\d{2}-\d{2})/")
+
+# Resumable upload chunks must be a multiple of 256 KiB
+DEFAULT_UPLOAD_CHUNK_SIZE = 32 * 256 * 1024  # 8 MiB
+
+
+class _CRC32CWriter:
+    """
+    Write-only file object that forwards data to a GCS blob writer while computing
+    the CRC32C checksum of everything written, to be checked once the upload completes.
+    """
+
+    def __init__(self, target):
+        self._target = target
+        self._checksum = google_crc32c.Checksum()
+        self._position = 0
+        # Time spent handing the data to the blob writer, i.e. uploading it
+        self.write_seconds = 0.0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._checksum.update(data)
+        start = time.perf_counter()
+        self._target.write(data)
+        self.write_seconds += time.perf_counter() - start
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        # The blob writer is finalized by its own context manager
+        self.closed = True
+
+    @property
+    def crc32c(self) -> str:
+        """The checksum of the written data, base64-encoded like GCS reports it."""
+        return base64.b64encode(self._checksum.digest()).decode("ascii")
+
+
+class HistoricalFile(NamedTuple):
+    """Generation and size of the stored Parquet file of a historical year."""
+    generation: int
+    size: int
+
+
+class PartitionFile(NamedTuple):
+    """A Parquet file of a `current/year=/dt=` partition."""
+    year: int
+    partition: date
+    blob_name: str
+    size: int
+
+
 class GCSRepository:
     """
     Repository for interacting with Google Cloud Storage (GCS),
     abstracting the logic for reading and writing data in the bucket.
     """
 
-    def __init__(self, bucket_name: str):
+    def __init__(self, bucket_name: str, upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+                 parquet_profile: Optional[ParquetWriterProfile] = None,
+                 client: Optional[storage.Client] = None):
+        """
+        Args:
+            bucket_name (str): The name of the GCS bucket.
+            upload_chunk_size (int): Size in bytes of each resumable upload request
+                (a multiple of 256 KiB).
+            parquet_profile (Optional[ParquetWriterProfile]): Writer settings of the
+                Parquet files. Defaults to the default profile.
+            client (Optional[storage.Client]): Application-scoped client to reuse.
+                Defaults to a new client with the default credentials.
+        """
         if not bucket_name:
             raise ValueError("The GCS bucket name is required.")
-        self.client = storage.Client()
+        self.client = client or storage.Client()
         self.bucket_name = bucket_name
         self.bucket = self.client.bucket(self.bucket_name)
         self.current_year = date.today().year
+        self.upload_chunk_size = upload_chunk_size
+        self.parquet_profile = parquet_profile or get_parquet_profile()
+        # Snapshot of the historical files, loaded by refresh_historical_index()
+        self._historical_index: Optional[Dict[int, HistoricalFile]] = None
+        self._historical_lock = threading.Lock()
 
     def _get_historical_blob_name(self, year: int) -> str:
         """Constructs the file path for a historical year."""
@@ -28,17 +134,155 @@ class GCSRepository:
         # Hive-style partitioning for compatibility with BigQuery and other tools
         return f"basin_data/current/year={year}/dt={date_folder}/basin_data_{year}.parquet"
 
+    def _get_row_index_blob_name(self, year: int) -> str:
+        """
+        Constructs the path of the row index used by delta ingestion. It lives outside
+        `basin_data/` so the external table never reads it as data.
+        """
+        return f"basin_state/row_index/year={year}/row_index.parquet"
+
+    def _get_summary_blob_name(self, year: int, granularity: str) -> str:
+        """Constructs the path of a year's precomputed aggregates, outside `basin_data/` too."""
+        return f"basin_state/summaries/year={year}/{granularity}.parquet"
+
+    def _get_job_state_blob_name(self, job_id: str) -> str:
+        """State of a background ingestion job, readable by every API instance."""
+        return f"basin_state/ingest_jobs/{job_id}.json"
+
+    def refresh_historical_index(self) -> Dict[int, HistoricalFile]:
+        """
+        Lists `basin_data/historical/` once and keeps a snapshot of the years present,
+        so existence checks during an ingestion run need no further requests.
+
+        Returns:
+            Dict[int, HistoricalFile]: The generation and size of each stored year.
+        """
+        blobs = self.client.list_blobs(self.bucket_name, prefix=HISTORICAL_PREFIX,
+                                       fields="items(name,generation,size),nextPageToken")
+        index = {}
+        for blob in blobs:
+            match = _HISTORICAL_BLOB_YEAR.search(blob.name)
+            if match:
+                index[int(match.group(1))] = HistoricalFile(generation=int(blob.generation), size=int(blob.size))
+        with self._historical_lock:
+            self._historical_index = index
+        return dict(index)
+
+    def list_historical_years(self) -> Dict[int, HistoricalFile]:
+        """Returns the historical index snapshot, listing the bucket if it was never loaded."""
+        with self._historical_lock:
+            if self._historical_index is not None:
+                return dict(self._historical_index)
+        return self.refresh_historical_index()
+
     def historical_data_exists(self, year: int) -> bool:
-        """Checks if the Parquet file for a historical year already exists."""
+        """
+        Checks if the Parquet file for a historical year already exists. Answered from
+        the historical index snapshot when one is loaded, otherwise with a request.
+        """
+        with self._historical_lock:
+            if self._historical_index is not None:
+                return year in self._historical_index
         blob_name = self._get_historical_blob_name(year)
         blob = self.bucket.blob(blob_name)
         return blob.exists()
 
+    def read_manifest(self) -> Dict[str, dict]:
+        """
+        Reads the ingestion manifest: for each year, the latest partition written,
+        its row count, the CRC32C of the file and the ONS source signature.
+
+        Returns:
+            Dict[str, dict]: The manifest entries keyed by year (as text), or an empty
+            dict if the manifest does not exist yet.
+        """
+        manifest, _ = self._load_manifest()
+        return manifest
+
+    def get_manifest_entry(self, year: int) -> Optional[dict]:
+        """Returns the manifest entry of a year, or None if it has none."""
+        return self.read_manifest().get(str(year))
+
+    def _load_manifest(self):
+        """Returns the manifest entries and the generation they were read at (0 if missing)."""
+        blob = self.bucket.get_blob(MANIFEST_BLOB_NAME)
+        if blob is None:
+            return {}, 0
+        return json.loads(blob.download_as_text()).get("years", {}), blob.generation
+
+    def _update_manifest(self, year: int, entry: dict):
+        """
+        Records the file just written for a year in the manifest. The object is replaced
+        with a generation-match precondition, so concurrent writers never overwrite each
+        other's entries: on conflict the manifest is read again and the update retried
+        after a jittered backoff, so colliding writers do not retry in lockstep.
+        A manifest that cannot be updated is only logged, since lookups fall back to listing.
+        """
+        for attempt in range(1, MANIFEST_MAX_ATTEMPTS + 1):
+            try:
+                manifest, generation = self._load_manifest()
+                previous = manifest.get(str(year), {})
+                # A late writer of an older partition must not move the latest partition backwards
+                if (previous.get("latest_partition") and entry.get("latest_partition")
+                        and previous["latest_partition"] > entry["latest_partition"]):
+                    return
+                manifest[str(year)] = entry
+                self.bucket.blob(MANIFEST_BLOB_NAME).upload_from_string(
+                    json.dumps({"years": manifest}, sort_keys=True),
+                    content_type="application/json",
+                    if_generation_match=generation,
+                )
+                return
+            except PreconditionFailed:
+                logging.info(f"Manifesto alterado por outro processo (tentativa {attempt}). Tentando novamente...")
+                if attempt < MANIFEST_MAX_ATTEMPTS:
+                    time.sleep(full_jitter_delay(attempt - 1, MANIFEST_BACKOFF_BASE_SECONDS, MANIFEST_BACKOFF_MAX_SECONDS))
+            except Exception as e:
+                logging.warning(f"Não foi possível atualizar o manifesto para o ano {year}: {e}")
+                return
+        logging.warning(f"Manifesto não atualizado para o ano {year} após {MANIFEST_MAX_ATTEMPTS} tentativas.")
+
+    def _manifest_entry(self, blob: storage.Blob, rows: int, partition: Optional[date],
+                        source_signature: Optional[Dict[str, str]], content_fingerprint: Optional[str] = None) -> dict:
+        return {
+            "blob": blob.name,
+            "latest_partition": partition.isoformat() if partition else None,
+            "rows": rows,
+            "crc32c": blob.crc32c,
+            "generation": blob.generation,
+            "source_signature": source_signature,
+            "content_fingerprint": content_fingerprint,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def get_content_fingerprint(self, year: int, partition_date: Optional[date] = None) -> Optional[str]:
+        """
+        Returns the content fingerprint recorded in the manifest for the latest file of a
+        year. For the current year, `partition_date` must match the latest partition.
+        """
+        entry = self.get_manifest_entry(year)
+        if not entry:
+            return None
+        if partition_date is not None and entry.get("latest_partition") != partition_date.isoformat():
+            return None
+        return entry.get("content_fingerprint")
+
     def get_latest_ingestion_date(self) -> Optional[date]:
         """
-        Finds the most recent ingestion date (data_carga_bronze) for the current year
-        by listing the partition "directories" in GCS.
+        Finds the most recent ingestion date (data_carga_bronze) for the current year.
+        The manifest answers with a single read; listing the partition "directories"
+        in GCS is only used when the manifest has no entry for the year.
         """
+        try:
+            entry = self.get_manifest_entry(self.current_year)
+            if entry and entry.get("latest_partition"):
+                return date.fromisoformat(entry["latest_partition"])
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Manifesto inválido, listando partições do GCS: {e}")
+        return self._list_latest_ingestion_date()
+
+    def _list_latest_ingestion_date(self) -> Optional[date]:
+        """Recovery path: finds the latest partition by listing the `dt=` prefixes."""
         prefix = f"basin_data/current/year={self.current_year}/dt="
         # Usa 'delimiter' para tratar os "diretórios" como entidades únicas
         blobs = self.client.list_blobs(self.bucket_name, prefix=prefix, delimiter="/")
@@ -54,10 +298,176 @@ class GCSRepository:
         except (ValueError, IndexError):
             return None
 
-    def save_dataframe(self, df: pd.DataFrame, year: int, ingestion_date: date):
+    def get_source_signature(self, year: int, partition_date: Optional[date] = None) -> Optional[Dict[str, str]]:
+        """
+        Reads the ONS resource signature stored alongside the last file saved for a year.
+
+        Args:
+            year (int): The year of the data.
+            partition_date (Optional[date]): For the current year, the ingestion date
+                of the partition to inspect (usually the latest one).
+
+        Returns:
+            Optional[Dict[str, str]]: The stored signature, or None if there is no
+            file or it was saved without one.
+        """
+        if year == self.current_year:
+            if partition_date is None:
+                return None
+            blob_name = self._get_current_blob_name(partition_date, year)
+        else:
+            blob_name = self._get_historical_blob_name(year)
+
+        blob = self.bucket.get_blob(blob_name)
+        if blob is None or not blob.metadata:
+            return None
+        signature = {
+            key[len(SOURCE_METADATA_PREFIX):]: value
+            for key, value in blob.metadata.items()
+            if key.startswith(SOURCE_METADATA_PREFIX)
+        }
+        return signature or None
+
+    def load_row_index(self, year: int) -> Optional[pd.DataFrame]:
+        """
+        Loads the (nom_bacia, ena_data, row_hash) index of the rows already ingested for a year.
+
+        Returns:
+            Optional[pd.DataFrame]: The index, or None if delta ingestion never ran for the year.
+        """
+        blob = self.bucket.get_blob(self._get_row_index_blob_name(year))
+        if blob is None:
+            return None
+        return pq.read_table(io.BytesIO(blob.download_as_bytes())).to_pandas()
+
+    def load_summary(self, year: int, granularity: str) -> Optional[pa.Table]:
+        """
+        Loads the precomputed per-basin aggregates of a year at a granularity.
+
+        Returns:
+            Optional[pa.Table]: The summary, or None if it was never computed for the year.
+        """
+        blob = self.bucket.get_blob(self._get_summary_blob_name(year, granularity))
+        if blob is None:
+            return None
+        return pq.read_table(io.BytesIO(blob.download_as_bytes()))
+
+    def load_job_state(self, job_id: str) -> Optional[dict]:
+        """
+        Loads the state of a background ingestion job.
+
+        Returns:
+            Optional[dict]: The job state, or None if no job has this ID.
+        """
+        blob = self.bucket.get_blob(self._get_job_state_blob_name(job_id))
+        if blob is None:
+            return None
+        return json.loads(blob.download_as_text())
+
+    def list_current_partitions(self) -> Dict[int, List[PartitionFile]]:
+        """
+        Lists the files under `basin_data/current/`, grouped by year and ordered from the
+        oldest to the newest partition. Past years appear here until they are compacted.
+        """
+        blobs = self.client.list_blobs(self.bucket_name, prefix=CURRENT_PREFIX,
+                                       fields="items(name,generation,size),nextPageToken")
+        partitions: Dict[int, List[PartitionFile]] = {}
+        for blob in blobs:
+            match = _CURRENT_PARTITION.search(blob.name)
+            if not match or not blob.name.endswith(".parquet"):
+                continue
+            year, partition = int(match.group(1)), date.fromisoformat(match.group(2))
+            partitions.setdefault(year, []).append(PartitionFile(year, partition, blob.name, int(blob.size or 0)))
+        for files in partitions.values():
+            files.sort(key=lambda f: f.partition)
+        return partitions
+
+    def read_basin_table(self, blob_name: str) -> pa.Table:
+        """
+        Reads a stored basin data file as an Arrow table in the basin schema, keeping the
+        `data_carga_bronze` column of current-year files.
+        """
+        blob = self.bucket.blob(blob_name)
+        table = pq.read_table(io.BytesIO(blob.download_as_bytes()))
+        conformed = conform_table(table)
+        if 'data_carga_bronze' in table.column_names:
+            conformed = conformed.append_column('data_carga_bronze', table.column('data_carga_bronze').cast(pa.string()))
+        return conformed
+
+    def read_historical_table(self, year: int) -> pa.Table:
+        """Reads the historical file of a year as an Arrow table in the basin schema."""
+        return self.read_basin_table(self._get_historical_blob_name(year))
+
+    def read_file_schema(self, year: int, partition: Optional[date] = None) -> pa.Schema:
+        """
+        Reads the schema stored in the footer of a file, without downloading its data:
+        the given current-year partition, or the historical file of the year when no
+        partition is given.
+        """
+        if partition is None:
+            blob_name = self._get_historical_blob_name(year)
+        else:
+            blob_name = self._get_current_blob_name(partition, year)
+        with self.bucket.blob(blob_name).open("rb") as reader:
+            return pq.read_schema(reader)
+
+    def write_compacted(self, year: int, table: pa.Table, partition: Optional[date] = None,
+                        source_signature: Optional[Dict[str, str]] = None,
+                        content_fingerprint: Optional[str] = None) -> int:
+        """
+        Writes a compacted file: into the given current-year partition (replacing its
+        file), or as the historical file of the year when no partition is given.
+
+        Returns:
+            int: The size in bytes of the written object.
+        """
+        if partition is None:
+            blob_name = self._get_historical_blob_name(year)
+        else:
+            blob_name = self._get_current_blob_name(partition, year)
+        blob, rows = self._upload_parquet(blob_name, table.schema, self.parquet_profile.iter_row_groups(table),
+                                          source_signature)
+        if partition is None:
+            self._record_historical_file(year, blob)
+        self._update_manifest(year, self._manifest_entry(blob, rows, partition, source_signature, content_fingerprint))
+        logging.info(f"Arquivo compactado do ano {year} salvo em gs://{self.bucket_name}/{blob_name}")
+        return int(blob.size or 0)
+
+    def delete_blobs(self, blob_names: List[str]):
+        """Deletes the given objects, ignoring the ones that no longer exist."""
+        if blob_names:
+            self.bucket.delete_blobs(list(blob_names), on_error=lambda blob: None)
+
+    def save_row_index(self, year: int, index_df: pd.DataFrame):
+        """Replaces the row index of a year after a delta ingestion."""
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(index_df, preserve_index=False), buffer)
+        buffer.seek(0)
+        blob = self.bucket.blob(self._get_row_index_blob_name(year))
+        blob.upload_from_file(buffer, content_type="application/octet-stream")
+
+    def save_summary(self, year: int, granularity: str, summary: pa.Table):
+        """Replaces the precomputed aggregates of a year at a granularity."""
+        buffer = io.BytesIO()
+        pq.write_table(summary, buffer)
+        buffer.seek(0)
+        blob = self.bucket.blob(self._get_summary_blob_name(year, granularity))
+        blob.upload_from_file(buffer, content_type="application/octet-stream")
+
+    def save_job_state(self, job_id: str, state: dict):
+        """Replaces the stored state of a background ingestion job."""
+        self.bucket.blob(self._get_job_state_blob_name(job_id)).upload_from_string(
+            json.dumps(state, sort_keys=True), content_type="application/json"
+        )
+
+    def save_dataframe(self, df: pd.DataFrame, year: int, ingestion_date: date,
+                       source_signature: Optional[Dict[str, str]] = None, content_fingerprint: Optional[str] = None):
         """
         Saves a DataFrame as a Parquet file in GCS, using the
         correct path for historical or current year data.
+        When given, the ONS resource signature is stored as object metadata and the
+        content fingerprint in the manifest, so later ingestions can tell whether the
+        source changed.
         """
         is_current = (year == self.current_year)
         
@@ -68,11 +478,85 @@ class GCSRepository:
         else:
             blob_name = self._get_historical_blob_name(year)
 
+        # Written with the typed basin schema (no string coercion). The Arrow table is the
+        # only copy made from the DataFrame: it is sorted and serialized one row group at a time
+        table = to_basin_table(df)
+        blob, rows = self._upload_parquet(blob_name, table.schema, self.parquet_profile.iter_row_groups(table),
+                                          source_signature, year=year)
+        if not is_current:
+            self._record_historical_file(year, blob)
+        self._update_manifest(year, self._manifest_entry(blob, rows, ingestion_date if is_current else None,
+                                                         source_signature, content_fingerprint))
+        print(f"Dados para o ano {year} salvos em gs://{self.bucket_name}/{blob_name}")
+
+    def save_historical_batches(self, year: int, batches: Iterable[pa.RecordBatch],
+                                source_signature: Optional[Dict[str, str]] = None) -> int:
+        """
+        Streams record batches (e.g. from ONSClient.stream_year) into the historical file
+        of a year, one row group at a time, without holding the year in memory. Each row
+        group is sorted in the profile's order on its own.
+
+        Returns:
+            int: The number of rows written.
+        """
+        blob_name = self._get_historical_blob_name(year)
+        blob, rows = self._upload_parquet(blob_name, ONS_BASIN_SCHEMA, self.parquet_profile.regroup_batches(batches),
+                                          source_signature, year=year)
+        self._record_historical_file(year, blob)
+        self._update_manifest(year, self._manifest_entry(blob, rows, None, source_signature))
+        logging.info(f"Dados para o ano {year} enviados em streaming para gs://{self.bucket_name}/{blob_name}")
+        return rows
+
+    def _record_historical_file(self, year: int, blob: storage.Blob):
+        """Keeps a loaded historical index snapshot in sync with a file just written."""
+        with self._historical_lock:
+            if self._historical_index is not None:
+                self._historical_index[year] = HistoricalFile(generation=int(blob.generation or 0), size=int(blob.size or 0))
+
+    def _upload_parquet(self, blob_name: str, schema: pa.Schema, batches: Iterable[pa.RecordBatch],
+                        source_signature: Optional[Dict[str, str]] = None, year: Optional[int] = None):
+        """
+        Serializes the batches as Parquet row groups directly into a resumable upload,
+        so serialization overlaps the upload and no full in-memory copy of the file is
+        made. The CRC32C of the sent bytes is checked against the stored object.
+        When the year is given, the serialization and transfer times are recorded in
+        the `basin_parquet_write_seconds` metric.
+
+        Raises:
+            GCSIntegrityError: If the stored object does not match the data sent.
+        """
         blob = self.bucket.blob(blob_name)
+        if source_signature:
+            blob.metadata = {f"{SOURCE_METADATA_PREFIX}{key}": value for key, value in source_signature.items()}
 
-        buffer = io.BytesIO()
-        df.to_parquet(buffer, index=False)
-        buffer.seek(0)
+        rows = 0
+        writer_seconds = 0.0
+        # If anything fails inside the block, the blob writer cancels the upload instead of finalizing it
+        with blob.open("wb", chunk_size=self.upload_chunk_size, ignore_flush=True,
+                       content_type="application/octet-stream") as gcs_file:
+            sink = _CRC32CWriter(gcs_file)
+            writer = pq.ParquetWriter(sink, schema, **self.parquet_profile.writer_kwargs())
+            with writer:
+                for batch in batches:
+                    # Only the writer calls are timed: producing the batches is not part of the write
+                    start = time.perf_counter()
+                    writer.write_batch(batch, row_group_size=self.parquet_profile.row_group_size)
+                    writer_seconds += time.perf_counter() - start
+                    rows += batch.num_rows
+                start = time.perf_counter()
+            writer_seconds += time.perf_counter() - start
+            finalize_start = time.perf_counter()
+        finalize_seconds = time.perf_counter() - finalize_start
 
-        blob.upload_from_file(buffer, content_type="application/octet-stream")
-        print(f"Dados para o ano {year} salvos em gs://{self.bucket_name}/{blob_name}")
\ No newline at end of file
+        if year is not None:
+            PARQUET_WRITE_SECONDS.labels(phase="serialize", year=str(year)).observe(
+                max(writer_seconds - sink.write_seconds, 0.0))
+            PARQUET_WRITE_SECONDS.labels(phase="transfer", year=str(year)).observe(
+                sink.write_seconds + finalize_seconds)
+        blob.reload()
+        if blob.crc32c != sink.crc32c:
+            blob.delete()
+            raise GCSIntegrityError(
+                f"CRC32C mismatch for gs://{self.bucket_name}/{blob_name}: sent {sink.crc32c}, stored {blob.crc32c}."
+            )
+        return blob, rows
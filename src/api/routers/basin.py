@@ -1,12 +1,37 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from fastapi import APIRouter, Query, HTTPException, Depends, status
+from functools import lru_cache
+from typing import Literal, Optional
+import pyarrow.fs as pafs
+from fastapi import APIRouter, Query, HTTPException, Depends, Request, Response, status
 
-from api.models.basin import BasinSilverData, IngestDataRequest, PaginatedResponse
-from api.repositories.gcs_repository import GCSRepository
-from api.repositories.bigquery_repository import BigQueryRepository
-from api.services.basin_service import BasinService
-from api.core.ons_client import ONSClient
+from api.models.basin import AggregatesResponse, BasinSilverData, IngestDataRequest, IngestJob, PaginatedResponse
+from api.repositories.gcs_repository import DEFAULT_UPLOAD_CHUNK_SIZE, GCSRepository
+from api.repositories.base import BasinDataRepository
+from api.repositories.bigquery_repository import DEFAULT_STORAGE_API_MIN_ROWS, BigQueryRepository
+from api.repositories.gcs_parquet_repository import GCSParquetRepository
+from api.repositories.embedded_repository import DEFAULT_REFRESH_SECONDS, EmbeddedArrowRepository
+from api.services.basin_service import DEFAULT_SUMMARY_LOAD_WORKERS, BasinService
+from api.services.compaction_service import DEFAULT_RETENTION_DAYS, CompactionService
+from api.core.app_clients import DEFAULT_HTTP_TIMEOUT_SECONDS, AppClients
+from api.core.async_ons_client import DEFAULT_MAX_CONCURRENCY, AsyncONSClient
+from api.core.ons_client import (
+    DEFAULT_BACKOFF_BASE_SECONDS, DEFAULT_BACKOFF_MAX_SECONDS, DEFAULT_MAX_RETRIES, ONSClient
+)
+from api.core.parquet_profiles import get_parquet_profile
+from api.core.http_cache import DEFAULT_CACHE_MAX_BYTES, HTTPDiskCache
+from api.core.resumable_download import DEFAULT_MAX_ATTEMPTS
+from api.core.query_cache import DEFAULT_QUERY_CACHE_MAX_BYTES, DEFAULT_QUERY_CACHE_TTL_SECONDS, QueryResultCache
+from api.core.aggregation import DEFAULT_METRIC
+from api.core.ingest_pipeline import (
+    DEFAULT_DOWNLOAD_WORKERS, DEFAULT_PARSE_WORKERS, DEFAULT_QUEUE_SIZE, DEFAULT_UPLOAD_WORKERS, IngestPipeline
+)
+from api.core.ingest_jobs import (
+    DEFAULT_MAX_CONCURRENT_JOBS, DEFAULT_MAX_QUEUED_JOBS, GCSJobStore, IngestJobManager, InMemoryJobStore
+)
+from api.core.exceptions import IngestConflictError, IngestQueueFullError, InvalidCursorError
 
 # Create an API router to organize endpoints related to basin data
 router = APIRouter(
@@ -14,24 +39,79 @@ router = APIRouter(
     tags=["Basin Data"],
 )
 
+_embedded_repository_lock = threading.Lock()
+_ingest_jobs_lock = threading.Lock()
+_ingest_pipeline_lock = threading.Lock()
+_summary_executor_lock = threading.Lock()
+_async_ons_client_lock = threading.Lock()
+
 # --- Dependency Injection ---
 # These functions allow FastAPI to automatically create and provide instances
 # of our services and repositories to the endpoint functions.
 
-def get_ons_client():
-    """Dependency provider for the ONSClient."""
-    return ONSClient()
+@lru_cache(maxsize=1)
+def get_http_cache() -> Optional[HTTPDiskCache]:
+    """
+    Builds the optional on-disk HTTP cache for ONS downloads, shared by all requests.
+    It is enabled by ONS_CACHE_DIR; ONS_CACHE_OFFLINE=true replays cached responses only.
+    """
+    cache_dir = os.getenv("ONS_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return HTTPDiskCache(
+        directory=cache_dir,
+        max_bytes=int(os.getenv("ONS_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)),
+        offline=os.getenv("ONS_CACHE_OFFLINE", "false").lower() == "true",
+    )
+
+def get_app_clients(request: Request) -> AppClients:
+    """
+    Dependency provider for the network clients shared by all requests, created by
+    the application lifespan handler. Override it to inject fake clients.
+    """
+    clients = getattr(request.app.state, "clients", None)
+    if clients is None:
+        raise RuntimeError("Application clients are not initialized; run the app with its lifespan handler.")
+    return clients
+
+def get_ons_client(clients: AppClients = Depends(get_app_clients)):
+    """
+    Dependency provider for the ONSClient, reusing the application's httpx client.
+    Setting ONS_STREAMING_DOWNLOAD=true parses the CSV files while they download, and
+    ONS_DOWNLOAD_DIR enables resumable downloads through a local directory.
+    ONS_MAX_RETRIES, ONS_BACKOFF_BASE_SECONDS and ONS_BACKOFF_MAX_SECONDS set the retries
+    of requests that fail with a 5xx response or a timeout.
+    """
+    streaming = os.getenv("ONS_STREAMING_DOWNLOAD", "false").lower() == "true"
+    return ONSClient(
+        streaming=streaming,
+        http_cache=get_http_cache(),
+        download_dir=os.getenv("ONS_DOWNLOAD_DIR") or None,
+        max_download_attempts=int(os.getenv("ONS_DOWNLOAD_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS)),
+        http_client=clients.http_client(),
+        max_retries=int(os.getenv("ONS_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+        backoff_base=float(os.getenv("ONS_BACKOFF_BASE_SECONDS", DEFAULT_BACKOFF_BASE_SECONDS)),
+        backoff_max=float(os.getenv("ONS_BACKOFF_MAX_SECONDS", DEFAULT_BACKOFF_MAX_SECONDS)),
+    )
 
-def get_gcs_repository():
+def get_gcs_repository(clients: AppClients = Depends(get_app_clients)):
     """
     Dependency provider for the GCSRepository.
     It reads the GCS bucket name from an environment variable, which is a best
     practice for configuring applications in cloud environments.
+    GCS_UPLOAD_CHUNK_SIZE sets the size of each resumable upload request and
+    PARQUET_PROFILE the writer profile of the Parquet files.
     """
     bucket_name = os.getenv("GCS_BUCKET_NAME") 
-    return GCSRepository(bucket_name=bucket_name)
+    upload_chunk_size = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", DEFAULT_UPLOAD_CHUNK_SIZE))
+    return GCSRepository(
+        bucket_name=bucket_name,
+        upload_chunk_size=upload_chunk_size,
+        parquet_profile=get_parquet_profile(os.getenv("PARQUET_PROFILE")),
+        client=clients.storage_client(),
+    )
 
-def get_bigquery_repository():
+def get_bigquery_repository(clients: AppClients = Depends(get_app_clients)):
     """
     Dependency provider for the BigQueryRepository.
     It reads configuration from environment variables to connect to the correct
@@ -40,31 +120,265 @@ def get_bigquery_repository():
     project_id = "sauter-university-472416"
     dataset_id = "ons_silver"
     table_id = "ena_basin_silver"
-    return BigQueryRepository(project_id=project_id, dataset_id=dataset_id, table_id=table_id)
+    storage_api_min_rows = int(os.getenv("BQ_STORAGE_API_MIN_ROWS", DEFAULT_STORAGE_API_MIN_ROWS))
+    return BigQueryRepository(project_id=project_id, dataset_id=dataset_id, table_id=table_id,
+                              client=clients.bigquery_client(project_id),
+                              storage_api_min_rows=storage_api_min_rows)
+
+def _parquet_source(clients: AppClients) -> GCSParquetRepository:
+    """
+    Reader of the Parquet files in the GCS bucket or, when EMBEDDED_DATA_DIR is set,
+    in a local directory with the same layout (offline development and benchmarks).
+    """
+    data_dir = os.getenv("EMBEDDED_DATA_DIR")
+    return GCSParquetRepository(
+        bucket_name=data_dir or os.getenv("GCS_BUCKET_NAME"),
+        filesystem=pafs.LocalFileSystem() if data_dir else clients.gcs_filesystem(),
+        # Delta partitions only hold changed rows, so all of them must be merged
+        read_all_partitions=os.getenv("INGEST_DELTA_MODE", "false").lower() == "true",
+    )
+
+def _embedded_repository(request: Request, clients: AppClients) -> EmbeddedArrowRepository:
+    """The in-memory tier is built once per application, so its hot table is shared."""
+    with _embedded_repository_lock:
+        repository = getattr(request.app.state, "embedded_repository", None)
+        if repository is None:
+            repository = EmbeddedArrowRepository(
+                source=_parquet_source(clients),
+                refresh_seconds=float(os.getenv("EMBEDDED_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)),
+            )
+            request.app.state.embedded_repository = repository
+        return repository
+
+def get_query_repository(request: Request, clients: AppClients = Depends(get_app_clients)) -> BasinDataRepository:
+    """
+    Dependency provider for the repository that serves the historical-data queries.
+    HISTORICAL_BACKEND=gcs reads the Parquet files in GCS directly, `embedded` serves
+    them from an in-memory Arrow table, and the default, `bigquery`, queries the
+    silver table.
+    """
+    backend = os.getenv("HISTORICAL_BACKEND", "bigquery").lower()
+    if backend == "gcs":
+        return _parquet_source(clients)
+    if backend == "embedded":
+        return _embedded_repository(request, clients)
+    if backend != "bigquery":
+        raise ValueError(f"Unknown HISTORICAL_BACKEND '{backend}'. Use 'bigquery', 'gcs' or 'embedded'.")
+    return get_bigquery_repository(clients)
+
+@lru_cache(maxsize=1)
+def get_query_result_cache() -> Optional[QueryResultCache]:
+    """
+    Builds the in-memory cache of historical-data responses, shared by all requests.
+    QUERY_CACHE_MAX_BYTES bounds its size (0 disables it) and QUERY_CACHE_TTL_SECONDS
+    sets how long a response is reused.
+    """
+    max_bytes = int(os.getenv("QUERY_CACHE_MAX_BYTES", DEFAULT_QUERY_CACHE_MAX_BYTES))
+    if max_bytes <= 0:
+        return None
+    ttl_seconds = float(os.getenv("QUERY_CACHE_TTL_SECONDS", DEFAULT_QUERY_CACHE_TTL_SECONDS))
+    return QueryResultCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+
+def get_ingest_pipeline(request: Request) -> IngestPipeline:
+    """
+    Dependency provider for the download/parse/upload pipeline of the ingestions, built
+    once per application and shut down by its lifespan handler.
+    INGEST_DOWNLOAD_WORKERS, INGEST_PARSE_WORKERS and INGEST_UPLOAD_WORKERS size its
+    stages, INGEST_QUEUE_SIZE bounds the files waiting between stages and
+    INGEST_PARSE_PROCESSES=true parses in worker processes.
+    """
+    with _ingest_pipeline_lock:
+        pipeline = getattr(request.app.state, "ingest_pipeline", None)
+        if pipeline is None:
+            pipeline = IngestPipeline(
+                download_workers=int(os.getenv("INGEST_DOWNLOAD_WORKERS", DEFAULT_DOWNLOAD_WORKERS)),
+                parse_workers=int(os.getenv("INGEST_PARSE_WORKERS", DEFAULT_PARSE_WORKERS)),
+                upload_workers=int(os.getenv("INGEST_UPLOAD_WORKERS", DEFAULT_UPLOAD_WORKERS)),
+                queue_size=int(os.getenv("INGEST_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)),
+                parse_in_processes=os.getenv("INGEST_PARSE_PROCESSES", "false").lower() == "true",
+            )
+            request.app.state.ingest_pipeline = pipeline
+        return pipeline
+
+def get_async_ons_client(request: Request,
+                         pipeline: IngestPipeline = Depends(get_ingest_pipeline)) -> Optional[AsyncONSClient]:
+    """
+    Dependency provider for the async ONS client that downloads the files on the
+    ingestion pipeline's event loop, built once per application and closed when the
+    pipeline shuts down. Enabled by ONS_ASYNC_DOWNLOAD=true, unless the files go
+    through ONS_CACHE_DIR, ONS_DOWNLOAD_DIR or ONS_STREAMING_DOWNLOAD, which the sync
+    client handles. ONS_MAX_CONCURRENCY bounds its requests in flight and
+    ONS_HTTP2=true enables HTTP/2 (with the optional `h2` package).
+    """
+    if (os.getenv("ONS_ASYNC_DOWNLOAD", "false").lower() != "true" or get_http_cache() is not None
+            or os.getenv("ONS_DOWNLOAD_DIR") or os.getenv("ONS_STREAMING_DOWNLOAD", "false").lower() == "true"):
+        return None
+    with _async_ons_client_lock:
+        client = getattr(request.app.state, "async_ons_client", None)
+        if client is None:
+            client = AsyncONSClient(
+                timeout=float(os.getenv("ONS_HTTP_TIMEOUT", DEFAULT_HTTP_TIMEOUT_SECONDS)),
+                max_concurrency=int(os.getenv("ONS_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                max_retries=int(os.getenv("ONS_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                backoff_base=float(os.getenv("ONS_BACKOFF_BASE_SECONDS", DEFAULT_BACKOFF_BASE_SECONDS)),
+                backoff_max=float(os.getenv("ONS_BACKOFF_MAX_SECONDS", DEFAULT_BACKOFF_MAX_SECONDS)),
+                http2=os.getenv("ONS_HTTP2", "false").lower() == "true",
+            )
+            # Its connections belong to the pipeline's loop, so they are closed there
+            pipeline.close_on_shutdown(client.aclose)
+            request.app.state.async_ons_client = client
+        return client
+
+def get_summary_executor(request: Request) -> ThreadPoolExecutor:
+    """
+    Dependency provider for the pool that reads the yearly summaries of the aggregates
+    endpoint, built once per application and shut down by its lifespan handler.
+    SUMMARY_LOAD_WORKERS sets how many summaries are read at once.
+    """
+    with _summary_executor_lock:
+        executor = getattr(request.app.state, "summary_executor", None)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("SUMMARY_LOAD_WORKERS", DEFAULT_SUMMARY_LOAD_WORKERS)),
+                thread_name_prefix="summary-load",
+            )
+            request.app.state.summary_executor = executor
+        return executor
+
+def get_summary_repository(clients: AppClients = Depends(get_app_clients)) -> Optional[GCSRepository]:
+    """
+    Dependency provider for the bucket holding the yearly summaries read by the query
+    routes. None when the data is read from EMBEDDED_DATA_DIR or no GCS_BUCKET_NAME is
+    set, so offline queries need neither a bucket nor credentials; the aggregates
+    are then computed from the rows.
+    """
+    if os.getenv("EMBEDDED_DATA_DIR") or not os.getenv("GCS_BUCKET_NAME"):
+        return None
+    return get_gcs_repository(clients)
 
 def get_basin_service(
+    summary_repo: Optional[GCSRepository] = Depends(get_summary_repository),
+    bq_repo: BasinDataRepository = Depends(get_query_repository),
+    result_cache: Optional[QueryResultCache] = Depends(get_query_result_cache),
+    summary_executor: ThreadPoolExecutor = Depends(get_summary_executor)
+) -> BasinService:
+    """
+    Dependency provider for the BasinService of the query routes. The ONS client and
+    the ingestion pipeline are left out, so queries never build them.
+    """
+    return BasinService(gcs_repo=summary_repo, bq_repo=bq_repo, result_cache=result_cache,
+                        summary_executor=summary_executor)
+
+def get_ingest_service(
     gcs_repo: GCSRepository = Depends(get_gcs_repository),
-    bq_repo: BigQueryRepository = Depends(get_bigquery_repository),
-    client: ONSClient = Depends(get_ons_client)
+    bq_repo: BasinDataRepository = Depends(get_query_repository),
+    client: ONSClient = Depends(get_ons_client),
+    result_cache: Optional[QueryResultCache] = Depends(get_query_result_cache),
+    pipeline: IngestPipeline = Depends(get_ingest_pipeline),
+    async_client: Optional[AsyncONSClient] = Depends(get_async_ons_client)
 ) -> BasinService:
     """
-    Dependency provider for the BasinService.
-    It depends on the repository and the client, which FastAPI will provide.
+    Dependency provider for the BasinService of the ingestion route, which runs its
+    years through the application's ingestion pipeline. The query repository is
+    passed so an in-memory backend is refreshed once an ingestion stores new data.
+    INGEST_DELTA_MODE=true stores only new or changed rows for the current year.
+    """
+    delta_mode = os.getenv("INGEST_DELTA_MODE", "false").lower() == "true"
+    return BasinService(gcs_repo=gcs_repo, bq_repo=bq_repo, ons_client=client, delta_mode=delta_mode,
+                        result_cache=result_cache, pipeline=pipeline, async_ons_client=async_client)
+
+def get_compaction_service(gcs_repo: GCSRepository = Depends(get_gcs_repository)) -> CompactionService:
+    """
+    Dependency provider for the CompactionService.
+    COMPACTION_RETENTION_DAYS sets how long superseded daily partitions are kept.
     """
-    return BasinService(gcs_repo=gcs_repo, bq_repo=bq_repo, ons_client=client)
+    retention_days = int(os.getenv("COMPACTION_RETENTION_DAYS", DEFAULT_RETENTION_DAYS))
+    return CompactionService(gcs_repo=gcs_repo, retention_days=retention_days)
 
-@router.post("/ingest", status_code=status.HTTP_200_OK)
-async def ingest_data(
+def get_ingest_job_manager(request: Request, clients: AppClients = Depends(get_app_clients)) -> IngestJobManager:
+    """
+    Dependency provider for the background ingestion jobs, built once per application.
+    INGEST_MAX_CONCURRENT_JOBS and INGEST_MAX_QUEUED_JOBS bound the jobs running and
+    waiting; INGEST_JOB_STORE=gcs also persists the job states in the bucket, so any
+    instance can report them.
+    """
+    with _ingest_jobs_lock:
+        manager = getattr(request.app.state, "ingest_jobs", None)
+        if manager is None:
+            backend = os.getenv("INGEST_JOB_STORE", "memory").lower()
+            if backend == "gcs":
+                store = GCSJobStore(get_gcs_repository(clients))
+            elif backend == "memory":
+                store = InMemoryJobStore()
+            else:
+                raise ValueError(f"Unknown INGEST_JOB_STORE '{backend}'. Use 'memory' or 'gcs'.")
+            manager = IngestJobManager(
+                store=store,
+                max_concurrent_jobs=int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", DEFAULT_MAX_CONCURRENT_JOBS)),
+                max_queued_jobs=int(os.getenv("INGEST_MAX_QUEUED_JOBS", DEFAULT_MAX_QUEUED_JOBS)),
+            )
+            request.app.state.ingest_jobs = manager
+        return manager
+
+@router.post("/ingest", status_code=status.HTTP_202_ACCEPTED, response_model=IngestJob)
+def ingest_data(
     request: IngestDataRequest,
-    service: BasinService = Depends(get_basin_service)
+    response: Response,
+    service: BasinService = Depends(get_ingest_service),
+    jobs: IngestJobManager = Depends(get_ingest_job_manager)
 ):
     """
-    (POST) Triggers the data ingestion process for a specified date range.
-    This endpoint downloads data from the ONS and stores it in GCS, and returns a
-    detailed report of the operation for each requested year.
+    (POST) Starts the data ingestion for a specified date range as a background job.
+    The job downloads the data from the ONS and stores it in GCS; poll the URL in the
+    `Location` header, GET /ingest/{job_id}, for its progress and final report.
+    """
+    try:
+        job = jobs.submit(request.start_date, request.end_date, service.ingest_data)
+    except IngestQueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    except IngestConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    response.headers["Location"] = f"{router.prefix}/ingest/{job.job_id}"
+    return job
+
+@router.get("/ingest/{job_id}", response_model=IngestJob)
+def get_ingest_job(job_id: str, jobs: IngestJobManager = Depends(get_ingest_job_manager)):
+    """
+    (GET) Status of an ingestion job: the status of each requested year while it
+    runs, and the detailed report of each year once it finishes.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Ingestion job '{job_id}' not found.")
+    return job
+
+@router.post("/compact", status_code=status.HTTP_200_OK)
+def compact_data(
+    service: CompactionService = Depends(get_compaction_service),
+    jobs: IngestJobManager = Depends(get_ingest_job_manager)
+):
+    """
+    (POST) Compacts the daily current-year partitions stored in GCS into a single
+    deduplicated file, moves past years into `historical/` and deletes partitions
+    outside the retention window. Returns the bytes reclaimed and a report per year.
+    Rejected with 409 while an ingestion job runs or waits; ingestions submitted
+    during the compaction are rejected the same way.
+    """
+    try:
+        with jobs.exclusive():
+            return service.compact()
+    except IngestConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.get("/cache/stats", status_code=status.HTTP_200_OK)
+def get_query_cache_stats(cache: Optional[QueryResultCache] = Depends(get_query_result_cache)):
+    """
+    (GET) Hit, miss, eviction and invalidation counters of the historical-data
+    response cache, plus its current size.
     """
-    ingestion_report = service.ingest_data(request.start_date, request.end_date)
-    return ingestion_report
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
 
 @router.get(
     "/historical-data",
@@ -75,11 +389,14 @@ async def get_historical_volume(
     end_date: date = Query(..., description="End date for the query in YYYY-MM-DD format."),
     page: int = Query(1, ge=1, description="The page number, starting from 1."),
     size: int = Query(100, ge=1, le=1000, description="The number of items per page."),
+    cursor: Optional[str] = Query(None, description="Cursor from the `next_cursor` of a previous response; continues after its last item instead of using `page`."),
+    include_total: bool = Query(True, description="In cursor mode, whether to include the (cached) total counts."),
     service: BasinService = Depends(get_basin_service)
 ):
     """
     (GET) Retrieves paginated historical Basin volume for a given date range
-    from the data stored in GCS.
+    from the data stored in GCS. Deep pages are cheaper with keyset pagination:
+    pass the `next_cursor` of the previous response as `cursor`.
     """
     if start_date > end_date:
         raise HTTPException(
@@ -87,7 +404,11 @@ async def get_historical_volume(
             detail="Start date cannot be after the end date.",
         )
     
-    paginated_results = service.get_historical_volume(start_date, end_date, page, size)
+    try:
+        paginated_results = service.get_historical_volume(start_date, end_date, page, size,
+                                                          cursor=cursor, include_total=include_total)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     
     # If no valid items are found for the given filters, return a 404.
     if not paginated_results["items"]:
@@ -95,4 +416,33 @@ async def get_historical_volume(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No data found for the applied filters. Please run the POST /ingest for the desired period.",
         )
-    return paginated_results
\ No newline at end of file
+    return paginated_results
+
+@router.get("/aggregates", response_model=AggregatesResponse)
+def get_aggregates(
+    start_date: date = Query(..., description="Start date for the query in YYYY-MM-DD format."),
+    end_date: date = Query(..., description="End date for the query in YYYY-MM-DD format."),
+    granularity: Literal["week", "month", "year"] = Query("month", description="Aggregation period; weeks start on Monday."),
+    metric: str = Query(DEFAULT_METRIC, description="ENA measure column to aggregate."),
+    service: BasinService = Depends(get_basin_service)
+):
+    """
+    (GET) Min, max, mean and sum of a metric per basin and week, month or year,
+    instead of paging through the daily rows. The range is widened to whole periods.
+    """
+    if start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Start date cannot be after the end date.",
+        )
+    try:
+        aggregates = service.get_aggregates(start_date, end_date, granularity, metric)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not aggregates["items"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No data found for the applied filters. Please run the POST /ingest for the desired period.",
+        )
+    return aggregates
@@ -1,113 +1,496 @@
+import asyncio
 from datetime import date
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 import math
-from functools import partial
-from pydantic import ValidationError
+from functools import lru_cache, partial
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from cachetools import TTLCache
+from pydantic import TypeAdapter, ValidationError
 
-from api.models.basin import BasinSilverData
+from api.models.basin import BasinAggregate, BasinSilverData
+from api.models.arrow_schema import (
+    BASIN_KEY_COLUMNS, BASIN_MEASURE_COLUMNS, clean_response_rows, to_basin_table, to_response_rows
+)
 from api.repositories.gcs_repository import GCSRepository
-from api.repositories.bigquery_repository import BigQueryRepository 
-from api.core.ons_client import ONSClient
+from api.repositories.base import BasinDataRepository
+from api.repositories.embedded_repository import EmbeddedArrowRepository
+from api.core.async_ons_client import AsyncONSClient
+from api.core.ons_client import ONSClient, parse_downloaded_file
+from api.core.ons_metadata import ONSResource
+from api.core.ingest_pipeline import Finished, IngestPipeline, Parsed, default_pipeline
 from api.core.exceptions import ONSClientError
 from api.core.logging_decorator import logging_it
+from api.core.row_hashing import CONTENT_FINGERPRINT_ATTR, compute_row_delta
+from api.core.pagination import PageKey, decode_cursor, encode_cursor
+from api.core.query_cache import QueryCacheKey, QueryResultCache
+from api.core.metrics import record_cache_lookup
+from api.core.aggregation import (
+    GRANULARITIES, expand_to_periods, merge_summaries, summarize, to_aggregates, validate_aggregation
+)
+
+COUNT_CACHE_TTL_SECONDS = 300
+# Row counts per date range, shared by the per-request services and cleared after ingestions
+shared_count_cache: TTLCache = TTLCache(maxsize=1024, ttl=COUNT_CACHE_TTL_SECONDS)
+_count_cache_lock = threading.Lock()
+# Concurrent reads of the per-year summaries of an aggregates request
+DEFAULT_SUMMARY_LOAD_WORKERS = 5
+# Validates a whole page of response items in one call into pydantic-core
+_BASIN_ROWS_ADAPTER = TypeAdapter(List[BasinSilverData])
+
+@dataclass
+class _YearIngestion:
+    """State of one year shared by its download and upload stages."""
+    year: int
+    ingestion_date: date
+    progress: Optional[Callable[[int, dict], None]] = None
+    resource: Optional[ONSResource] = None
+    latest_ingestion: Optional[date] = None
+
+@lru_cache(maxsize=1)
+def default_summary_executor() -> ThreadPoolExecutor:
+    """
+    Pool that loads the yearly summaries, shared by the services built without one.
+    The API passes its own pool, owned by the application lifespan.
+    """
+    return ThreadPoolExecutor(max_workers=DEFAULT_SUMMARY_LOAD_WORKERS, thread_name_prefix="summary-load")
 
 class BasinService:
-    def __init__(self, gcs_repo: GCSRepository, bq_repo: BigQueryRepository, ons_client: ONSClient):
+    def __init__(self, gcs_repo: Optional[GCSRepository], bq_repo: BasinDataRepository,
+                 ons_client: Optional[ONSClient] = None, delta_mode: bool = False, count_cache: Optional[TTLCache] = None,
+                 result_cache: Optional[QueryResultCache] = None, pipeline: Optional[IngestPipeline] = None,
+                 summary_executor: Optional[ThreadPoolExecutor] = None,
+                 async_ons_client: Optional[AsyncONSClient] = None):
+        # Ingestions need the GCS repository and the ONS client; query-only services may
+        # be built without them, e.g. with the offline embedded backend
         self.gcs_repository = gcs_repo
         self.bq_repository = bq_repo
-        self.ons_client = ons_client    
+        self.ons_client = ons_client
+        # When given, the files are downloaded by this client on the pipeline's download loop
+        self.async_ons_client = async_ons_client
         self.current_year = date.today().year
+        # When enabled, the current year only stores rows that are new or changed
+        self.delta_mode = delta_mode
+        self.count_cache = shared_count_cache if count_cache is None else count_cache
+        # Optional cache of whole historical-data responses, invalidated per year on ingest
+        self.result_cache = result_cache
+        # Long-lived download/parse/upload pools, shared by the services of the application.
+        # Only ingestions use them, so query-only services are built without one
+        self.pipeline = pipeline
+        # Long-lived pool for the summary reads of the aggregates endpoint
+        self.summary_executor = summary_executor or default_summary_executor()
+
+    def _ingest_current_year_delta(self, df: pd.DataFrame, year: int, ingestion_date: date,
+                                   source_signature: Optional[Dict[str, str]], fingerprint: Optional[str] = None) -> dict:
+        """
+        Saves only the rows of the current year that are new or changed since the last
+        ingestion, comparing per-(nom_bacia, ena_data) row hashes with the stored index.
+        """
+        delta = compute_row_delta(df, self.gcs_repository.load_row_index(year))
+        counts = {"rows_inserted": delta.inserted, "rows_updated": delta.updated, "rows_unchanged": delta.unchanged}
+
+        if delta.changed_rows.empty:
+            logging.info(f"Nenhuma linha nova ou alterada para o ano {year}.")
+            self.gcs_repository.save_row_index(year, delta.index)
+            return {"year": year, "status": "SUCESSO", "detail": "Nenhuma linha nova ou alterada.", "rows_ingested": 0, **counts}
+
+        # The fingerprint is the one of the full download, not of the delta rows
+        self.gcs_repository.save_dataframe(delta.changed_rows, year, ingestion_date, source_signature=source_signature,
+                                           content_fingerprint=fingerprint)
+        # The index is only advanced after the delta partition is safely stored
+        self.gcs_repository.save_row_index(year, delta.index)
+        self._refresh_summaries(year, df)
+        return {
+            "year": year,
+            "status": "SUCESSO",
+            "detail": "Linhas novas ou alteradas salvas no GCS (delta).",
+            "rows_ingested": len(delta.changed_rows),
+            **counts,
+        }
+
+    def _refresh_summaries(self, year: int, df: pd.DataFrame):
+        """
+        Recomputes the per-basin aggregates of a year from the full downloaded data, so the
+        aggregates endpoint reads them instead of the daily rows. A failure here does not
+        fail the ingestion: the endpoint then aggregates the rows through the repository.
+        """
+        try:
+            table = to_basin_table(df[list(BASIN_KEY_COLUMNS + BASIN_MEASURE_COLUMNS)])
+            for granularity in GRANULARITIES:
+                self.gcs_repository.save_summary(year, granularity, summarize(table, granularity))
+        except Exception as e:
+            logging.warning(f"Falha ao atualizar os resumos agregados do ano {year}: {e}")
 
-    def _process_year_ingestion(self, year: int, ingestion_date: date) -> dict:
+    def _stream_historical_year(self, year: int) -> dict:
         """
-        Processes the ingestion for a single year, applying the new verification logic.
+        Streams a historical year from ONS straight into its file, one row group at a
+        time, and builds its summaries batch by batch, so the year is never held in
+        memory as a whole. Like `_refresh_summaries`, a summary failure does not fail
+        the ingestion.
         """
+        def consume(batches: Iterator[pa.RecordBatch]) -> Tuple[int, Optional[Dict[str, pa.Table]]]:
+            # Rebuilt on every attempt: a retried stream starts over
+            summaries: Optional[Dict[str, pa.Table]] = {}
+
+            def summarized() -> Iterator[pa.RecordBatch]:
+                nonlocal summaries
+                for batch in batches:
+                    if summaries is not None:
+                        try:
+                            table = pa.Table.from_batches([batch])
+                            for granularity in GRANULARITIES:
+                                summary = summarize(table, granularity)
+                                if granularity in summaries:
+                                    # A period split across batches is combined like one split across years
+                                    summary = merge_summaries([summaries[granularity], summary])
+                                summaries[granularity] = summary
+                        except Exception as e:
+                            logging.warning(f"Falha ao calcular os resumos agregados do ano {year}: {e}")
+                            summaries = None
+                    yield batch
+
+            rows = self.gcs_repository.save_historical_batches(year, summarized())
+            return rows, summaries
+
+        rows, summaries = self.ons_client.stream_year(year, consume)
         try:
-            if year < self.current_year:
-                if self.gcs_repository.historical_data_exists(year):
-                    logging.info(f"Dados históricos para o ano {year} já existem. Pulando download.")
-                    return {"year": year, "status": "PULADO", "detail": "Dados históricos já existem no GCS."}
-                logging.info(f"Dados históricos para o ano {year} não encontrados. Baixando...")
-
-            #  --- LOGIC FOR THE CURRENT YEAR (2025) ---
-            if year == self.current_year:
-                latest_ingestion = self.gcs_repository.get_latest_ingestion_date()
-                if latest_ingestion and latest_ingestion == ingestion_date:
-                    logging.info(f"Dados para o ano corrente ({year}) já foram ingeridos hoje. Pulando download.")
-                    return {"year": year, "status": "PULADO", "detail": f"Os dados já foram carregados hoje ({latest_ingestion})."}
-                logging.info(f"Dados para o ano corrente ({year}) precisam de atualização. Baixando...")
-
-            # --- EXECUTE DOWNLOAD AND SAVE (if not skipped) ---
-            df = self.ons_client.get_data_for_year(year)
-            if df is not None and not df.empty:
-                self.gcs_repository.save_dataframe(df, year, ingestion_date)
-                return {
-                    "year": year,
-                    "status": "SUCESSO",
-                    "detail": "Novos dados baixados e salvos no GCS.",
-                    "rows_ingested": len(df)
-                }
+            for granularity, summary in (summaries or {}).items():
+                self.gcs_repository.save_summary(year, granularity, summary)
+        except Exception as e:
+            logging.warning(f"Falha ao atualizar os resumos agregados do ano {year}: {e}")
+        if not rows:
             return {"year": year, "status": "FALHA", "detail": "Nenhum dado retornado pelo cliente ONS.", "rows_ingested": 0}
+        return {
+            "year": year,
+            "status": "SUCESSO",
+            "detail": "Novos dados baixados em streaming e salvos no GCS.",
+            "rows_ingested": rows,
+        }
+
+    def _download_year(self, context: "_YearIngestion"):
+        """
+        Download stage of a year: decides whether the year must be ingested at all and,
+        if so, downloads its file. Returns `Finished` with the report of a skipped year.
+        """
+        finished = self._check_year(context)
+        if finished is not None:
+            return finished
+        download = self.ons_client.download_year(context.year)
+        # A file parsed while it streamed skips the parse stage
+        return Parsed(download) if isinstance(download, pd.DataFrame) else download
 
+    async def _download_year_async(self, context: "_YearIngestion"):
+        """`_download_year` through the async client, run on the pipeline's download loop."""
+        # The checks read GCS and the metadata with blocking clients, so they run off the loop
+        finished = await asyncio.to_thread(self._check_year, context)
+        if finished is not None:
+            return finished
+        return await self.async_ons_client.download_year(context.year)
+
+    def _check_year(self, context: "_YearIngestion") -> Optional[Finished]:
+        """
+        Returns `Finished` with the report of a year that needs no download (or that was
+        streamed straight to GCS), or None when its file must be downloaded.
+        """
+        year = context.year
+        if context.progress is not None:
+            context.progress(year, {"status": "EM_ANDAMENTO"})
+        if year < self.current_year:
+            if self.gcs_repository.historical_data_exists(year):
+                logging.info(f"Dados históricos para o ano {year} já existem. Pulando download.")
+                return Finished({"year": year, "status": "PULADO", "detail": "Dados históricos já existem no GCS."})
+            logging.info(f"Dados históricos para o ano {year} não encontrados. Baixando...")
+
+        #  --- LOGIC FOR THE CURRENT YEAR (2025) ---
+        if year == self.current_year:
+            context.latest_ingestion = latest_ingestion = self.gcs_repository.get_latest_ingestion_date()
+            if latest_ingestion and latest_ingestion == context.ingestion_date:
+                logging.info(f"Dados para o ano corrente ({year}) já foram ingeridos hoje. Pulando download.")
+                return Finished({"year": year, "status": "PULADO", "detail": f"Os dados já foram carregados hoje ({latest_ingestion})."})
+            # Skip the download when ONS reports the resource unchanged since the last ingestion
+            context.resource = resource = self.ons_client.get_resource_for_year(year)
+            if resource.signature and latest_ingestion:
+                if self.gcs_repository.get_source_signature(year, latest_ingestion) == resource.signature:
+                    logging.info(f"Recurso da ONS para o ano corrente ({year}) não mudou desde {latest_ingestion}. Pulando download.")
+                    return Finished({"year": year, "status": "PULADO", "detail": f"O recurso da ONS não mudou desde a última ingestão ({latest_ingestion})."})
+            logging.info(f"Dados para o ano corrente ({year}) precisam de atualização. Baixando...")
+
+        elif self.ons_client.streams_batches:
+            # Historical years need neither the fingerprint nor the delta of the whole year
+            return Finished(self._stream_historical_year(year))
+        return None
+
+    def _upload_year(self, context: "_YearIngestion", df: pd.DataFrame) -> dict:
+        """Upload stage of a year: stores the parsed data (or only its changes) in GCS."""
+        year, latest_ingestion, resource = context.year, context.latest_ingestion, context.resource
+        if df is not None and not df.empty:
+            # Computed by the ONS client while parsing
+            fingerprint = df.attrs.get(CONTENT_FINGERPRINT_ATTR)
+            if fingerprint and year == self.current_year and latest_ingestion:
+                # ONS often republishes the file unchanged: nothing to upload in that case
+                if self.gcs_repository.get_content_fingerprint(year, latest_ingestion) == fingerprint:
+                    logging.info(f"Conteúdo do ano corrente ({year}) idêntico ao da partição {latest_ingestion}. Nada a enviar.")
+                    return {"year": year, "status": "INALTERADO", "detail": f"O conteúdo baixado é idêntico ao da última ingestão ({latest_ingestion}).", "rows_ingested": 0}
+            if self.delta_mode and year == self.current_year:
+                return self._ingest_current_year_delta(df, year, context.ingestion_date, resource.signature, fingerprint)
+            self.gcs_repository.save_dataframe(df, year, context.ingestion_date, source_signature=resource.signature if resource else None,
+                                               content_fingerprint=fingerprint)
+            self._refresh_summaries(year, df)
+            return {
+                "year": year,
+                "status": "SUCESSO",
+                "detail": "Novos dados baixados e salvos no GCS.",
+                "rows_ingested": len(df)
+            }
+        return {"year": year, "status": "FALHA", "detail": "Nenhum dado retornado pelo cliente ONS.", "rows_ingested": 0}
+
+    @staticmethod
+    def _year_report(year: int, future: Future) -> dict:
+        try:
+            return future.result()
         except Exception as e:
             # Captura qualquer exceção inesperada durante o processamento do ano
-            logging.error(f"Falha inesperada ao processar o ano {year}: {e}", exc_info=True)
+            logging.error(f"Falha inesperada ao processar o ano {year}: {e}", exc_info=e)
             return {"year": year, "status": "FALHA", "detail": str(e), "rows_ingested": 0}
 
     @logging_it
-    def ingest_data(self, start_date: date, end_date: date) -> dict:
+    def ingest_data(self, start_date: date, end_date: date,
+                    progress: Optional[Callable[[int, dict], None]] = None) -> dict:
+        """
+        Ingests every year of the date range through the staged ingestion pipeline, so
+        one year can upload while others download or parse.
+
+        Args:
+            start_date (date): The start of the ingestion period.
+            end_date (date): The end of the ingestion period.
+            progress: Optional callback, called with `(year, {"status": "EM_ANDAMENTO"})`
+                when a year starts and with `(year, detail)` when it finishes.
+
+        Returns:
+            dict: A summary of the run and the detail of each year.
+        """
         ingestion_date = date.today()
         years_to_fetch = list(range(start_date.year, end_date.year + 1))
-        process_func = partial(self._process_year_ingestion, ingestion_date=ingestion_date)
-        
-        details = []
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            results = executor.map(process_func, years_to_fetch)
-            details = list(results)
+        if any(year < self.current_year for year in years_to_fetch):
+            # One listing per run; the workers then check historical years in memory
+            self.gcs_repository.refresh_historical_index()
+
+        pipeline = self.pipeline or default_pipeline()
+        futures = {}
+        for year in years_to_fetch:
+            context = _YearIngestion(year, ingestion_date, progress)
+            download = self._download_year_async if self.async_ons_client is not None else self._download_year
+            future = pipeline.submit(download=partial(download, context),
+                                          parse=parse_downloaded_file, upload=partial(self._upload_year, context), label=str(year))
+            futures[future] = year
+
+        reports = {}
+        for future in as_completed(futures):
+            year = futures[future]
+            reports[year] = self._year_report(year, future)
+            if progress is not None:
+                progress(year, reports[year])
+        details = [reports[year] for year in years_to_fetch]
         
         total_rows_ingested = sum(r.get("rows_ingested", 0) for r in details if r.get("status") == "SUCESSO")
 
+        if any(r.get("status") == "SUCESSO" for r in details):
+            # New data may change the row count of any cached range
+            with _count_cache_lock:
+                self.count_cache.clear()
+            if self.result_cache is not None:
+                changed_years = [r["year"] for r in details if r.get("status") == "SUCESSO"]
+                dropped = self.result_cache.invalidate_years(changed_years)
+                logging.info(f"{dropped} respostas em cache invalidadas para os anos {changed_years}.")
+            if isinstance(self.bq_repository, EmbeddedArrowRepository):
+                # The hot table checks its files on the next query instead of after its refresh interval
+                self.bq_repository.invalidate()
+
         summary = { "years_requested": years_to_fetch, "total_rows_ingested": total_rows_ingested }
+        if any("rows_inserted" in r for r in details):
+            # Delta ingestion breakdown
+            for key in ("rows_inserted", "rows_updated", "rows_unchanged"):
+                summary[f"total_{key}"] = sum(r.get(key, 0) for r in details)
         return { "summary": summary, "details": details }
+
+    def _cached_count(self, start_date: date, end_date: date) -> Optional[int]:
+        """Returns a recent count of the same date range, if there is one."""
+        with _count_cache_lock:
+            total = self.count_cache.get((start_date, end_date))
+        record_cache_lookup("row_count", total is not None)
+        return total
+
+    def _store_count(self, start_date: date, end_date: date, total: int) -> None:
+        with _count_cache_lock:
+            self.count_cache[(start_date, end_date)] = total
+
+    @staticmethod
+    def _validate_rows(result_table: pa.Table) -> List[BasinSilverData]:
+        """
+        Builds the response items of a page. The values are cleaned column-wise, rows
+        missing a key are dropped by mask and the remaining ones are validated in a
+        single TypeAdapter call.
+        """
+        try:
+            cleaned, valid = clean_response_rows(result_table)
+            if not pc.all(valid).as_py():
+                invalid = cleaned.filter(pc.invert(valid)).to_pylist()
+                logging.error(f"{len(invalid)} linhas inválidas ignoradas (nom_bacia ou ena_data ausente): {invalid[:5]}")
+                cleaned = cleaned.filter(valid)
+            return _BASIN_ROWS_ADAPTER.validate_python(to_response_rows(cleaned))
+        except (pa.ArrowInvalid, ValidationError) as e:
+            # Unexpected types: fall back to validating row by row, skipping the bad ones
+            logging.warning(f"Validação vetorizada falhou, validando linha a linha: {e}")
+            return BasinService._validate_rows_one_by_one(result_table)
+
+    @staticmethod
+    def _validate_rows_one_by_one(result_table: pa.Table) -> List[BasinSilverData]:
+        valid_items = []
+        for row in result_table.to_pylist():
+            try:
+                # Validate each row against the Pydantic model
+                item = BasinSilverData.model_validate(row)
+                valid_items.append(item)
+            except ValidationError as e:
+                # If a row is invalid, log the error and skip it instead of failing the request.
+                logging.error(f"Validation error on data row (skipping): {row}. Error: {e}")
+                continue
+        return valid_items
+
+    @staticmethod
+    def _last_key(result_table: pa.Table) -> PageKey:
+        """Sort key of the last row of a page, from which the next page continues."""
+        last = result_table.slice(result_table.num_rows - 1).select(["ena_data", "nom_bacia"]).to_pylist()[0]
+        return PageKey(last["ena_data"], str(last["nom_bacia"]))
+
     @logging_it
-    def get_historical_volume(self, start_date: date, end_date: date, page: int, size: int) -> dict:
+    def get_historical_volume(self, start_date: date, end_date: date, page: int, size: int,
+                              cursor: Optional[str] = None, include_total: bool = True) -> dict:
         """
         Retrieves historical basin data from the repository and formats it
-        into a paginated response.
+        into a paginated response. Responses are served from the result cache when
+        one is configured.
 
         Args:
             start_date (date): The start of the query period.
             end_date (date): The end of the query period.
-            page (int): The page number to retrieve.
+            page (int): The page number to retrieve (ignored when a cursor is given).
             size (int): The number of items per page.
+            cursor (Optional[str]): Opaque cursor returned as `next_cursor` by a previous
+                call; the page then continues right after the last row of that call.
+            include_total (bool): In cursor mode, whether to include the (cached) totals.
 
         Returns:
             dict: A dictionary containing the paginated data and metadata.
+
+        Raises:
+            InvalidCursorError: If the cursor is malformed or was issued for another range.
         """
-        result_df, total_items = self.bq_repository.find_by_date_range(start_date, end_date, page, size)
+        if self.result_cache is None:
+            return self._query_historical_volume(start_date, end_date, page, size, cursor, include_total)
+
+        key = QueryCacheKey(start_date, end_date, page, size, cursor, include_total)
+        result = self.result_cache.get(key)
+        if result is None:
+            result = self._query_historical_volume(start_date, end_date, page, size, cursor, include_total)
+            self.result_cache.put(key, result)
+        return result
+
+    def _query_historical_volume(self, start_date: date, end_date: date, page: int, size: int,
+                                 cursor: Optional[str], include_total: bool) -> dict:
+        if cursor is not None:
+            return self._get_page_after_cursor(start_date, end_date, size, cursor, include_total)
+
+        result_table, total_items = self.bq_repository.find_by_date_range(start_date, end_date, page, size)
         
         # Handle the case where the repository returns no data
-        if total_items == 0 or result_df.empty:
+        if total_items == 0 or result_table.num_rows == 0:
             return {"total_items": 0, "total_pages": 0, "current_page": page, "items_on_page": 0, "items": []}
 
-        valid_items = []
-        for index, row in result_df.iterrows():
-            try:
-                # Validate each row against the Pydantic model
-                item = BasinSilverData.model_validate(row, from_attributes=True)
-                valid_items.append(item)
-            except ValidationError as e:
-                # If a row is invalid, log the error and skip it instead of failing the request.
-                logging.error(f"Validation error on data row (skipping): {row.to_dict()}. Error: {e}")
-                continue
-        
+        valid_items = self._validate_rows(result_table)
+        has_more = page * size < total_items
         
         return {
             "total_items": total_items,
             "total_pages": math.ceil(total_items / size),
             "current_page": page,
             "items_on_page": len(valid_items),
-            "items": valid_items
-        }
\ No newline at end of file
+            "items": valid_items,
+            "next_cursor": encode_cursor(self._last_key(result_table), start_date, end_date) if has_more else None,
+        }
+
+    def _get_page_after_cursor(self, start_date: date, end_date: date, size: int, cursor: str,
+                               include_total: bool) -> dict:
+        """Keyset page: continues from the key embedded in the cursor."""
+        after = decode_cursor(cursor, start_date, end_date)
+        total_items = self._cached_count(start_date, end_date) if include_total else None
+        if include_total and total_items is None:
+            # Count and page are fetched together so the count does not add a round trip
+            result_table, has_more, total_items = self.bq_repository.find_page_after_with_count(
+                start_date, end_date, size, after)
+            self._store_count(start_date, end_date, total_items)
+        else:
+            result_table, has_more = self.bq_repository.find_page_after(start_date, end_date, size, after)
+
+        valid_items = self._validate_rows(result_table)
+        return {
+            "total_items": total_items,
+            "total_pages": math.ceil(total_items / size) if total_items is not None else None,
+            "current_page": None,
+            "items_on_page": len(valid_items),
+            "items": valid_items,
+            "next_cursor": encode_cursor(self._last_key(result_table), start_date, end_date) if has_more else None,
+        }
+
+    @logging_it
+    def get_aggregates(self, start_date: date, end_date: date, granularity: str, metric: str) -> dict:
+        """
+        Retrieves min, max, mean and sum of a metric per basin and period.
+
+        The range is widened to whole periods. When every year involved has a summary
+        refreshed by the ingestion, the summaries are merged and no daily row is read;
+        otherwise the repository aggregates the rows.
+
+        Args:
+            start_date (date): The start of the query period.
+            end_date (date): The end of the query period.
+            granularity (str): `week` (starting on Monday), `month` or `year`.
+            metric (str): One of the ENA measure columns.
+
+        Returns:
+            dict: The widened range, the source used and the aggregates.
+
+        Raises:
+            ValueError: If the granularity or the metric is not supported.
+        """
+        validate_aggregation(granularity, metric)
+        period_start, period_end = expand_to_periods(start_date, end_date, granularity)
+        years = list(range(period_start.year, period_end.year + 1))
+        if self.gcs_repository is not None:
+            load_summary = partial(self.gcs_repository.load_summary, granularity=granularity)
+            summaries = list(self.summary_executor.map(load_summary, years))
+        else:
+            # No bucket to read the summaries from: the repository aggregates the rows
+            summaries = [None]
+
+        if all(summary is not None for summary in summaries):
+            aggregates = to_aggregates(merge_summaries(summaries), metric, period_start, period_end)
+            source = "summary"
+        else:
+            logging.info(f"Resumos ausentes para algum dos anos {years}; agregando as linhas no repositório.")
+            aggregates = self.bq_repository.aggregate_by_period(period_start, period_end, granularity, metric)
+            source = "query"
+
+        return {
+            "granularity": granularity,
+            "metric": metric,
+            "start_date": period_start,
+            "end_date": period_end,
+            "source": source,
+            "items": [BasinAggregate.model_validate(row) for row in aggregates.to_pylist()],
+        }
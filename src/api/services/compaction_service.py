@@ -0,0 +1,192 @@
+import logging
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+
+from api.core.logging_decorator import logging_it
+from api.models.arrow_schema import HISTORICAL_PARTITION, PARTITION_COLUMN, has_legacy_types, keep_latest_rows
+from api.repositories.gcs_repository import GCSRepository, HistoricalFile, PartitionFile
+
+DEFAULT_RETENTION_DAYS = 7
+
+
+class CompactionService:
+    """
+    Collapses the daily current-year snapshots in GCS. Each daily ingestion adds a new
+    `current/year=/dt=` partition, so scans over `basin_data/` grow every day. Compaction:
+
+    - merges every partition of the current year into its latest partition, keeping
+      the newest copy of each (nom_bacia, ena_data), and deletes the partitions that
+      fall outside the retention window;
+    - moves past years still under `current/` into `historical/`;
+    - rewrites the files written before the typed schema (dates and measures as text)
+      in that schema, so the external table never mixes both layouts.
+
+    It must not run concurrently with an ingestion: the API wraps it in
+    `IngestJobManager.exclusive()`, which rejects one while the other runs.
+    """
+
+    def __init__(self, gcs_repo: GCSRepository, retention_days: int = DEFAULT_RETENTION_DAYS):
+        """
+        Args:
+            gcs_repo (GCSRepository): Repository of the basin data files.
+            retention_days (int): Days during which superseded current-year partitions are
+                kept (e.g. for rollback) before being deleted.
+        """
+        if retention_days < 0:
+            raise ValueError("retention_days cannot be negative.")
+        self.gcs_repository = gcs_repo
+        self.retention_days = retention_days
+        self.current_year = date.today().year
+
+    def _merge(self, files: List[PartitionFile], historical: bool = False) -> pa.Table:
+        """Reads the files and keeps the newest copy of each row."""
+        tables = []
+        if historical:
+            table = self.gcs_repository.read_historical_table(files[0].year)
+            tables.append(table.append_column(PARTITION_COLUMN, pa.array([HISTORICAL_PARTITION] * table.num_rows)))
+        for file in files:
+            table = self.gcs_repository.read_basin_table(file.blob_name)
+            if 'data_carga_bronze' not in table.column_names:
+                table = table.append_column('data_carga_bronze', pa.nulls(table.num_rows, pa.string()))
+            tables.append(table.append_column(PARTITION_COLUMN, pa.array([file.partition.isoformat()] * table.num_rows)))
+        merged = pa.concat_tables(tables, promote_options="default")
+        return keep_latest_rows(merged, PARTITION_COLUMN).drop_columns([PARTITION_COLUMN])
+
+    def _compact_current_year(self, year: int, files: List[PartitionFile], cutoff: date) -> dict:
+        latest = files[-1]
+        bytes_before = sum(f.size for f in files)
+        if len(files) == 1:
+            return {"year": year, "status": "PULADO", "detail": "Apenas uma partição; nada a compactar.",
+                    "partitions_deleted": 0, "bytes_before": bytes_before, "bytes_after": bytes_before}
+
+        signature = self.gcs_repository.get_source_signature(year, latest.partition)
+        # The fingerprint describes the source download, so it carries over to the compacted file
+        fingerprint = self.gcs_repository.get_content_fingerprint(year, latest.partition)
+        merged = self._merge(files)
+        # Overwriting the latest partition keeps the manifest and the latest-partition readers valid
+        new_size = self.gcs_repository.write_compacted(year, merged, latest.partition, signature, fingerprint)
+
+        expired = [f for f in files[:-1] if f.partition < cutoff]
+        kept = [f for f in files[:-1] if f.partition >= cutoff]
+        self.gcs_repository.delete_blobs([f.blob_name for f in expired])
+        logging.info(f"Ano {year}: {len(files)} partições compactadas em dt={latest.partition}; {len(expired)} removidas.")
+        return {
+            "year": year,
+            "status": "SUCESSO",
+            "detail": f"Partições compactadas em dt={latest.partition}.",
+            "rows": merged.num_rows,
+            "partitions_deleted": len(expired),
+            "bytes_before": bytes_before,
+            "bytes_after": new_size + sum(f.size for f in kept),
+        }
+
+    def _move_to_historical(self, year: int, files: List[PartitionFile]) -> dict:
+        historical = self.gcs_repository.list_historical_years().get(year)
+        bytes_before = sum(f.size for f in files) + (historical.size if historical else 0)
+
+        signature = self.gcs_repository.get_source_signature(year, files[-1].partition)
+        merged = self._merge(files, historical=historical is not None).drop_columns(['data_carga_bronze'])
+        new_size = self.gcs_repository.write_compacted(year, merged, None, signature)
+        # Only deleted once the historical file is safely stored
+        self.gcs_repository.delete_blobs([f.blob_name for f in files])
+        logging.info(f"Ano {year}: {len(files)} partições movidas para o arquivo histórico.")
+        return {
+            "year": year,
+            "status": "SUCESSO",
+            "detail": "Partições movidas para basin_data/historical/.",
+            "rows": merged.num_rows,
+            "partitions_deleted": len(files),
+            "bytes_before": bytes_before,
+            "bytes_after": new_size,
+        }
+
+    def _migrate_legacy_file(self, year: int, file: Optional[PartitionFile] = None,
+                             historical: Optional[HistoricalFile] = None) -> Optional[dict]:
+        """
+        Rewrites a current-year partition (or the historical file of a year) in the
+        typed schema if it still holds text columns. Returns None if it is up to date.
+        """
+        partition = file.partition if file else None
+        if not has_legacy_types(self.gcs_repository.read_file_schema(year, partition)):
+            return None
+        if file is not None:
+            table = self.gcs_repository.read_basin_table(file.blob_name)
+            fingerprint = self.gcs_repository.get_content_fingerprint(year, partition)
+        else:
+            table = self.gcs_repository.read_historical_table(year)
+            if 'data_carga_bronze' in table.column_names:
+                table = table.drop_columns(['data_carga_bronze'])
+            fingerprint = None
+        signature = self.gcs_repository.get_source_signature(year, partition)
+        new_size = self.gcs_repository.write_compacted(year, table, partition, signature, fingerprint)
+        bytes_before = file.size if file else historical.size
+        logging.info(f"Ano {year}: arquivo antigo em texto reescrito no esquema tipado.")
+        return {
+            "year": year,
+            "status": "MIGRADO",
+            "detail": (f"Partição dt={partition} reescrita" if file else "Arquivo histórico reescrito")
+                      + " no esquema tipado.",
+            "rows": table.num_rows,
+            "partitions_deleted": 0,
+            "bytes_before": bytes_before,
+            "bytes_after": new_size,
+        }
+
+    def _migrate_legacy_files(self, current: Dict[int, List[PartitionFile]]) -> List[dict]:
+        """
+        Migrates the historical files and current-year partitions that compaction would
+        not rewrite otherwise. Past years still under `current/` are skipped: moving them
+        to `historical/` already rewrites their data in the typed schema.
+        """
+        details = []
+        targets = [(year, None, historical) for year, historical in sorted(self.gcs_repository.list_historical_years().items())
+                   if year not in current]
+        targets += [(self.current_year, file, None) for file in current.get(self.current_year, [])]
+        for year, file, historical in targets:
+            try:
+                detail = self._migrate_legacy_file(year, file, historical)
+            except Exception as e:
+                logging.error(f"Falha ao migrar um arquivo do ano {year}: {e}", exc_info=True)
+                detail = {"year": year, "status": "FALHA", "detail": str(e)}
+            if detail is not None:
+                details.append(detail)
+        return details
+
+    @logging_it
+    def compact(self, today: Optional[date] = None) -> dict:
+        """
+        Compacts every year found under `basin_data/current/`.
+
+        Args:
+            today (Optional[date]): Reference date of the retention window (defaults to today).
+
+        Returns:
+            dict: A summary with the bytes reclaimed and a report per year.
+        """
+        today = today or date.today()
+        cutoff = today - timedelta(days=self.retention_days)
+
+        current = self.gcs_repository.list_current_partitions()
+        details = self._migrate_legacy_files(current)
+        for year, files in sorted(current.items()):
+            try:
+                if year < self.current_year:
+                    details.append(self._move_to_historical(year, files))
+                else:
+                    details.append(self._compact_current_year(year, files, cutoff))
+            except Exception as e:
+                logging.error(f"Falha ao compactar o ano {year}: {e}", exc_info=True)
+                details.append({"year": year, "status": "FALHA", "detail": str(e)})
+
+        bytes_before = sum(d.get("bytes_before", 0) for d in details)
+        bytes_after = sum(d.get("bytes_after", d.get("bytes_before", 0)) for d in details)
+        summary = {
+            "retention_days": self.retention_days,
+            "partitions_deleted": sum(d.get("partitions_deleted", 0) for d in details),
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "bytes_reclaimed": bytes_before - bytes_after,
+        }
+        return {"summary": summary, "details": details}
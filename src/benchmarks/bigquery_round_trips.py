@@ -0,0 +1,134 @@
+"""
+Compares the latency of the historical-data BigQuery access paths against a local
+stand-in client, where every job costs a fixed scheduling latency:
+
+  * page mode: the former COUNT job followed by the data job, versus the single
+    query with a `COUNT(*) OVER()` window total;
+  * cursor mode: the count and keyset page jobs awaited one after the other, versus
+    both jobs submitted up front and awaited together.
+
+Usage (from the `src/` directory):
+    python -m benchmarks.bigquery_round_trips [--job-latency-ms 250] [--repeat 5]
+"""
+import argparse
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+from google.cloud import bigquery
+
+from api.core.pagination import PageKey
+from api.repositories.bigquery_repository import TOTAL_COUNT_COLUMN, BigQueryRepository
+
+START, END = date(2020, 1, 1), date(2023, 12, 31)
+TOTAL_ROWS = 233_600
+PAGE_SIZE = 100
+
+
+class FakeQueryJob:
+    """Starts "running" when submitted, like a BigQuery job, and finishes after `latency` seconds."""
+
+    def __init__(self, latency: float, result: pd.DataFrame):
+        self._done = threading.Event()
+        self._result = result
+        threading.Timer(latency, self._done.set).start()
+
+    def to_dataframe(self) -> pd.DataFrame:
+        self._done.wait()
+        return self._result
+
+    def to_arrow(self, create_bqstorage_client: bool = False) -> pa.Table:
+        return pa.Table.from_pandas(self.to_dataframe(), preserve_index=False)
+
+
+class FakeBigQueryClient:
+    """Local stand-in for `bigquery.Client`: answers count and page queries with canned frames."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.jobs = 0
+
+    def query(self, sql: str, job_config: bigquery.QueryJobConfig) -> FakeQueryJob:
+        self.jobs += 1
+        if "COUNT(*) as total" in sql:
+            return FakeQueryJob(self.latency, pd.DataFrame({"total": [TOTAL_ROWS]}))
+        params = {p.name: p.value for p in job_config.query_parameters}
+        rows = params.get("size", params.get("limit"))
+        page = pd.DataFrame({
+            "nom_bacia": [f"BACIA_{i % 160:03d}" for i in range(rows)],
+            "ena_data": [START] * rows,
+            "ena_bruta_bacia_mwmed": [1.0] * rows,
+        })
+        if TOTAL_COUNT_COLUMN in sql:
+            page[TOTAL_COUNT_COLUMN] = TOTAL_ROWS
+        return FakeQueryJob(self.latency, page)
+
+
+def two_job_page(repo: BigQueryRepository, page: int, size: int) -> tuple[pd.DataFrame, int]:
+    """The former `find_by_date_range`: a COUNT job, then the data job."""
+    total_items = repo.count_by_date_range(START, END)
+    data_query = f"""
+        SELECT * FROM {repo.table_ref}
+        WHERE ena_data BETWEEN @start_date AND @end_date
+        ORDER BY ena_data, nom_bacia
+        LIMIT @size OFFSET @offset
+    """
+    params = repo._range_params(START, END) + [
+        bigquery.ScalarQueryParameter("size", "INT64", size),
+        bigquery.ScalarQueryParameter("offset", "INT64", (page - 1) * size),
+    ]
+    job_config = bigquery.QueryJobConfig(query_parameters=params)
+    return repo.client.query(data_query, job_config=job_config).to_dataframe(), total_items
+
+
+def sequential_cursor_page(repo: BigQueryRepository, after: PageKey, size: int) -> tuple:
+    """Keyset page, then the count, each awaited before the next job is submitted."""
+    df, has_more = repo.find_page_after(START, END, size, after)
+    return df, has_more, repo.count_by_date_range(START, END)
+
+
+def _measure(repeat: int, func) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def run(job_latency_ms: float, repeat: int) -> pd.DataFrame:
+    client = FakeBigQueryClient(job_latency_ms / 1000)
+    repo = BigQueryRepository("proj", "data", "tab", client=client)
+    after = PageKey(date(2021, 6, 1), "BACIA_042")
+
+    paths = {
+        "page: count + data jobs (sequential)": lambda: two_job_page(repo, 3, PAGE_SIZE),
+        "page: window count (single job)": lambda: repo.find_by_date_range(START, END, 3, PAGE_SIZE),
+        "cursor: page + count jobs (sequential)": lambda: sequential_cursor_page(repo, after, PAGE_SIZE),
+        "cursor: page + count jobs (concurrent)": lambda: repo.find_page_after_with_count(START, END, PAGE_SIZE, after),
+    }
+    results = []
+    for name, func in paths.items():
+        jobs_before = client.jobs
+        best, mean = _measure(repeat, func)
+        results.append({
+            "path": name,
+            "jobs": (client.jobs - jobs_before) // repeat,
+            "best_ms": round(best * 1000, 1),
+            "mean_ms": round(mean * 1000, 1),
+        })
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job-latency-ms", type=float, default=250)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(run(args.job_latency_ms, args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares the Parquet writer profiles on synthetic basin data: file size, write time,
+full read time and the time to read a one-month date range with row-group pruning.
+
+Usage (from the `src/` directory):
+    python -m benchmarks.parquet_profiles [--years 5] [--basins 160] [--repeat 3]
+"""
+import argparse
+import io
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from api.core.parquet_profiles import PARQUET_PROFILES
+from api.models.arrow_schema import to_basin_table
+
+
+def synthetic_basin_data(years: int, basins: int, seed: int = 42) -> pd.DataFrame:
+    """Daily rows for `basins` basins over `years` years, in ONS file order (basin-major)."""
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(date(2000, 1, 1), periods=365 * years, freq="D").date
+    names = [f"BACIA_{i:03d}" for i in range(basins)]
+    rows = len(days) * basins
+    return pd.DataFrame({
+        "nom_bacia": np.repeat(names, len(days)),
+        "ena_data": np.tile(days, basins),
+        "ena_bruta_bacia_mwmed": rng.gamma(2.0, 500.0, rows).round(3),
+        "ena_bruta_bacia_percentualmlt": rng.uniform(20, 180, rows).round(2),
+        "ena_armazenavel_bacia_mwmed": rng.gamma(2.0, 400.0, rows).round(3),
+        "ena_armazenavel_bacia_percentualmlt": rng.uniform(20, 180, rows).round(2),
+    })
+
+
+def _best_of(repeat: int, func):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(years: int, basins: int, repeat: int) -> pd.DataFrame:
+    df = synthetic_basin_data(years, basins)
+    table = to_basin_table(df)
+    range_start = date(2000, 6, 1)
+    range_filter = [("ena_data", ">=", range_start), ("ena_data", "<", range_start + timedelta(days=30))]
+
+    results = []
+    for name, profile in PARQUET_PROFILES.items():
+        def write():
+            buffer = io.BytesIO()
+            pq.write_table(profile.prepare_table(table), buffer,
+                           row_group_size=profile.row_group_size, **profile.writer_kwargs())
+            return buffer.getvalue()
+
+        write_s, data = _best_of(repeat, write)
+        read_s, _ = _best_of(repeat, lambda: pq.read_table(io.BytesIO(data)))
+        range_s, subset = _best_of(repeat, lambda: pq.read_table(io.BytesIO(data), filters=range_filter))
+        results.append({
+            "profile": name,
+            "size_mib": round(len(data) / 1024 ** 2, 2),
+            "write_ms": round(write_s * 1000, 1),
+            "read_ms": round(read_s * 1000, 1),
+            "range_read_ms": round(range_s * 1000, 1),
+            "row_groups": pq.ParquetFile(io.BytesIO(data)).metadata.num_row_groups,
+            "range_rows": subset.num_rows,
+        })
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--basins", type=int, default=160)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(run(args.years, args.basins, args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares the latency of the historical-data query backends that read the Parquet
+layout written by GCSRepository, on synthetic data in a local directory:
+
+  * gcs: GCSParquetRepository, which reads, deduplicates and sorts the files of the
+    range on every query;
+  * embedded: EmbeddedArrowRepository, which serves the same files from an in-memory
+    sorted table (the first query pays the load).
+
+Usage (from the `src/` directory):
+    python -m benchmarks.query_backends [--years 5] [--basins 160] [--repeat 5]
+"""
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from api.core.pagination import PageKey
+from api.core.parquet_profiles import get_parquet_profile
+from api.models.arrow_schema import to_basin_table
+from api.repositories.embedded_repository import EmbeddedArrowRepository
+from api.repositories.gcs_parquet_repository import GCSParquetRepository
+from benchmarks.parquet_profiles import synthetic_basin_data
+
+
+def write_layout(root: Path, years: int, basins: int) -> tuple[int, int]:
+    """Writes one historical file per past year and one current-year partition."""
+    current_year = date.today().year
+    df = synthetic_basin_data(years, basins)
+    # Shift the synthetic dates so the last year is the current one
+    offset = date(current_year - years + 1, 1, 1) - date(2000, 1, 1)
+    df["ena_data"] = [day + offset for day in df["ena_data"]]
+    profile = get_parquet_profile()
+    for year, rows in df.groupby(pd.to_datetime(df["ena_data"]).dt.year):
+        if year == current_year:
+            path = root / "basin_data" / "current" / f"year={year}" / f"dt={date.today()}" / f"basin_data_{year}.parquet"
+        else:
+            path = root / "basin_data" / "historical" / f"basin_data_{year}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        table = profile.prepare_table(to_basin_table(rows.reset_index(drop=True)))
+        pq.write_table(table, path, row_group_size=profile.row_group_size, **profile.writer_kwargs())
+    return current_year - years + 1, current_year
+
+
+def _measure(repeat: int, func) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def run(years: int, basins: int, repeat: int) -> pd.DataFrame:
+    with tempfile.TemporaryDirectory() as directory:
+        first_year, last_year = write_layout(Path(directory), years, basins)
+        backends = {
+            "gcs": GCSParquetRepository(directory, filesystem=pafs.LocalFileSystem()),
+            "embedded": EmbeddedArrowRepository(GCSParquetRepository(directory, filesystem=pafs.LocalFileSystem())),
+        }
+        month_start = date(first_year + 1, 6, 1)
+        queries = {
+            "one month, page 1": lambda repo: repo.find_by_date_range(month_start, month_start + timedelta(days=30), 1, 100),
+            "all years, page 50": lambda repo: repo.find_by_date_range(date(first_year, 1, 1), date(last_year, 12, 31), 50, 100),
+            "all years, keyset": lambda repo: repo.find_page_after(date(first_year, 1, 1), date(last_year, 12, 31), 1000,
+                                                                   PageKey(date(last_year - 1, 3, 1), "BACIA_050")),
+        }
+
+        results = []
+        for backend, repo in backends.items():
+            load_start = time.perf_counter()
+            repo.count_by_date_range(month_start, month_start)
+            first_query_ms = (time.perf_counter() - load_start) * 1000
+            for name, query in queries.items():
+                best, mean = _measure(repeat, lambda: query(repo))
+                results.append({
+                    "backend": backend,
+                    "query": name,
+                    "first_query_ms": round(first_query_ms, 1),
+                    "best_ms": round(best * 1000, 2),
+                    "mean_ms": round(mean * 1000, 2),
+                })
+        return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--basins", type=int, default=160)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(run(args.years, args.basins, args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
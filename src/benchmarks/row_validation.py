@@ -0,0 +1,67 @@
+"""
+Compares the two ways BasinService builds the response items of a page:
+
+  * per-row: `to_pylist` then `BasinSilverData.model_validate` on every row, invalid
+    rows being caught as exceptions (the previous implementation);
+  * vectorized: the values are cleaned column-wise by `clean_response_rows`, invalid
+    rows dropped by mask and the page validated in one TypeAdapter call.
+
+Each is run on pages typed as the repositories return them (dictionary names,
+float64 measures) and on pages whose measures are text with decimal commas.
+
+Usage (from the `src/` directory):
+    python -m benchmarks.row_validation [--sizes 100 1000] [--repeat 20]
+"""
+import argparse
+
+import pandas as pd
+import pyarrow as pa
+
+from api.models.arrow_schema import BASIN_MEASURE_COLUMNS, to_basin_table
+from api.services.basin_service import BasinService
+from benchmarks.parquet_profiles import _best_of, synthetic_basin_data
+
+
+def make_pages(size: int) -> dict:
+    typed = to_basin_table(synthetic_basin_data(years=1, basins=160).head(size))
+    text = typed
+    for column in BASIN_MEASURE_COLUMNS:
+        index = text.schema.get_field_index(column)
+        values = [None if value is None else str(value).replace(".", ",") for value in text.column(index).to_pylist()]
+        text = text.set_column(index, column, pa.array(values, pa.string()))
+    return {"typed": typed, "decimal commas": text}
+
+
+def run(sizes: list, repeat: int) -> pd.DataFrame:
+    methods = {
+        "per-row": BasinService._validate_rows_one_by_one,
+        "vectorized": BasinService._validate_rows,
+    }
+    results = []
+    for size in sizes:
+        for page_kind, page in make_pages(size).items():
+            timings = {}
+            for method, validate in methods.items():
+                best, items = _best_of(repeat, lambda: validate(page))
+                timings[method] = best
+                results.append({
+                    "size": size,
+                    "page": page_kind,
+                    "method": method,
+                    "items": len(items),
+                    "best_ms": round(best * 1000, 2),
+                })
+            results[-1]["speedup"] = round(timings["per-row"] / timings["vectorized"], 1)
+    return pd.DataFrame(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(run(args.sizes, args.repeat).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,12 @@ SELECT
   ena_bruta_bacia_percentualmlt,
   ena_armazenavel_bacia_mwmed,
   ena_armazenavel_bacia_percentualmlt,
-  CURRENT_TIMESTAMP() AS data_carga_bronze
+  CURRENT_TIMESTAMP() AS data_carga_bronze,
+  -- Data da partição (dt=YYYY-MM-DD) de origem; arquivos históricos recebem a menor data.
+  -- Com a ingestão delta, a partição mais recente contém a versão mais nova de cada linha.
+  COALESCE(
+    SAFE.PARSE_DATE('%Y-%m-%d', REGEXP_EXTRACT(_FILE_NAME, r'dt=(\d{4}-\d{2}-\d{2})')),
+    DATE '1900-01-01'
+  ) AS data_particao
 FROM
   sauter-university-472416.ons_bronze.external_table
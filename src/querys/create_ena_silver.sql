@@ -3,12 +3,15 @@ WITH
   dados_tipados AS (
     SELECT
       TRIM(UPPER(nom_bacia)) AS nom_bacia,
+      -- SAFE_CAST aceita tanto os arquivos tipados (DATE e FLOAT64) quanto os antigos em texto,
+      -- e transforma em NULL os valores que não podem ser convertidos
       SAFE_CAST(ena_data AS DATE) AS ena_data,
       SAFE_CAST(ena_bruta_bacia_mwmed AS NUMERIC) AS ena_bruta_bacia_mwmed,
       SAFE_CAST(ena_bruta_bacia_percentualmlt AS NUMERIC) AS ena_bruta_bacia_percentualmlt,
       SAFE_CAST(ena_armazenavel_bacia_mwmed AS NUMERIC) AS ena_armazenavel_bacia_mwmed,
       SAFE_CAST(ena_armazenavel_bacia_percentualmlt AS NUMERIC) AS ena_armazenavel_bacia_percentualmlt,
-      data_carga_bronze
+      data_carga_bronze,
+      data_particao
     FROM
       `sauter-university-472416.ons_bronze.ena_basin_bronze`
   ),
@@ -22,7 +25,7 @@ WITH
       ena_armazenavel_bacia_percentualmlt,
       ROW_NUMBER() OVER (
         PARTITION BY nom_bacia, ena_data 
-        ORDER BY ena_data, nom_bacia DESC
+        ORDER BY data_particao DESC
       ) AS rn
     FROM
       dados_tipados
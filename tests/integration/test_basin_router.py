@@ -1,10 +1,23 @@
+import threading
+import time
 import pytest
+from datetime import date
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock
 
+from api.core.exceptions import InvalidCursorError
+
 from api.main import app
 from api.services.basin_service import BasinService
-from api.routers.basin import get_basin_service
+from api.core.app_clients import AppClients
+from api.core.ingest_jobs import IngestJobManager, InMemoryJobStore
+from api.core.query_cache import QueryResultCache
+from api.repositories.embedded_repository import EmbeddedArrowRepository
+from api.routers.basin import (
+    get_app_clients, get_async_ons_client, get_basin_service, get_compaction_service, get_ingest_job_manager,
+    get_ingest_pipeline, get_ingest_service, get_ons_client, get_query_repository, get_query_result_cache, get_summary_executor
+)
 
 client = TestClient(app)
 
@@ -38,6 +51,7 @@ def override_basin_service(mock_basin_service):
     O `autouse=True` garante que ele seja executado automaticamente.
     """
     app.dependency_overrides[get_basin_service] = lambda: mock_basin_service
+    app.dependency_overrides[get_ingest_service] = lambda: mock_basin_service
     yield
     app.dependency_overrides.clear()
 
@@ -61,13 +75,280 @@ def test_get_historical_data_invalid_date_range():
     assert response.status_code == 400
     assert response.json()["detail"] == "Start date cannot be after the end date."
 
-def test_ingest_data_success(mock_basin_service):
-    mock_basin_service.ingest_data.return_value = {"summary": {"total_rows_ingested": 100}}
-    response = client.post("/api/basin/ingest", json={"start_date": "2023-01-01", "end_date": "2023-01-02"})
+def test_get_historical_data_with_cursor(mock_basin_service):
+    mock_basin_service.get_historical_volume.return_value = {**mock_response, "total_items": None, "next_cursor": "abc"}
+    response = client.get("/api/basin/historical-data?start_date=2023-01-01&end_date=2023-01-10&cursor=xyz&include_total=false")
 
     assert response.status_code == 200
-    assert response.json()["summary"]["total_rows_ingested"] == 100
+    assert response.json()["next_cursor"] == "abc"
+    assert response.json()["total_items"] is None
+    mock_basin_service.get_historical_volume.assert_called_once_with(
+        date(2023, 1, 1), date(2023, 1, 10), 1, 100, cursor="xyz", include_total=False
+    )
+
+def test_get_historical_data_invalid_cursor(mock_basin_service):
+    mock_basin_service.get_historical_volume.side_effect = InvalidCursorError("Malformed pagination cursor.")
+    response = client.get("/api/basin/historical-data?start_date=2023-01-01&end_date=2023-01-10&cursor=xyz")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Malformed pagination cursor."
+
+@pytest.fixture
+def ingest_jobs():
+    """Gerenciador de jobs real, em memória, no lugar do criado pela aplicação."""
+    manager = IngestJobManager(InMemoryJobStore(), max_concurrent_jobs=1, max_queued_jobs=0)
+    app.dependency_overrides[get_ingest_job_manager] = lambda: manager
+    yield manager
+    manager.shutdown(wait=True)
+
+def _poll_job(location):
+    for _ in range(500):
+        job = client.get(location).json()
+        if job["status"] in ("CONCLUIDO", "FALHA"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job não terminou: {job}")
+
+def test_ingest_data_success(mock_basin_service, ingest_jobs):
+    mock_basin_service.ingest_data.return_value = {"summary": {"total_rows_ingested": 100}, "details": []}
+    response = client.post("/api/basin/ingest", json={"start_date": "2023-01-01", "end_date": "2023-01-02"})
+
+    # A ingestão é aceita e executada em segundo plano
+    assert response.status_code == 202
+    assert response.json()["years"] == {"2023": "PENDENTE"}
+    assert response.headers["location"] == f"/api/basin/ingest/{response.json()['job_id']}"
+
+    job = _poll_job(response.headers["location"])
+    assert job["status"] == "CONCLUIDO"
+    assert job["summary"]["total_rows_ingested"] == 100
+    assert mock_basin_service.ingest_data.call_args.args == (date(2023, 1, 1), date(2023, 1, 2))
+
+def test_ingest_data_rejected_when_queue_is_full(mock_basin_service, ingest_jobs):
+    release = threading.Event()
+    mock_basin_service.ingest_data.side_effect = lambda *args, **kwargs: release.wait(5) and {"summary": {}, "details": []}
+
+    first = client.post("/api/basin/ingest", json={"start_date": "2023-01-01", "end_date": "2023-01-02"})
+    second = client.post("/api/basin/ingest", json={"start_date": "2024-01-01", "end_date": "2024-01-02"})
+    release.set()
+
+    assert first.status_code == 202
+    assert second.status_code == 429
+
+def test_get_ingest_job_not_found(ingest_jobs):
+    response = client.get("/api/basin/ingest/inexistente")
+
+    assert response.status_code == 404
 
 def test_root_endpoint():
     response = client.get("/")
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_metrics_endpoint_reports_request_latency_per_route(ingest_jobs):
+    client.get("/api/basin/ingest/desconhecido")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # O rótulo usa o template da rota, não o caminho com o id do job
+    assert 'route="/api/basin/ingest/{job_id}"' in response.text
+    assert "/ingest/desconhecido" not in response.text
+
+def test_metrics_include_requests_that_raise(mock_basin_service):
+    from prometheus_client import REGISTRY
+
+    mock_basin_service.get_historical_volume.side_effect = RuntimeError("falha inesperada")
+    labels = {"method": "GET", "route": "/api/basin/historical-data", "status": "500"}
+    before = REGISTRY.get_sample_value("basin_http_request_duration_seconds_count", labels) or 0.0
+
+    response = TestClient(app, raise_server_exceptions=False).get(
+        "/api/basin/historical-data?start_date=2023-01-01&end_date=2023-01-10"
+    )
+
+    assert response.status_code == 500
+    assert REGISTRY.get_sample_value("basin_http_request_duration_seconds_count", labels) == before + 1
+
+def test_compact_endpoint(ingest_jobs):
+    mock_compaction_service = MagicMock()
+    mock_compaction_service.compact.return_value = {"summary": {"bytes_reclaimed": 10}, "details": []}
+    app.dependency_overrides[get_compaction_service] = lambda: mock_compaction_service
+
+    response = client.post("/api/basin/compact")
+
+    assert response.status_code == 200
+    assert response.json()["summary"]["bytes_reclaimed"] == 10
+
+def test_compact_rejected_while_ingestion_runs(mock_basin_service, ingest_jobs):
+    release = threading.Event()
+    mock_basin_service.ingest_data.side_effect = lambda *args, **kwargs: release.wait(5) and {"summary": {}, "details": []}
+    mock_compaction_service = MagicMock()
+    app.dependency_overrides[get_compaction_service] = lambda: mock_compaction_service
+
+    ingest = client.post("/api/basin/ingest", json={"start_date": "2023-01-01", "end_date": "2023-01-02"})
+    response = client.post("/api/basin/compact")
+    release.set()
+
+    assert ingest.status_code == 202
+    assert response.status_code == 409
+    mock_compaction_service.compact.assert_not_called()
+
+def test_ingest_rejected_while_compaction_runs(mock_basin_service, ingest_jobs):
+    mock_compaction_service = MagicMock()
+    # Uma ingestão enviada durante a compactação é recusada
+    mock_compaction_service.compact.side_effect = lambda: {
+        "ingest_status": client.post("/api/basin/ingest", json={"start_date": "2023-01-01", "end_date": "2023-01-02"}).status_code
+    }
+    app.dependency_overrides[get_compaction_service] = lambda: mock_compaction_service
+
+    response = client.post("/api/basin/compact")
+
+    assert response.json() == {"ingest_status": 409}
+    mock_basin_service.ingest_data.assert_not_called()
+
+def test_cache_stats_endpoint():
+    cache = QueryResultCache(max_bytes=1024 ** 2, ttl_seconds=60)
+    cache.get("chave-inexistente")
+    app.dependency_overrides[get_query_result_cache] = lambda: cache
+
+    response = client.get("/api/basin/cache/stats")
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is True
+    assert response.json()["misses"] == 1
+
+def test_cache_stats_endpoint_disabled():
+    app.dependency_overrides[get_query_result_cache] = lambda: None
+
+    response = client.get("/api/basin/cache/stats")
+    app.dependency_overrides.clear()
+
+    assert response.json() == {"enabled": False}
+
+def test_lifespan_creates_and_closes_shared_clients():
+    with TestClient(app) as lifespan_client:
+        clients = app.state.clients
+        assert isinstance(clients, AppClients)
+        http_client = clients.http_client()
+        assert lifespan_client.get("/").status_code == 200
+
+    # No encerramento da aplicação o pool de conexões é fechado
+    assert http_client.is_closed
+
+def test_offline_embedded_queries_need_no_gcs(monkeypatch, tmp_path):
+    """
+    Backend embedded sobre um diretório local, sem bucket e sem credenciais: as
+    consultas não constroem o repositório GCS, o cliente ONS nem o pipeline de ingestão.
+    """
+    from tests.unit.test_gcs_parquet_repository import _write
+
+    _write(tmp_path / "basin_data" / "historical" / "basin_data_2023.parquet",
+           [("SUL", date(2023, 1, 2), 5.0), ("GRANDE", date(2023, 1, 3), 7.0)])
+    monkeypatch.setenv("HISTORICAL_BACKEND", "embedded")
+    monkeypatch.setenv("EMBEDDED_DATA_DIR", str(tmp_path))
+    monkeypatch.delenv("GCS_BUCKET_NAME", raising=False)
+    clients = MagicMock(spec=AppClients)
+    clients.storage_client.side_effect = AssertionError("sem credenciais")
+    app.dependency_overrides.pop(get_basin_service)
+    app.dependency_overrides[get_app_clients] = lambda: clients
+    app.dependency_overrides[get_query_result_cache] = lambda: None
+    try:
+        historical = client.get("/api/basin/historical-data?start_date=2023-01-01&end_date=2023-01-10")
+        aggregates = client.get("/api/basin/aggregates?start_date=2023-01-01&end_date=2023-01-10")
+    finally:
+        app.state.embedded_repository = None
+
+    assert historical.status_code == 200
+    assert [item["nom_bacia"] for item in historical.json()["items"]] == ["SUL", "GRANDE"]
+    assert aggregates.status_code == 200
+    clients.storage_client.assert_not_called()
+    clients.http_client.assert_not_called()
+    assert getattr(app.state, "ingest_pipeline", None) is None
+
+def test_lifespan_shuts_down_ingest_pipeline():
+    with TestClient(app):
+        pipeline = get_ingest_pipeline(SimpleNamespace(app=app))
+        assert get_ingest_pipeline(SimpleNamespace(app=app)) is pipeline
+
+    assert app.state.ingest_pipeline is None
+    with pytest.raises(RuntimeError):
+        pipeline.submit(download=lambda: 1, upload=lambda value: value)
+
+def test_lifespan_shuts_down_summary_executor():
+    with TestClient(app):
+        executor = get_summary_executor(SimpleNamespace(app=app))
+        assert get_summary_executor(SimpleNamespace(app=app)) is executor
+
+    assert app.state.summary_executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: 1)
+
+def test_async_ons_client_is_shared_and_closed_with_the_pipeline(monkeypatch):
+    monkeypatch.setenv("ONS_ASYNC_DOWNLOAD", "true")
+    monkeypatch.setenv("ONS_MAX_CONCURRENCY", "3")
+    with TestClient(app):
+        request = SimpleNamespace(app=app)
+        pipeline = get_ingest_pipeline(request)
+        client = get_async_ons_client(request, pipeline)
+        assert get_async_ons_client(request, pipeline) is client
+        assert client.max_concurrency == 3
+
+    # O pipeline fecha o cliente no loop em que os downloads rodaram
+    assert client.client.is_closed
+    assert app.state.async_ons_client is None
+
+def test_async_ons_client_is_off_by_default_and_with_streaming(monkeypatch):
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+    assert get_async_ons_client(request, MagicMock()) is None
+
+    monkeypatch.setenv("ONS_ASYNC_DOWNLOAD", "true")
+    monkeypatch.setenv("ONS_STREAMING_DOWNLOAD", "true")
+    assert get_async_ons_client(request, MagicMock()) is None
+
+def test_ons_client_dependency_reuses_app_http_client():
+    http_client = MagicMock()
+    clients = AppClients(http_client=http_client)
+
+    assert get_ons_client(clients).client is http_client
+
+def test_embedded_backend_is_shared_per_app(monkeypatch, tmp_path):
+    monkeypatch.setenv("HISTORICAL_BACKEND", "embedded")
+    monkeypatch.setenv("EMBEDDED_DATA_DIR", str(tmp_path))
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace()))
+
+    repository = get_query_repository(request, AppClients())
+
+    assert isinstance(repository, EmbeddedArrowRepository)
+    assert repository.source.bucket_name == str(tmp_path)
+    assert get_query_repository(request, AppClients()) is repository
+
+def test_unknown_backend_is_rejected(monkeypatch):
+    monkeypatch.setenv("HISTORICAL_BACKEND", "duckdb")
+
+    with pytest.raises(ValueError):
+        get_query_repository(SimpleNamespace(), AppClients())
+
+def test_get_aggregates_endpoint(mock_basin_service):
+    mock_basin_service.get_aggregates.return_value = {
+        "granularity": "month", "metric": "ena_bruta_bacia_mwmed", "start_date": date(2023, 1, 1),
+        "end_date": date(2023, 1, 31), "source": "summary",
+        "items": [{"nom_bacia": "SUL", "period_start": date(2023, 1, 1), "count": 31, "min": 1.0, "max": 5.0,
+                   "mean": 3.0, "sum": 93.0}],
+    }
+    response = client.get("/api/basin/aggregates?start_date=2023-01-01&end_date=2023-01-10")
+
+    assert response.status_code == 200
+    assert response.json()["items"][0]["mean"] == 3.0
+    mock_basin_service.get_aggregates.assert_called_once_with(
+        date(2023, 1, 1), date(2023, 1, 10), "month", "ena_bruta_bacia_mwmed")
+
+def test_get_aggregates_invalid_metric(mock_basin_service):
+    mock_basin_service.get_aggregates.side_effect = ValueError("Unknown metric 'x'.")
+    response = client.get("/api/basin/aggregates?start_date=2023-01-01&end_date=2023-01-10&metric=x")
+
+    assert response.status_code == 400
+
+def test_get_aggregates_invalid_granularity(mock_basin_service):
+    response = client.get("/api/basin/aggregates?start_date=2023-01-01&end_date=2023-01-10&granularity=day")
+
+    assert response.status_code == 422
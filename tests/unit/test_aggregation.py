@@ -0,0 +1,72 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from api.core.aggregation import (
+    expand_to_periods, merge_summaries, period_end, period_start, summarize, to_aggregates, validate_aggregation
+)
+from api.models.arrow_schema import to_basin_table
+
+
+def _table(days, basins=('SUL', 'GRANDE')):
+    rows = [(basin, day, float(i), 1.0, 2.0, 3.0) for i, day in enumerate(days) for basin in basins]
+    df = pd.DataFrame(rows, columns=['nom_bacia', 'ena_data', 'ena_bruta_bacia_mwmed', 'ena_bruta_bacia_percentualmlt',
+                                     'ena_armazenavel_bacia_mwmed', 'ena_armazenavel_bacia_percentualmlt'])
+    return to_basin_table(df)
+
+
+@pytest.mark.parametrize("granularity,start,end", [
+    ("week", date(2023, 12, 25), date(2023, 12, 31)),
+    ("month", date(2024, 2, 1), date(2024, 2, 29)),
+    ("year", date(2024, 1, 1), date(2024, 12, 31)),
+])
+def test_period_bounds(granularity, start, end):
+    day = start + timedelta(days=3)
+
+    assert (period_start(day, granularity), period_end(day, granularity)) == (start, end)
+
+
+def test_expand_to_periods():
+    assert expand_to_periods(date(2024, 1, 3), date(2024, 1, 10), "week") == (date(2024, 1, 1), date(2024, 1, 14))
+
+
+def test_summaries_merged_across_years_match_single_summary():
+    """Uma semana dividida entre os resumos de dois anos é combinada corretamente."""
+    days = [date(2019, 12, 28) + timedelta(days=i) for i in range(10)]
+    table = _table(days)
+    whole = summarize(table, "week")
+    years = pc.year(table.column('ena_data'))
+    by_year = [summarize(table.filter(pc.equal(years, year)), "week") for year in (2019, 2020)]
+
+    merged = merge_summaries(by_year)
+
+    assert merged.to_pylist() == whole.to_pylist()
+
+
+def test_to_aggregates_computes_mean_and_filters_periods():
+    days = [date(2024, 1, 1) + timedelta(days=i) for i in range(14)]
+    summary = summarize(_table(days, basins=('SUL',)), "week")
+
+    aggregates = to_aggregates(summary, "ena_bruta_bacia_mwmed", date(2024, 1, 8), date(2024, 1, 14))
+
+    assert aggregates.to_pylist() == [{'nom_bacia': 'SUL', 'period_start': date(2024, 1, 8), 'count': 7,
+                                       'min': 7.0, 'max': 13.0, 'mean': 10.0, 'sum': 70.0}]
+
+
+def test_to_aggregates_period_without_values_has_null_mean():
+    table = _table([date(2024, 1, 1)], basins=('SUL',))
+    table = table.set_column(2, 'ena_bruta_bacia_mwmed', pa.array([None], pa.float64()))
+
+    aggregates = to_aggregates(summarize(table, "month"), "ena_bruta_bacia_mwmed")
+
+    assert aggregates.to_pylist()[0]['count'] == 0
+    assert aggregates.to_pylist()[0]['mean'] is None
+
+
+@pytest.mark.parametrize("granularity,metric", [("day", "ena_bruta_bacia_mwmed"), ("month", "nom_bacia; DROP")])
+def test_validate_aggregation_rejects_unknown_values(granularity, metric):
+    with pytest.raises(ValueError):
+        validate_aggregation(granularity, metric)
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock, patch
+
+import httpx
+
+from api.core.app_clients import AppClients
+from api.core.ons_client import ONSClient
+
+
+def test_http_client_is_built_once_with_pool_limits():
+    clients = AppClients(http_timeout=5, http_max_connections=7, http_max_keepalive_connections=3)
+
+    client = clients.http_client()
+
+    assert isinstance(client, httpx.Client)
+    assert clients.http_client() is client
+    assert client.timeout.connect == 5
+    clients.close()
+    assert client.is_closed
+
+
+@patch('api.core.app_clients.storage.Client')
+def test_storage_client_is_shared_and_pool_sized(mock_storage_client):
+    clients = AppClients(gcp_pool_size=32)
+
+    client = clients.storage_client()
+
+    assert clients.storage_client() is client
+    mock_storage_client.assert_called_once_with()
+    adapter = client._http.mount.call_args.args[1]
+    assert adapter._pool_maxsize == 32
+
+
+@patch('api.core.app_clients.bigquery.Client')
+def test_bigquery_client_per_project(mock_bigquery_client):
+    clients = AppClients()
+
+    first = clients.bigquery_client("proj")
+    clients.bigquery_client("proj")
+
+    mock_bigquery_client.assert_called_once_with(project="proj")
+    clients.close()
+    first.close.assert_called_once()
+
+
+def test_prebuilt_clients_are_used_and_closed():
+    http_client, bigquery_client = MagicMock(), MagicMock()
+    clients = AppClients(http_client=http_client, bigquery_client=bigquery_client)
+
+    assert clients.http_client() is http_client
+    assert clients.bigquery_client("qualquer") is bigquery_client
+    clients.close()
+
+    http_client.close.assert_called_once()
+    bigquery_client.close.assert_called_once()
+
+
+def test_close_continues_after_a_failure():
+    http_client, storage_client = MagicMock(), MagicMock()
+    http_client.close.side_effect = RuntimeError("falha")
+    clients = AppClients(http_client=http_client, storage_client=storage_client)
+
+    clients.close()
+
+    storage_client.close.assert_called_once()
+
+
+def test_ons_client_reuses_given_http_client():
+    http_client = MagicMock()
+
+    assert ONSClient(http_client=http_client).client is http_client
@@ -0,0 +1,111 @@
+from datetime import date
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from api.models.arrow_schema import (
+    ONS_BASIN_SCHEMA, clean_response_rows, conform_table, has_legacy_types, to_basin_table, to_response_rows
+)
+from api.models.basin import BasinSilverData
+
+def test_conform_table_normalizes_decimal_commas():
+    table = pa.table({
+        "ena_data": pa.array([date(2023, 1, 1), date(2023, 1, 2)], pa.date32()),
+        "nom_bacia": ["GRANDE", "GRANDE"],
+        "ena_bruta_bacia_mwmed": ["1234,5", " 10.5 "],
+        "ena_armazenavel_bacia_mwmed": ["", None],
+        "coluna_extra": ["x", "y"],
+    })
+
+    conformed = conform_table(table)
+
+    assert conformed.schema == ONS_BASIN_SCHEMA
+    assert conformed.column("ena_bruta_bacia_mwmed").to_pylist() == [1234.5, 10.5]
+    assert conformed.column("ena_armazenavel_bacia_mwmed").to_pylist() == [None, None]
+    # Colunas ausentes são preenchidas com nulos
+    assert conformed.column("ena_bruta_bacia_percentualmlt").null_count == 2
+
+def test_conform_table_nulls_values_that_are_not_numbers():
+    table = pa.table({
+        "ena_data": pa.array([date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3)], pa.date32()),
+        "nom_bacia": ["SUL", "SUL", "SUL"],
+        "ena_bruta_bacia_mwmed": ["x", "1,5", "nan"],
+    })
+
+    conformed = conform_table(table)
+
+    # Como o SAFE_CAST da consulta silver: a célula inválida vira nulo, o arquivo não falha
+    assert conformed.column("ena_bruta_bacia_mwmed").to_pylist() == [None, 1.5, None]
+
+def test_has_legacy_types_detects_text_files():
+    legacy = pa.schema([("nom_bacia", pa.string()), ("ena_data", pa.string()), ("ena_bruta_bacia_mwmed", pa.string())])
+    typed_with_plain_names = ONS_BASIN_SCHEMA.set(0, pa.field("nom_bacia", pa.string()))
+
+    assert has_legacy_types(legacy)
+    assert not has_legacy_types(ONS_BASIN_SCHEMA)
+    assert not has_legacy_types(typed_with_plain_names)
+
+def test_conform_table_requires_key_columns():
+    with pytest.raises(KeyError):
+        conform_table(pa.table({"nom_bacia": ["SUL"]}))
+
+def test_to_basin_table_round_trip_keeps_schema():
+    df = conform_table(pa.table({
+        "nom_bacia": ["SUL"],
+        "ena_data": pa.array([date(2023, 1, 1)], pa.date32()),
+        "ena_bruta_bacia_mwmed": ["1,5"],
+    })).to_pandas()
+    df['data_carga_bronze'] = '2023-01-02'
+
+    buffer = io.BytesIO()
+    pq.write_table(to_basin_table(df), buffer)
+    written = pq.read_table(io.BytesIO(buffer.getvalue()))
+
+    for field in ONS_BASIN_SCHEMA:
+        assert written.schema.field(field.name).type == field.type
+    assert written.schema.field("data_carga_bronze").type == pa.string()
+
+def test_to_basin_table_ignores_unknown_columns():
+    table = to_basin_table(pd.DataFrame({'data': [1, 2]}))
+    assert table.column_names == ['data']
+
+def test_clean_response_rows_matches_model_validator():
+    raw = {
+        "nom_bacia": pa.array(["SUL", "SUL", "SUL", "SUL"]).dictionary_encode(),
+        "ena_data": pa.array([date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 3), date(2023, 1, 4)], pa.date32()),
+        "ena_bruta_bacia_mwmed": [" 1234,5", "10.5", "abc", None],
+        "ena_armazenavel_bacia_mwmed": [float("nan"), 1.0, None, 2.0],
+    }
+
+    cleaned, valid = clean_response_rows(pa.table(raw))
+
+    assert valid.to_pylist() == [True] * 4
+    # A limpeza por coluna produz os mesmos valores que o validador do modelo
+    expected = [BasinSilverData.model_validate(row).model_dump() for row in pa.table(raw).to_pylist()]
+    assert cleaned.to_pylist() == expected
+
+def test_clean_response_rows_masks_rows_without_keys():
+    table = pa.table({
+        "nom_bacia": ["SUL", None, "NORTE"],
+        "ena_data": pa.array([date(2023, 1, 1), date(2023, 1, 1), None], pa.date32()),
+    })
+
+    cleaned, valid = clean_response_rows(table)
+
+    assert valid.to_pylist() == [True, False, False]
+    assert cleaned.column("ena_bruta_bacia_mwmed").null_count == 3
+
+def test_to_response_rows_builds_model_input():
+    table = pa.table({
+        "nom_bacia": ["SUL", "NORTE", "SUL"],
+        "ena_data": pa.array([date(2023, 1, 1), date(2023, 1, 1), date(2023, 1, 2)], pa.date32()),
+        "ena_bruta_bacia_mwmed": [1.5, None, 2.5],
+    })
+
+    cleaned, _ = clean_response_rows(table)
+    items = [BasinSilverData.model_validate(row) for row in to_response_rows(cleaned)]
+
+    assert [item.model_dump() for item in items] == cleaned.to_pylist()
@@ -0,0 +1,180 @@
+import asyncio
+from datetime import date
+import httpx
+import pytest
+
+from api.core.async_ons_client import AsyncONSClient
+from api.core.ons_client import ONS_API_URL
+from api.core.ons_metadata import ONSMetadataCache
+from api.core.exceptions import ONSClientError, ONSResourceNotFoundError, ONSDataProcessingError
+
+mock_metadata_response = {
+    "result": {
+        "resources": [
+            {"name": "Dados de 2022", "format": "CSV", "url": "http://example.com/2022.csv"},
+            {"name": "Dados de 2023", "format": "CSV", "url": "http://example.com/2023.csv"},
+        ]
+    }
+}
+
+def make_client(handler, **kwargs):
+    """Cria um AsyncONSClient com transporte simulado e sem espera entre tentativas."""
+    return AsyncONSClient(
+        metadata_cache=ONSMetadataCache(),
+        transport=httpx.MockTransport(handler),
+        backoff_base=0,
+        **kwargs,
+    )
+
+def test_get_data_for_years_success():
+    """
+    Testa o download concorrente de vários anos com uma única busca de metadados.
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(str(request.url))
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json=mock_metadata_response)
+        year = request.url.path.strip("/").split(".")[0]
+        return httpx.Response(200, text=f"ena_data;nom_bacia\n{year}-01-01;SUDESTE")
+
+    async def run():
+        async with make_client(handler) as client:
+            return await client.get_data_for_years([2022, 2023])
+
+    results = asyncio.run(run())
+
+    assert results[2022].iloc[0]['ena_data'] == date(2022, 1, 1)
+    assert results[2023].iloc[0]['nom_bacia'] == 'SUDESTE'
+    assert sum(1 for url in calls if url.startswith(ONS_API_URL)) == 1
+
+def test_retries_on_server_error():
+    """
+    Testa se respostas 5xx são repetidas até o sucesso.
+    """
+    attempts = {"csv": 0}
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json=mock_metadata_response)
+        attempts["csv"] += 1
+        if attempts["csv"] < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, text="ena_data;nom_bacia\n2023-01-01;SUL")
+
+    async def run():
+        async with make_client(handler, max_retries=3) as client:
+            return await client.get_data_for_year(2023)
+
+    df = asyncio.run(run())
+
+    assert attempts["csv"] == 3
+    assert df.iloc[0]['nom_bacia'] == 'SUL'
+
+def test_retries_exhausted_on_timeout():
+    """
+    Testa se timeouts persistentes viram ONSDataProcessingError após as tentativas.
+    """
+    attempts = {"csv": 0}
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json=mock_metadata_response)
+        attempts["csv"] += 1
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    async def run():
+        async with make_client(handler, max_retries=2) as client:
+            await client.get_data_for_year(2023)
+
+    with pytest.raises(ONSDataProcessingError, match="Network failure"):
+        asyncio.run(run())
+    assert attempts["csv"] == 3
+
+def test_client_error_is_not_retried():
+    """
+    Testa se erros 4xx não são repetidos e são convertidos em ONSClientError.
+    """
+    attempts = {"metadata": 0}
+
+    def handler(request):
+        attempts["metadata"] += 1
+        return httpx.Response(404)
+
+    async def run():
+        async with make_client(handler) as client:
+            await client.get_resource_for_year(2023)
+
+    with pytest.raises(ONSClientError, match="A network error occurred"):
+        asyncio.run(run())
+    assert attempts["metadata"] == 1
+
+def test_missing_year_is_reported_per_year():
+    """
+    Testa se um ano inexistente não cancela os demais downloads.
+    """
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json=mock_metadata_response)
+        return httpx.Response(200, text="ena_data;nom_bacia\n2022-01-01;SUL")
+
+    async def run():
+        async with make_client(handler) as client:
+            return await client.get_data_for_years([2022, 2030])
+
+    results = asyncio.run(run())
+
+    assert not results[2022].empty
+    assert isinstance(results[2030], ONSResourceNotFoundError)
+
+def test_concurrency_is_bounded():
+    """
+    Testa se o semáforo limita o número de requisições simultâneas.
+    """
+    state = {"in_flight": 0, "peak": 0}
+
+    async def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json={"result": {"resources": [
+                {"name": f"Dados de {year}", "format": "CSV", "url": f"http://example.com/{year}.csv"}
+                for year in range(2000, 2010)
+            ]}})
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return httpx.Response(200, text="ena_data;nom_bacia\n2000-01-01;SUL")
+
+    async def run():
+        async with make_client(handler, max_concurrency=2) as client:
+            return await client.get_data_for_years(range(2000, 2010))
+
+    results = asyncio.run(run())
+
+    assert len(results) == 10
+    assert state["peak"] <= 2
+
+def test_download_year_returns_raw_file_and_counts_bytes():
+    """
+    Testa se download_year entrega o CSV sem parse, para a etapa de parse do pipeline,
+    e registra os bytes baixados.
+    """
+    from prometheus_client import REGISTRY
+
+    content = b"ena_data;nom_bacia\n2022-01-01;SUL"
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, json=mock_metadata_response)
+        return httpx.Response(200, content=content)
+
+    async def run():
+        async with make_client(handler) as client:
+            return await client.download_year(2022)
+
+    before = REGISTRY.get_sample_value("basin_ons_download_bytes_total", {"year": "2022"}) or 0.0
+    download = asyncio.run(run())
+
+    assert download.year == 2022 and download.content == content
+    assert REGISTRY.get_sample_value("basin_ons_download_bytes_total", {"year": "2022"}) == before + len(content)
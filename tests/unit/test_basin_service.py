@@ -2,13 +2,20 @@ import pytest
 from unittest.mock import MagicMock, patch
 from datetime import date, timedelta
 import pandas as pd
+import pyarrow as pa
+
+from cachetools import TTLCache
 
 from api.services.basin_service import BasinService
-from api.core.exceptions import ONSClientError
+from api.core.exceptions import InvalidCursorError, ONSClientError
+from api.core.pagination import PageKey, decode_cursor, encode_cursor
+from api.core.query_cache import QueryResultCache
+from api.core.aggregation import summarize
+from api.models.arrow_schema import to_basin_table
 from api.models.basin import BasinSilverData
 
 # Dados de mock realistas para o BigQuery
-mock_bq_df = pd.DataFrame({
+mock_bq_table = pa.table({
     'nom_bacia': ['SUDESTE', 'SUL'],
     'ena_data': [date(2023, 1, 1), date(2023, 1, 2)],
     'ena_bruta_bacia_mwmed': [100.5, 200.0],
@@ -24,18 +31,22 @@ def mock_gcs_repository():
 @pytest.fixture
 def mock_bq_repository():
     repo = MagicMock()
-    # Configura o mock para retornar o DataFrame e o total de itens
-    repo.find_by_date_range.return_value = (mock_bq_df, 2)
+    # Configura o mock para retornar a tabela Arrow e o total de itens
+    repo.find_by_date_range.return_value = (mock_bq_table, 2)
     return repo
 
 @pytest.fixture
 def mock_ons_client():
-    return MagicMock()
+    client = MagicMock()
+    client.streams_batches = False
+    return client
 
 @pytest.fixture
 def basin_service(mock_gcs_repository, mock_bq_repository, mock_ons_client):
     """Fixture que cria uma instância do BasinService com dependências mockadas."""
-    return BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client)
+    # Cache de contagem isolado para que os totais não vazem entre os testes
+    return BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client,
+                        count_cache=TTLCache(maxsize=16, ttl=60))
 
 def test_ingest_data_success_and_skip(basin_service, mock_ons_client, mock_gcs_repository):
     """
@@ -50,7 +61,7 @@ def test_ingest_data_success_and_skip(basin_service, mock_ons_client, mock_gcs_r
     
     # Mock do DataFrame retornado pelo ONS client para o ano de 2023
     mock_df_2023 = pd.DataFrame({'ena_data': [date(2023, 1, 1)]})
-    mock_ons_client.get_data_for_year.return_value = mock_df_2023
+    mock_ons_client.download_year.return_value = mock_df_2023
 
     # Executa o serviço
     result = basin_service.ingest_data(start_date, end_date)
@@ -69,8 +80,19 @@ def test_ingest_data_success_and_skip(basin_service, mock_ons_client, mock_gcs_r
     assert result['details'][1]['rows_ingested'] == 1
     
     # Garante que o ONS client só foi chamado para o ano necessário
-    mock_ons_client.get_data_for_year.assert_called_once_with(2023)
-    mock_gcs_repository.save_dataframe.assert_called_once_with(mock_df_2023, 2023, today)
+    mock_ons_client.download_year.assert_called_once_with(2023)
+    mock_gcs_repository.save_dataframe.assert_called_once_with(mock_df_2023, 2023, today, source_signature=None,
+                                                              content_fingerprint=None)
+    # O índice histórico é listado uma única vez por execução
+    mock_gcs_repository.refresh_historical_index.assert_called_once_with()
+
+def test_ingest_data_current_year_does_not_list_historical(basin_service, mock_gcs_repository, mock_ons_client):
+    current_year = date.today().year
+    mock_gcs_repository.get_latest_ingestion_date.return_value = date.today()
+
+    basin_service.ingest_data(date(current_year, 1, 1), date(current_year, 1, 1))
+
+    mock_gcs_repository.refresh_historical_index.assert_not_called()
 
 def test_ingest_data_current_year_already_ingested_today(basin_service, mock_gcs_repository, mock_ons_client):
     """
@@ -87,7 +109,131 @@ def test_ingest_data_current_year_already_ingested_today(basin_service, mock_gcs
     
     assert result['summary']['total_rows_ingested'] == 0
     assert result['details'][0]['status'] == 'PULADO'
-    mock_ons_client.get_data_for_year.assert_not_called()
+    mock_ons_client.download_year.assert_not_called()
+
+def test_ingest_data_current_year_skips_unchanged_resource(basin_service, mock_gcs_repository, mock_ons_client):
+    """
+    Testa se o download do ano corrente é pulado quando a ONS informa que o recurso não mudou.
+    """
+    today = date.today()
+    signature = {"url": "http://example.com/current.csv", "last_modified": "2025-01-01T00:00:00", "size": "10", "hash": ""}
+
+    mock_gcs_repository.get_latest_ingestion_date.return_value = today - timedelta(days=1)
+    mock_gcs_repository.get_source_signature.return_value = signature
+    mock_ons_client.get_resource_for_year.return_value.signature = signature
+
+    result = basin_service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    assert result['details'][0]['status'] == 'PULADO'
+    mock_gcs_repository.get_source_signature.assert_called_once_with(today.year, today - timedelta(days=1))
+    mock_ons_client.download_year.assert_not_called()
+
+def test_ingest_data_current_year_downloads_changed_resource(basin_service, mock_gcs_repository, mock_ons_client):
+    """
+    Testa se o ano corrente é baixado e a nova assinatura é salva quando o recurso mudou.
+    """
+    today = date.today()
+    new_signature = {"url": "http://example.com/current.csv", "last_modified": "2025-02-01T00:00:00", "size": "12", "hash": ""}
+
+    mock_gcs_repository.get_latest_ingestion_date.return_value = today - timedelta(days=1)
+    mock_gcs_repository.get_source_signature.return_value = {**new_signature, "size": "10"}
+    mock_ons_client.get_resource_for_year.return_value.signature = new_signature
+    mock_df = pd.DataFrame({'ena_data': [today]})
+    mock_ons_client.download_year.return_value = mock_df
+
+    result = basin_service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    assert result['details'][0]['status'] == 'SUCESSO'
+    mock_gcs_repository.save_dataframe.assert_called_once_with(mock_df, today.year, today, source_signature=new_signature,
+                                                              content_fingerprint=None)
+
+def test_ingest_data_current_year_unchanged_content(basin_service, mock_gcs_repository, mock_ons_client):
+    """
+    Testa se nada é enviado ao GCS quando o conteúdo baixado é idêntico ao da última partição.
+    """
+    today = date.today()
+    latest = today - timedelta(days=1)
+    mock_gcs_repository.get_latest_ingestion_date.return_value = latest
+    mock_gcs_repository.get_source_signature.return_value = None
+    mock_gcs_repository.get_content_fingerprint.return_value = "abc"
+    mock_df = pd.DataFrame({'ena_data': [today]})
+    mock_df.attrs['content_fingerprint'] = "abc"
+    mock_ons_client.download_year.return_value = mock_df
+
+    result = basin_service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    assert result['details'][0]['status'] == 'INALTERADO'
+    assert result['summary']['total_rows_ingested'] == 0
+    mock_gcs_repository.get_content_fingerprint.assert_called_once_with(today.year, latest)
+    mock_gcs_repository.save_dataframe.assert_not_called()
+
+def test_ingest_data_current_year_changed_content_stores_fingerprint(basin_service, mock_gcs_repository, mock_ons_client):
+    today = date.today()
+    mock_gcs_repository.get_latest_ingestion_date.return_value = today - timedelta(days=1)
+    mock_gcs_repository.get_source_signature.return_value = None
+    mock_gcs_repository.get_content_fingerprint.return_value = "old"
+    mock_df = pd.DataFrame({'ena_data': [today]})
+    mock_df.attrs['content_fingerprint'] = "new"
+    mock_ons_client.download_year.return_value = mock_df
+
+    result = basin_service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    assert result['details'][0]['status'] == 'SUCESSO'
+    assert mock_gcs_repository.save_dataframe.call_args.kwargs['content_fingerprint'] == "new"
+
+def test_ingest_data_current_year_delta_mode(mock_gcs_repository, mock_bq_repository, mock_ons_client):
+    """
+    Testa a ingestão delta: apenas linhas novas ou alteradas do ano corrente são salvas.
+    """
+    from api.core.row_hashing import build_row_index
+
+    today = date.today()
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository,
+                           ons_client=mock_ons_client, delta_mode=True)
+    previous_df = pd.DataFrame({
+        'nom_bacia': ['GRANDE', 'GRANDE'],
+        'ena_data': [date(today.year, 1, 1), date(today.year, 1, 2)],
+        'ena_bruta_bacia_mwmed': [100.0, 110.0],
+    })
+    new_df = pd.DataFrame({
+        'nom_bacia': ['GRANDE', 'GRANDE', 'GRANDE'],
+        'ena_data': [date(today.year, 1, 1), date(today.year, 1, 2), date(today.year, 1, 3)],
+        'ena_bruta_bacia_mwmed': [100.0, 111.0, 120.0],
+    })
+    mock_gcs_repository.get_latest_ingestion_date.return_value = None
+    mock_gcs_repository.load_row_index.return_value = build_row_index(previous_df)
+    mock_ons_client.download_year.return_value = new_df
+
+    result = service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    detail = result['details'][0]
+    assert detail['status'] == 'SUCESSO'
+    assert (detail['rows_inserted'], detail['rows_updated'], detail['rows_unchanged']) == (1, 1, 1)
+    assert result['summary']['total_rows_ingested'] == 2
+    assert result['summary']['total_rows_updated'] == 1
+    saved_df = mock_gcs_repository.save_dataframe.call_args.args[0]
+    assert list(saved_df['ena_bruta_bacia_mwmed']) == [111.0, 120.0]
+    assert len(mock_gcs_repository.save_row_index.call_args.args[1]) == 3
+
+def test_ingest_data_current_year_delta_mode_no_changes(mock_gcs_repository, mock_bq_repository, mock_ons_client):
+    """
+    Testa se nada é gravado no GCS quando a ingestão delta não encontra mudanças.
+    """
+    from api.core.row_hashing import build_row_index
+
+    today = date.today()
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository,
+                           ons_client=mock_ons_client, delta_mode=True)
+    df = pd.DataFrame({'nom_bacia': ['GRANDE'], 'ena_data': [date(today.year, 1, 1)], 'ena_bruta_bacia_mwmed': [1.0]})
+    mock_gcs_repository.get_latest_ingestion_date.return_value = None
+    mock_gcs_repository.load_row_index.return_value = build_row_index(df)
+    mock_ons_client.download_year.return_value = df
+
+    result = service.ingest_data(date(today.year, 1, 1), date(today.year, 12, 31))
+
+    assert result['details'][0]['rows_unchanged'] == 1
+    assert result['summary']['total_rows_ingested'] == 0
+    mock_gcs_repository.save_dataframe.assert_not_called()
 
 def test_ingest_data_ons_client_fails(basin_service, mock_gcs_repository, mock_ons_client):
     """
@@ -98,7 +244,7 @@ def test_ingest_data_ons_client_fails(basin_service, mock_gcs_repository, mock_o
     
     # Cenário: ONS client levanta uma exceção
     mock_gcs_repository.historical_data_exists.return_value = False
-    mock_ons_client.get_data_for_year.side_effect = ONSClientError("Erro de rede")
+    mock_ons_client.download_year.side_effect = ONSClientError("Erro de rede")
     
     result = basin_service.ingest_data(start_date, end_date)
     
@@ -106,6 +252,36 @@ def test_ingest_data_ons_client_fails(basin_service, mock_gcs_repository, mock_o
     assert result['details'][0]['status'] == 'FALHA'
     assert "Erro de rede" in result['details'][0]['detail']
 
+def test_ingest_data_streaming_with_http_cache(mock_gcs_repository, mock_bq_repository, tmp_path):
+    """
+    Regressão: com streaming e cache HTTP, o cliente devolve o arquivo em cache (não um
+    DataFrame), que ainda precisa passar pela etapa de parse.
+    """
+    import json
+    import httpx
+    from api.core.http_cache import HTTPDiskCache
+    from api.core.ons_client import ONS_API_URL, ONSClient
+    from api.core.ons_metadata import ONSMetadataCache
+
+    metadata = {"result": {"resources": [{"name": "Dados de 2022", "format": "CSV", "url": "http://example.com/2022.csv"}]}}
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(metadata).encode())
+        return httpx.Response(200, content=b"ena_data;nom_bacia;ena_bruta_bacia_mwmed\n2022-01-01;SUL;1,5")
+
+    ons_client = ONSClient(metadata_cache=ONSMetadataCache(), streaming=True, http_cache=HTTPDiskCache(str(tmp_path)),
+                           http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    mock_gcs_repository.historical_data_exists.return_value = False
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60))
+
+    result = service.ingest_data(date(2022, 1, 1), date(2022, 12, 31))
+
+    assert result['details'][0]['status'] == 'SUCESSO'
+    saved_df = mock_gcs_repository.save_dataframe.call_args.args[0]
+    assert list(saved_df['nom_bacia']) == ['SUL']
+
 def test_get_historical_volume_success(basin_service, mock_bq_repository):
     """
     Testa o caso de sucesso para obter dados históricos.
@@ -131,7 +307,7 @@ def test_get_historical_volume_no_data_found(basin_service, mock_bq_repository):
     end_date = date(2023, 1, 10)
     
     # Configura o mock para não retornar nada
-    mock_bq_repository.find_by_date_range.return_value = (pd.DataFrame(), 0)
+    mock_bq_repository.find_by_date_range.return_value = (pa.table({}), 0)
     
     result = basin_service.get_historical_volume(start_date, end_date, 1, 10)
     
@@ -143,13 +319,13 @@ def test_get_historical_volume_with_validation_error(basin_service, mock_bq_repo
     """
     Testa se o serviço pula dados inválidos e continua processando os válidos.
     """
-    # DataFrame com uma linha válida e uma inválida (nom_bacia está faltando)
-    invalid_df = pd.DataFrame({
+    # Tabela com uma linha válida e uma inválida (nom_bacia está faltando)
+    invalid_table = pa.table({
         'ena_data': [date(2023, 1, 1), date(2023, 1, 2)],
         'nom_bacia': ['SUDESTE', None],  # Linha 2 é inválida
         'ena_bruta_bacia_mwmed': [100.5, 200.0]
     })
-    mock_bq_repository.find_by_date_range.return_value = (invalid_df, 2)
+    mock_bq_repository.find_by_date_range.return_value = (invalid_table, 2)
 
     start_date = date(2023, 1, 1)
     end_date = date(2023, 1, 10)
@@ -161,3 +337,310 @@ def test_get_historical_volume_with_validation_error(basin_service, mock_bq_repo
     assert result['items_on_page'] == 1 # Mas apenas 1 foi validado
     assert len(result['items']) == 1
     assert result['items'][0].nom_bacia == 'SUDESTE'
+
+
+def test_get_historical_volume_returns_next_cursor(basin_service, mock_bq_repository):
+    """
+    Testa se a paginação por página devolve um cursor apontando para a última linha.
+    """
+    start_date, end_date = date(2023, 1, 1), date(2023, 1, 10)
+    mock_bq_repository.find_by_date_range.return_value = (mock_bq_table, 5)
+
+    result = basin_service.get_historical_volume(start_date, end_date, 1, 2)
+
+    assert decode_cursor(result['next_cursor'], start_date, end_date) == PageKey(date(2023, 1, 2), 'SUL')
+
+def test_get_historical_volume_last_page_has_no_cursor(basin_service):
+    result = basin_service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+
+    assert result['next_cursor'] is None
+
+def test_get_historical_volume_with_cursor(basin_service, mock_bq_repository):
+    """
+    Testa o modo cursor: continua após a chave do cursor e reutiliza a contagem em cache.
+    """
+    start_date, end_date = date(2023, 1, 1), date(2023, 1, 10)
+    cursor = encode_cursor(PageKey(date(2022, 12, 31), 'NORTE'), start_date, end_date)
+    mock_bq_repository.find_page_after_with_count.return_value = (mock_bq_table, True, 7)
+    mock_bq_repository.find_page_after.return_value = (mock_bq_table, True)
+
+    first = basin_service.get_historical_volume(start_date, end_date, 1, 2, cursor=cursor)
+    second = basin_service.get_historical_volume(start_date, end_date, 1, 2, cursor=cursor)
+
+    # A primeira página busca página e contagem juntas; a segunda reutiliza a contagem em cache
+    mock_bq_repository.find_page_after_with_count.assert_called_once_with(
+        start_date, end_date, 2, PageKey(date(2022, 12, 31), 'NORTE'))
+    mock_bq_repository.find_page_after.assert_called_once_with(start_date, end_date, 2, PageKey(date(2022, 12, 31), 'NORTE'))
+    assert first['total_items'] == 7
+    assert first['total_pages'] == 4
+    assert first['current_page'] is None
+    assert first['items_on_page'] == 2
+    assert decode_cursor(first['next_cursor'], start_date, end_date) == PageKey(date(2023, 1, 2), 'SUL')
+    assert second['total_items'] == 7
+    mock_bq_repository.count_by_date_range.assert_not_called()
+    mock_bq_repository.find_by_date_range.assert_not_called()
+
+def test_get_historical_volume_with_cursor_without_total(basin_service, mock_bq_repository):
+    start_date, end_date = date(2023, 1, 1), date(2023, 1, 10)
+    cursor = encode_cursor(PageKey(date(2023, 1, 1), 'A'), start_date, end_date)
+    mock_bq_repository.find_page_after.return_value = (mock_bq_table, False)
+
+    result = basin_service.get_historical_volume(start_date, end_date, 1, 2, cursor=cursor, include_total=False)
+
+    assert result['total_items'] is None
+    assert result['next_cursor'] is None
+    mock_bq_repository.find_page_after_with_count.assert_not_called()
+
+def test_get_historical_volume_invalid_cursor(basin_service):
+    with pytest.raises(InvalidCursorError):
+        basin_service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 2, cursor="lixo")
+
+def test_ingest_success_clears_count_cache(basin_service, mock_gcs_repository, mock_ons_client):
+    basin_service.count_cache[(date(2023, 1, 1), date(2023, 1, 10))] = 5
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_ons_client.download_year.return_value = pd.DataFrame({'ena_data': [date(2023, 1, 1)]})
+
+    basin_service.ingest_data(date(2023, 1, 1), date(2023, 1, 1))
+
+    assert len(basin_service.count_cache) == 0
+
+def test_get_historical_volume_served_from_result_cache(mock_gcs_repository, mock_bq_repository, mock_ons_client):
+    """
+    Testa se respostas repetidas vêm do cache sem novas consultas ao repositório.
+    """
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60), result_cache=QueryResultCache(1024 ** 2, 60))
+
+    first = service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+    second = service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+    service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 2, 10)
+
+    assert second is first
+    assert mock_bq_repository.find_by_date_range.call_count == 2
+    assert service.result_cache.stats()["hits"] == 1
+
+def test_ingest_invalidates_cached_results_of_changed_years(mock_gcs_repository, mock_bq_repository, mock_ons_client):
+    cache = QueryResultCache(1024 ** 2, 60)
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60), result_cache=cache)
+    service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+    service.get_historical_volume(date(2021, 1, 1), date(2021, 1, 10), 1, 10)
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_ons_client.download_year.return_value = pd.DataFrame({'ena_data': [date(2023, 1, 1)]})
+
+    service.ingest_data(date(2023, 1, 1), date(2023, 1, 1))
+
+    # Apenas a faixa que inclui 2023 é descartada
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 1
+
+def _aggregate_rows(period_start):
+    return pa.table({'nom_bacia': ['SUL'], 'period_start': pa.array([period_start], pa.date32()), 'count': [7],
+                     'min': [1.0], 'max': [3.0], 'mean': [2.0], 'sum': [14.0]})
+
+def test_ingest_invalidates_the_embedded_table(mock_gcs_repository, mock_ons_client):
+    """
+    Testa se, com o backend embarcado, a tabela em memória é revalidada após a ingestão.
+    """
+    from api.repositories.embedded_repository import EmbeddedArrowRepository
+
+    embedded = MagicMock(spec=EmbeddedArrowRepository)
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=embedded, ons_client=mock_ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60))
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_ons_client.download_year.return_value = pd.DataFrame({'ena_data': [date(2023, 1, 1)]})
+
+    service.ingest_data(date(2023, 1, 1), date(2023, 1, 1))
+
+    embedded.invalidate.assert_called_once_with()
+
+def test_get_aggregates_without_gcs_aggregates_the_rows(mock_bq_repository):
+    service = BasinService(gcs_repo=None, bq_repo=mock_bq_repository)
+    mock_bq_repository.aggregate_by_period.return_value = _aggregate_rows(date(2024, 1, 1))
+
+    result = service.get_aggregates(date(2024, 1, 15), date(2024, 2, 10), 'month', 'ena_bruta_bacia_mwmed')
+
+    assert result['source'] == 'query'
+
+def test_get_aggregates_reads_summaries(basin_service, mock_gcs_repository, mock_bq_repository):
+    """
+    Testa se, com resumos de todos os anos, a agregação não consulta as linhas diárias.
+    """
+    days = pd.DataFrame({'nom_bacia': ['SUL', 'SUL'], 'ena_data': [date(2024, 12, 30), date(2025, 1, 1)],
+                         'ena_bruta_bacia_mwmed': [1.0, 3.0], 'ena_bruta_bacia_percentualmlt': [1.0, 1.0],
+                         'ena_armazenavel_bacia_mwmed': [1.0, 1.0], 'ena_armazenavel_bacia_percentualmlt': [1.0, 1.0]})
+    summaries = {year: summarize(to_basin_table(days[pd.to_datetime(days['ena_data']).dt.year == year]), 'week')
+                 for year in (2024, 2025)}
+    mock_gcs_repository.load_summary.side_effect = lambda year, granularity: summaries[year]
+
+    result = basin_service.get_aggregates(date(2025, 1, 1), date(2025, 1, 3), 'week', 'ena_bruta_bacia_mwmed')
+
+    # A semana começa em 2024-12-30: os resumos dos dois anos são combinados
+    assert (result['start_date'], result['end_date']) == (date(2024, 12, 30), date(2025, 1, 5))
+    assert result['source'] == 'summary'
+    assert [(i.period_start, i.count, i.mean) for i in result['items']] == [(date(2024, 12, 30), 2, 2.0)]
+    mock_bq_repository.aggregate_by_period.assert_not_called()
+
+def test_get_aggregates_falls_back_to_repository(basin_service, mock_gcs_repository, mock_bq_repository):
+    mock_gcs_repository.load_summary.return_value = None
+    mock_bq_repository.aggregate_by_period.return_value = _aggregate_rows(date(2024, 1, 1))
+
+    result = basin_service.get_aggregates(date(2024, 1, 15), date(2024, 2, 10), 'month', 'ena_bruta_bacia_mwmed')
+
+    mock_bq_repository.aggregate_by_period.assert_called_once_with(
+        date(2024, 1, 1), date(2024, 2, 29), 'month', 'ena_bruta_bacia_mwmed')
+    assert result['source'] == 'query'
+    assert result['items'][0].sum == 14.0
+
+def test_get_aggregates_reuses_the_summary_executor(mock_gcs_repository, mock_bq_repository, mock_ons_client):
+    """
+    Testa se as leituras dos resumos usam o pool recebido, sem criar um pool por requisição.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    mock_gcs_repository.load_summary.return_value = None
+    mock_bq_repository.aggregate_by_period.return_value = _aggregate_rows(date(2024, 1, 1))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client,
+                               summary_executor=executor)
+        with patch("api.services.basin_service.ThreadPoolExecutor") as mock_pool:
+            service.get_aggregates(date(2023, 12, 15), date(2024, 2, 10), 'month', 'ena_bruta_bacia_mwmed')
+            service.get_aggregates(date(2024, 1, 15), date(2024, 2, 10), 'month', 'ena_bruta_bacia_mwmed')
+
+    mock_pool.assert_not_called()
+    assert sorted(c.args[0] for c in mock_gcs_repository.load_summary.call_args_list) == [2023, 2024, 2024]
+
+def test_get_aggregates_rejects_unknown_metric(basin_service):
+    with pytest.raises(ValueError):
+        basin_service.get_aggregates(date(2024, 1, 1), date(2024, 1, 31), 'month', 'nom_bacia')
+
+def test_ingest_refreshes_summaries(basin_service, mock_gcs_repository, mock_ons_client):
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_ons_client.download_year.return_value = pd.DataFrame({
+        'nom_bacia': ['SUL'], 'ena_data': [date(2022, 1, 1)], 'ena_bruta_bacia_mwmed': [1.0],
+        'ena_bruta_bacia_percentualmlt': [1.0], 'ena_armazenavel_bacia_mwmed': [1.0],
+        'ena_armazenavel_bacia_percentualmlt': [1.0]})
+
+    basin_service.ingest_data(date(2022, 1, 1), date(2022, 1, 1))
+
+    saved = {call.args[1]: call.args[2] for call in mock_gcs_repository.save_summary.call_args_list}
+    assert sorted(saved) == ['month', 'week', 'year']
+    assert saved['year'].column('ena_bruta_bacia_mwmed_sum').to_pylist() == [1.0]
+
+def test_ingest_streams_historical_years_to_gcs(mock_gcs_repository, mock_bq_repository):
+    """
+    No modo streaming, um ano histórico vai do download ao GCS lote a lote, sem
+    montar o DataFrame do ano, e os resumos são calculados pelos mesmos lotes.
+    """
+    import json
+    import httpx
+    from api.core.ons_client import ONS_API_URL, ONSClient
+    from api.core.ons_metadata import ONSMetadataCache
+
+    metadata = {"result": {"resources": [{"name": "Dados de 2022", "format": "CSV", "url": "http://example.com/2022.csv"}]}}
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(metadata).encode())
+        return httpx.Response(200, content=b"nom_bacia;ena_data;ena_bruta_bacia_mwmed\nSUL;2022-01-01;1,5\nSUL;2022-01-02;2,5\n")
+
+    ons_client = ONSClient(metadata_cache=ONSMetadataCache(), streaming=True, chunk_size=64,
+                           http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_gcs_repository.save_historical_batches.side_effect = lambda year, batches: sum(b.num_rows for b in batches)
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60))
+
+    result = service.ingest_data(date(2022, 1, 1), date(2022, 12, 31))
+
+    assert result['details'][0]['status'] == 'SUCESSO'
+    assert result['details'][0]['rows_ingested'] == 2
+    mock_gcs_repository.save_dataframe.assert_not_called()
+    saved = {call.args[1]: call.args[2] for call in mock_gcs_repository.save_summary.call_args_list}
+    assert saved['year'].column('ena_bruta_bacia_mwmed_sum').to_pylist() == [4.0]
+
+def test_ingest_downloads_through_async_client_on_pipeline_loop(mock_gcs_repository, mock_bq_repository,
+                                                                mock_ons_client):
+    """
+    Com o cliente assíncrono, o download roda no loop do pipeline e o CSV bruto
+    ainda passa pela etapa de parse.
+    """
+    from api.core.ingest_pipeline import IngestPipeline
+    from api.core.ons_client import DownloadedFile
+
+    class FakeAsyncClient:
+        def __init__(self):
+            self.years = []
+
+        async def download_year(self, year):
+            self.years.append(year)
+            return DownloadedFile(year, content=b"ena_data;nom_bacia;ena_bruta_bacia_mwmed\n2022-01-01;SUL;1,5")
+
+    async_client = FakeAsyncClient()
+    pipeline = IngestPipeline(download_workers=2, parse_workers=1, upload_workers=1)
+    mock_gcs_repository.historical_data_exists.side_effect = lambda year: year == 2021
+    service = BasinService(gcs_repo=mock_gcs_repository, bq_repo=mock_bq_repository, ons_client=mock_ons_client,
+                           count_cache=TTLCache(maxsize=16, ttl=60), pipeline=pipeline, async_ons_client=async_client)
+
+    try:
+        result = service.ingest_data(date(2021, 1, 1), date(2022, 12, 31))
+    finally:
+        pipeline.shutdown()
+
+    assert [detail['status'] for detail in result['details']] == ['PULADO', 'SUCESSO']
+    assert async_client.years == [2022]
+    mock_ons_client.download_year.assert_not_called()
+    saved = mock_gcs_repository.save_dataframe.call_args.args[0]
+    assert saved['ena_bruta_bacia_mwmed'].tolist() == [1.5]
+
+def test_ingest_succeeds_when_summary_refresh_fails(basin_service, mock_gcs_repository, mock_ons_client):
+    mock_gcs_repository.historical_data_exists.return_value = False
+    mock_gcs_repository.save_summary.side_effect = Exception("GCS indisponível")
+    mock_ons_client.download_year.return_value = pd.DataFrame({'ena_data': [date(2022, 1, 1)]})
+
+    result = basin_service.ingest_data(date(2022, 1, 1), date(2022, 1, 1))
+
+    assert result['details'][0]['status'] == 'SUCESSO'
+
+def test_get_historical_volume_cleans_decimal_commas(basin_service, mock_bq_repository):
+    """
+    Testa se medidas em texto com vírgula decimal são convertidas ao montar a página.
+    """
+    mock_bq_repository.find_by_date_range.return_value = (pa.table({
+        'nom_bacia': ['SUL', 'SUL'],
+        'ena_data': [date(2023, 1, 1), date(2023, 1, 2)],
+        'ena_bruta_bacia_mwmed': ['1,5', None],
+        'ena_armazenavel_bacia_mwmed': [float('nan'), 2.0],
+    }), 2)
+
+    result = basin_service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+
+    assert [item.ena_bruta_bacia_mwmed for item in result['items']] == [1.5, None]
+    assert [item.ena_armazenavel_bacia_mwmed for item in result['items']] == [None, 2.0]
+
+def test_get_historical_volume_falls_back_to_row_validation(basin_service, mock_bq_repository):
+    """
+    Testa se uma data que o Arrow não converte faz a página ser validada linha a linha.
+    """
+    mock_bq_repository.find_by_date_range.return_value = (pa.table({
+        'nom_bacia': ['SUL', 'SUL'],
+        'ena_data': ['2023-01-01', 'data inválida'],
+        'ena_bruta_bacia_mwmed': [1.0, 2.0],
+    }), 2)
+
+    result = basin_service.get_historical_volume(date(2023, 1, 1), date(2023, 1, 10), 1, 10)
+
+    assert result['items_on_page'] == 1
+    assert result['items'][0].ena_data == date(2023, 1, 1)
+
+def test_ingest_data_reports_progress_per_year(basin_service, mock_gcs_repository):
+    """
+    Testa se o callback de progresso recebe o início e o resultado de cada ano.
+    """
+    mock_gcs_repository.historical_data_exists.return_value = True
+    events = []
+
+    basin_service.ingest_data(date(2021, 1, 1), date(2022, 12, 31),
+                              progress=lambda year, detail: events.append((year, detail['status'])))
+
+    assert sorted(events) == [(2021, 'EM_ANDAMENTO'), (2021, 'PULADO'), (2022, 'EM_ANDAMENTO'), (2022, 'PULADO')]
@@ -4,7 +4,10 @@ import pytest
 from unittest.mock import MagicMock, patch, call
 from datetime import date
 import pandas as pd
+import pyarrow as pa
+from prometheus_client import REGISTRY
 
+from api.core.pagination import PageKey
 from api.repositories.bigquery_repository import BigQueryRepository
 
 @pytest.fixture
@@ -20,52 +23,159 @@ def bq_repository(mock_bigquery_client):
 
 def test_find_by_date_range_success(bq_repository, mock_bigquery_client):
     """
-    Testa o caso de sucesso onde dados são encontrados.
+    Testa o caso de sucesso: página e total vêm de um único job (contagem por janela).
     """
     mock_client_instance = mock_bigquery_client.return_value
-    
-    # Mock para a query de contagem
-    mock_count_df = pd.DataFrame({'total': [10]})
-    
-    # Mock para a query de dados
-    mock_data_df = pd.DataFrame({'col1': ['data']})
-    
-    # Configura o mock para retornar os DFs na ordem correta das chamadas
-    mock_client_instance.query.side_effect = [
-        MagicMock(to_dataframe=MagicMock(return_value=mock_count_df)),
-        MagicMock(to_dataframe=MagicMock(return_value=mock_data_df))
-    ]
-    
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table(
+        {'nom_bacia': ['SUL'], '_total_count': [10]})
+
     start = date(2023, 1, 1)
     end = date(2023, 1, 31)
-    
+
     df, total = bq_repository.find_by_date_range(start, end, page=2, size=5)
 
     assert total == 10
-    assert not df.empty
-    assert mock_client_instance.query.call_count == 2
-    
-    # Verifica se a query de dados foi chamada com o OFFSET correto (page 2, size 5 -> offset 5)
-    second_call_args = mock_client_instance.query.call_args_list[1]
-    assert "LIMIT @size OFFSET @offset" in second_call_args.args[0]
-    # Extrai o valor do offset do objeto de configuração do job
-    job_config = second_call_args.kwargs['job_config']
+    assert df.column_names == ['nom_bacia']
+    mock_client_instance.query.assert_called_once()
+    # Página pequena: download via REST, sem sessão da Storage Read API
+    mock_client_instance.query.return_value.to_arrow.assert_called_once_with(create_bqstorage_client=False)
+
+    query = mock_client_instance.query.call_args.args[0]
+    assert "SELECT *" not in query
+    assert "nom_bacia, ena_data, ena_bruta_bacia_mwmed" in query
+    assert "COUNT(*) OVER() AS _total_count" in query
+    # Verifica se a query foi chamada com o OFFSET correto (page 2, size 5 -> offset 5)
+    assert "LIMIT @size OFFSET @offset" in query
+    job_config = mock_client_instance.query.call_args.kwargs['job_config']
     offset_param = next(p for p in job_config.query_parameters if p.name == "offset")
     assert offset_param.value == 5
 
 
 def test_find_by_date_range_no_items_found(bq_repository, mock_bigquery_client):
     """
-    Testa o cenário onde a query de contagem retorna 0.
+    Testa o cenário sem linhas no intervalo: na primeira página não há job de contagem.
     """
     mock_client_instance = mock_bigquery_client.return_value
-    mock_count_df = pd.DataFrame({'total': [0]})
-    
-    mock_client_instance.query.return_value.to_dataframe.return_value = mock_count_df
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table({'nom_bacia': pa.array([], pa.string()),
+                                                                              '_total_count': pa.array([], pa.int64())})
 
     df, total = bq_repository.find_by_date_range(date(2023, 1, 1), date(2023, 1, 31), 1, 10)
 
     assert total == 0
-    assert df.empty
-    # Apenas a query de contagem deve ser chamada
-    mock_client_instance.query.assert_called_once()
\ No newline at end of file
+    assert df.num_rows == 0
+    mock_client_instance.query.assert_called_once()
+
+
+def test_find_by_date_range_page_past_the_end(bq_repository, mock_bigquery_client):
+    """
+    Testa uma página além do fim: sem linhas não há total da janela, então a contagem é consultada.
+    """
+    mock_client_instance = mock_bigquery_client.return_value
+    empty_page = pa.table({'nom_bacia': pa.array([], pa.string()), '_total_count': pa.array([], pa.int64())})
+    mock_client_instance.query.side_effect = [
+        MagicMock(to_arrow=MagicMock(return_value=empty_page)),
+        MagicMock(to_dataframe=MagicMock(return_value=pd.DataFrame({'total': [7]}))),
+    ]
+
+    df, total = bq_repository.find_by_date_range(date(2023, 1, 1), date(2023, 1, 31), 5, 10)
+
+    assert total == 7
+    assert df.num_rows == 0
+    assert "COUNT(*) as total" in mock_client_instance.query.call_args_list[1].args[0]
+
+def test_find_page_after_uses_keyset_condition(bq_repository, mock_bigquery_client):
+    """
+    Testa a paginação por cursor: sem OFFSET, continuando após a última chave.
+    """
+    mock_client_instance = mock_bigquery_client.return_value
+    # Uma linha a mais que o tamanho da página indica que há próxima página
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table({'col1': [1, 2, 3]})
+
+    df, has_more = bq_repository.find_page_after(date(2023, 1, 1), date(2023, 1, 31), 2,
+                                                 after=PageKey(date(2023, 1, 5), 'SUL'))
+
+    assert df.num_rows == 2
+    assert has_more is True
+    query, job_config = mock_client_instance.query.call_args.args[0], mock_client_instance.query.call_args.kwargs['job_config']
+    assert "OFFSET" not in query
+    assert "nom_bacia > @after_basin" in query
+    params = {p.name: p.value for p in job_config.query_parameters}
+    assert params['limit'] == 3
+    assert (params['after_date'], params['after_basin']) == (date(2023, 1, 5), 'SUL')
+
+
+def test_find_page_after_first_page(bq_repository, mock_bigquery_client):
+    mock_client_instance = mock_bigquery_client.return_value
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table({'col1': [1]})
+
+    df, has_more = bq_repository.find_page_after(date(2023, 1, 1), date(2023, 1, 31), 2)
+
+    assert has_more is False
+    assert "@after_date" not in mock_client_instance.query.call_args.args[0]
+
+
+def test_find_page_after_with_count_submits_both_jobs_first(bq_repository, mock_bigquery_client):
+    """
+    Testa se os jobs de página e de contagem são submetidos antes de aguardar qualquer resultado.
+    """
+    events = []
+    page_job = MagicMock()
+    page_job.to_arrow.side_effect = lambda **kwargs: events.append('wait_page') or pa.table({'col1': [1, 2]})
+    count_job = MagicMock()
+    count_job.to_dataframe.side_effect = lambda: events.append('wait_count') or pd.DataFrame({'total': [9]})
+    mock_client_instance = mock_bigquery_client.return_value
+    mock_client_instance.query.side_effect = lambda *a, **k: events.append('submit') or [page_job, count_job][events.count('submit') - 1]
+
+    df, has_more, total = bq_repository.find_page_after_with_count(date(2023, 1, 1), date(2023, 1, 31), 2)
+
+    assert events == ['submit', 'submit', 'wait_page', 'wait_count']
+    assert df.num_rows == 2
+    assert has_more is False
+    assert total == 9
+
+
+def test_large_page_uses_storage_read_api(mock_bigquery_client):
+    """
+    Testa se páginas grandes são baixadas pela Storage Read API.
+    """
+    repo = BigQueryRepository(project_id="proj", dataset_id="data", table_id="tab", storage_api_min_rows=500)
+    mock_client_instance = mock_bigquery_client.return_value
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table({'col1': [1]})
+
+    repo.find_page_after(date(2023, 1, 1), date(2023, 1, 31), 1000)
+
+    mock_client_instance.query.return_value.to_arrow.assert_called_once_with(create_bqstorage_client=True)
+
+
+def test_aggregate_by_period_pushes_grouping_to_bigquery(bq_repository, mock_bigquery_client):
+    mock_client_instance = mock_bigquery_client.return_value
+    mock_client_instance.query.return_value.to_arrow.return_value = pa.table({'nom_bacia': ['SUL']})
+
+    result = bq_repository.aggregate_by_period(date(2023, 1, 1), date(2023, 12, 31), "week", "ena_armazenavel_bacia_mwmed")
+
+    assert result.num_rows == 1
+    query = mock_client_instance.query.call_args.args[0]
+    assert "DATE_TRUNC(ena_data, WEEK(MONDAY)) AS period_start" in query
+    assert "AVG(ena_armazenavel_bacia_mwmed) AS `mean`" in query
+    assert "GROUP BY nom_bacia, period_start" in query
+
+
+def test_aggregate_by_period_rejects_unknown_metric(bq_repository, mock_bigquery_client):
+    with pytest.raises(ValueError):
+        bq_repository.aggregate_by_period(date(2023, 1, 1), date(2023, 12, 31), "month", "1; DROP TABLE x")
+
+    mock_bigquery_client.return_value.query.assert_not_called()
+
+
+def test_job_latency_and_rows_are_recorded(bq_repository, mock_bigquery_client):
+    """Cada job registra a latência até o resultado baixado e as linhas retornadas."""
+    mock_bigquery_client.return_value.query.return_value.to_arrow.return_value = pa.table(
+        {'nom_bacia': ['SUL', 'NORTE', 'SUDESTE']})
+    labels = {"query": "page_after"}
+    jobs = REGISTRY.get_sample_value("basin_bigquery_job_seconds_count", labels) or 0.0
+    rows = REGISTRY.get_sample_value("basin_bigquery_rows_returned_sum", labels) or 0.0
+
+    bq_repository.find_page_after(date(2023, 1, 1), date(2023, 1, 31), size=2)
+
+    assert REGISTRY.get_sample_value("basin_bigquery_job_seconds_count", labels) == jobs + 1
+    assert REGISTRY.get_sample_value("basin_bigquery_rows_returned_sum", labels) == rows + 3
@@ -0,0 +1,136 @@
+from datetime import date
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from api.models.arrow_schema import ONS_BASIN_SCHEMA, to_basin_table
+from api.repositories.gcs_repository import HistoricalFile, PartitionFile
+from api.services.compaction_service import CompactionService
+
+CURRENT_YEAR = date.today().year
+
+
+def _table(rows, load_date=None):
+    df = pd.DataFrame(rows, columns=['nom_bacia', 'ena_data', 'ena_bruta_bacia_mwmed'])
+    if load_date:
+        df['data_carga_bronze'] = load_date
+    return to_basin_table(df)
+
+
+def _partition(year, day, size=100):
+    partition = date(year, 1, day)
+    return PartitionFile(year, partition, f"basin_data/current/year={year}/dt={partition}/basin_data_{year}.parquet", size)
+
+
+@pytest.fixture
+def mock_gcs_repository():
+    repo = MagicMock()
+    repo.write_compacted.return_value = 120
+    repo.get_source_signature.return_value = {"size": "10"}
+    repo.list_historical_years.return_value = {}
+    repo.read_file_schema.return_value = ONS_BASIN_SCHEMA
+    return repo
+
+
+def test_compact_current_year_merges_and_applies_retention(mock_gcs_repository):
+    files = [_partition(CURRENT_YEAR, 1), _partition(CURRENT_YEAR, 5), _partition(CURRENT_YEAR, 9)]
+    mock_gcs_repository.list_current_partitions.return_value = {CURRENT_YEAR: files}
+    tables = {
+        files[0].blob_name: _table([('SUL', date(CURRENT_YEAR, 1, 1), 1.0)], "d1"),
+        files[1].blob_name: _table([('SUL', date(CURRENT_YEAR, 1, 1), 2.0), ('GRANDE', date(CURRENT_YEAR, 1, 1), 3.0)], "d5"),
+        files[2].blob_name: _table([('SUL', date(CURRENT_YEAR, 1, 1), 9.0)], "d9"),
+    }
+    mock_gcs_repository.read_basin_table.side_effect = tables.__getitem__
+    mock_gcs_repository.get_content_fingerprint.return_value = "abc"
+    service = CompactionService(mock_gcs_repository, retention_days=5)
+
+    result = service.compact(today=date(CURRENT_YEAR, 1, 10))
+
+    year, merged, partition, signature, fingerprint = mock_gcs_repository.write_compacted.call_args.args
+    assert (year, partition, signature) == (CURRENT_YEAR, date(CURRENT_YEAR, 1, 9), {"size": "10"})
+    # A impressão digital do conteúdo de origem é preservada
+    assert fingerprint == "abc"
+    # A cópia mais recente de cada linha prevalece
+    assert dict(zip(merged['nom_bacia'].to_pylist(), merged['ena_bruta_bacia_mwmed'].to_pylist())) == {'GRANDE': 3.0, 'SUL': 9.0}
+    # Apenas a partição fora da janela de retenção (dt=01) é removida
+    mock_gcs_repository.delete_blobs.assert_called_once_with([files[0].blob_name])
+    assert result['summary']['bytes_before'] == 300
+    assert result['summary']['bytes_after'] == 120 + 100
+    assert result['summary']['bytes_reclaimed'] == 80
+    assert result['details'][0]['partitions_deleted'] == 1
+
+
+def test_compact_single_partition_is_skipped(mock_gcs_repository):
+    mock_gcs_repository.list_current_partitions.return_value = {CURRENT_YEAR: [_partition(CURRENT_YEAR, 1)]}
+
+    result = CompactionService(mock_gcs_repository).compact()
+
+    assert result['details'][0]['status'] == 'PULADO'
+    assert result['summary']['bytes_reclaimed'] == 0
+    mock_gcs_repository.write_compacted.assert_not_called()
+
+
+def test_compact_moves_past_year_to_historical(mock_gcs_repository):
+    past_year = CURRENT_YEAR - 1
+    files = [_partition(past_year, 1), _partition(past_year, 2)]
+    mock_gcs_repository.list_current_partitions.return_value = {past_year: files}
+    mock_gcs_repository.list_historical_years.return_value = {past_year: HistoricalFile(1, 50)}
+    mock_gcs_repository.read_historical_table.return_value = _table(
+        [('SUL', date(past_year, 1, 1), 0.5), ('NORTE', date(past_year, 1, 1), 7.0)])
+    tables = {
+        files[0].blob_name: _table([('SUL', date(past_year, 1, 1), 1.0)], "d1"),
+        files[1].blob_name: _table([('SUL', date(past_year, 1, 1), 2.0)], "d2"),
+    }
+    mock_gcs_repository.read_basin_table.side_effect = tables.__getitem__
+
+    result = CompactionService(mock_gcs_repository).compact()
+
+    year, merged, partition, _ = mock_gcs_repository.write_compacted.call_args.args
+    assert (year, partition) == (past_year, None)
+    assert 'data_carga_bronze' not in merged.column_names
+    assert dict(zip(merged['nom_bacia'].to_pylist(), merged['ena_bruta_bacia_mwmed'].to_pylist())) == {'NORTE': 7.0, 'SUL': 2.0}
+    mock_gcs_repository.delete_blobs.assert_called_once_with([f.blob_name for f in files])
+    assert result['summary']['bytes_before'] == 250
+    assert result['summary']['partitions_deleted'] == 2
+
+
+def test_compact_rewrites_legacy_text_files(mock_gcs_repository):
+    """
+    Testa a migração dos arquivos gravados antes do esquema tipado (datas e medidas em texto).
+    """
+    legacy = pa.schema([('nom_bacia', pa.string()), ('ena_data', pa.string()), ('ena_bruta_bacia_mwmed', pa.string())])
+    partition = _partition(CURRENT_YEAR, 1)
+    mock_gcs_repository.list_current_partitions.return_value = {CURRENT_YEAR: [partition]}
+    mock_gcs_repository.list_historical_years.return_value = {2020: HistoricalFile(1, 50), 2021: HistoricalFile(1, 60)}
+    # Apenas o arquivo de 2020 e a partição do ano corrente ainda estão em texto
+    mock_gcs_repository.read_file_schema.side_effect = lambda year, partition=None: (
+        ONS_BASIN_SCHEMA if year == 2021 else legacy)
+    mock_gcs_repository.read_historical_table.return_value = _table([('SUL', date(2020, 1, 1), 1.0)])
+    mock_gcs_repository.read_basin_table.return_value = _table([('SUL', date(CURRENT_YEAR, 1, 1), 2.0)], "d1")
+    mock_gcs_repository.get_content_fingerprint.return_value = "abc"
+
+    result = CompactionService(mock_gcs_repository).compact()
+
+    written = [(c.args[0], c.args[2], c.args[4]) for c in mock_gcs_repository.write_compacted.call_args_list]
+    assert written == [(2020, None, None), (CURRENT_YEAR, partition.partition, "abc")]
+    assert [d['status'] for d in result['details']] == ['MIGRADO', 'MIGRADO', 'PULADO']
+    assert result['summary']['bytes_reclaimed'] == (50 + 100) - 2 * 120
+
+
+def test_compact_reports_failures_per_year(mock_gcs_repository):
+    mock_gcs_repository.list_current_partitions.return_value = {
+        CURRENT_YEAR: [_partition(CURRENT_YEAR, 1), _partition(CURRENT_YEAR, 2)]
+    }
+    mock_gcs_repository.read_basin_table.side_effect = RuntimeError("boom")
+
+    result = CompactionService(mock_gcs_repository).compact()
+
+    assert result['details'][0]['status'] == 'FALHA'
+    mock_gcs_repository.delete_blobs.assert_not_called()
+
+
+def test_compaction_service_rejects_negative_retention(mock_gcs_repository):
+    with pytest.raises(ValueError):
+        CompactionService(mock_gcs_repository, retention_days=-1)
@@ -0,0 +1,150 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pyarrow.fs as pafs
+import pytest
+
+from api.core.pagination import PageKey
+from api.repositories.embedded_repository import EmbeddedArrowRepository
+from api.repositories.gcs_parquet_repository import GCSParquetRepository
+from tests.unit.test_gcs_parquet_repository import CURRENT_YEAR, _current_path, _write
+
+BASINS = ['AMAZONAS', 'GRANDE', 'PARANA', 'SAO FRANCISCO', 'SUL']
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    """Dois anos históricos completos e duas partições (com sobreposição) do ano corrente."""
+    historical = tmp_path / "basin_data" / "historical"
+    for year in (CURRENT_YEAR - 2, CURRENT_YEAR - 1):
+        days = [date(year, 1, 1) + timedelta(days=i) for i in range(0, 365, 14)]
+        _write(historical / f"basin_data_{year}.parquet",
+               [(basin, day, float(i)) for i, day in enumerate(days) for basin in reversed(BASINS)])
+    _write(_current_path(tmp_path, f"{CURRENT_YEAR}-01-05"),
+           [(basin, date(CURRENT_YEAR, 1, d), 1.0) for d in range(1, 5) for basin in BASINS],
+           load_date=f"{CURRENT_YEAR}-01-05")
+    _write(_current_path(tmp_path, f"{CURRENT_YEAR}-01-06"),
+           [(basin, date(CURRENT_YEAR, 1, d), 2.0) for d in range(1, 6) for basin in BASINS[:3]],
+           load_date=f"{CURRENT_YEAR}-01-06")
+    return tmp_path
+
+
+def _source(bucket, **kwargs):
+    return GCSParquetRepository(bucket_name=str(bucket), filesystem=pafs.LocalFileSystem(), **kwargs)
+
+
+@pytest.fixture(params=[False, True], ids=["latest-partition", "all-partitions"])
+def repositories(request, bucket):
+    """Repositório de referência (leitura direta dos Parquet) e o embarcado sobre os mesmos arquivos."""
+    return (_source(bucket, read_all_partitions=request.param),
+            EmbeddedArrowRepository(_source(bucket, read_all_partitions=request.param)))
+
+
+RANGES = [
+    (date(CURRENT_YEAR - 2, 1, 1), date(CURRENT_YEAR, 12, 31)),
+    (date(CURRENT_YEAR - 2, 3, 2), date(CURRENT_YEAR - 2, 3, 20)),
+    (date(CURRENT_YEAR - 1, 12, 25), date(CURRENT_YEAR, 1, 3)),
+    (date(CURRENT_YEAR, 1, 2), date(CURRENT_YEAR, 1, 2)),
+    (date(2000, 1, 1), date(2000, 12, 31)),
+]
+
+
+@pytest.mark.parametrize("start_date,end_date", RANGES)
+@pytest.mark.parametrize("page,size", [(3, 7), (1, 1000), (500, 10)])
+def test_find_by_date_range_matches_reference(repositories, start_date, end_date, page, size):
+    reference, embedded = repositories
+
+    expected, expected_total = reference.find_by_date_range(start_date, end_date, page, size)
+    table, total = embedded.find_by_date_range(start_date, end_date, page, size)
+
+    assert total == expected_total == embedded.count_by_date_range(start_date, end_date)
+    assert table.to_pylist() == expected.to_pylist()
+
+
+@pytest.mark.parametrize("start_date,end_date", RANGES)
+def test_keyset_walk_matches_reference(repositories, start_date, end_date):
+    """Percorre o intervalo inteiro por cursor nos dois repositórios e compara cada página."""
+    reference, embedded = repositories
+    after = None
+    while True:
+        expected, expected_more, expected_total = reference.find_page_after_with_count(start_date, end_date, 40, after)
+        table, has_more, total = embedded.find_page_after_with_count(start_date, end_date, 40, after)
+
+        assert (table.to_pylist(), has_more, total) == (expected.to_pylist(), expected_more, expected_total)
+        if not has_more:
+            break
+        last = table.slice(table.num_rows - 1).to_pylist()[0]
+        after = PageKey(last['ena_data'], last['nom_bacia'])
+
+
+def test_keyset_cursor_between_keys(repositories):
+    """Um cursor que não corresponde a nenhuma linha continua na próxima chave maior."""
+    reference, embedded = repositories
+    start_date, end_date = RANGES[0]
+    after = PageKey(date(CURRENT_YEAR, 1, 2), 'MADEIRA')
+
+    expected, expected_more = reference.find_page_after(start_date, end_date, 4, after)
+    table, has_more = embedded.find_page_after(start_date, end_date, 4, after)
+
+    assert table.to_pylist() == expected.to_pylist()
+    assert table.column('nom_bacia').to_pylist()[0] == 'PARANA'
+    assert has_more == expected_more
+
+
+@pytest.mark.parametrize("granularity", ["week", "month", "year"])
+def test_aggregate_by_period_matches_reference_and_raw_rows(repositories, granularity):
+    reference, embedded = repositories
+    start_date, end_date = date(CURRENT_YEAR - 1, 12, 1), date(CURRENT_YEAR, 12, 31)
+
+    expected = reference.aggregate_by_period(start_date, end_date, granularity, 'ena_bruta_bacia_mwmed')
+    aggregates = embedded.aggregate_by_period(start_date, end_date, granularity, 'ena_bruta_bacia_mwmed')
+
+    assert aggregates.to_pylist() == expected.to_pylist()
+    # Conferência independente com pandas sobre as mesmas linhas
+    rows = reference.read_sorted_range(start_date, end_date).to_pandas()
+    freq = {"week": "W-SUN", "month": "M", "year": "Y"}[granularity]
+    rows['period_start'] = pd.to_datetime(rows['ena_data']).dt.to_period(freq).dt.start_time.dt.date
+    grouped = rows.groupby(['period_start', 'nom_bacia'])['ena_bruta_bacia_mwmed'].agg(['count', 'min', 'max', 'mean', 'sum'])
+    assert [(r['period_start'], r['nom_bacia'], r['count'], r['sum']) for r in aggregates.to_pylist()] == \
+        [(period, basin, row['count'], row['sum']) for (period, basin), row in grouped.iterrows()]
+
+
+def test_hot_table_reloaded_only_when_files_change(bucket):
+    now = [0.0]
+    source = _source(bucket)
+    embedded = EmbeddedArrowRepository(source, refresh_seconds=30, clock=lambda: now[0])
+    day = date(CURRENT_YEAR, 1, 10)
+    assert embedded.count_by_date_range(day, day) == 0
+
+    # Nova partição mais recente com o dia 10
+    _write(_current_path(bucket, f"{CURRENT_YEAR}-01-11"), [('SUL', day, 5.0)], load_date=f"{CURRENT_YEAR}-01-11")
+    first = embedded.snapshot()
+    assert embedded.count_by_date_range(day, day) == 0
+
+    now[0] = 31.0
+    assert embedded.count_by_date_range(day, day) == 1
+    assert embedded.snapshot() is not first
+
+    now[0] = 62.0
+    reloaded = embedded.snapshot()
+    assert embedded.snapshot() is reloaded
+
+
+def test_invalidate_forces_a_check(bucket):
+    embedded = EmbeddedArrowRepository(_source(bucket), refresh_seconds=3600)
+    day = date(CURRENT_YEAR, 1, 10)
+    embedded.count_by_date_range(day, day)
+    _write(_current_path(bucket, f"{CURRENT_YEAR}-01-11"), [('SUL', day, 5.0)], load_date=f"{CURRENT_YEAR}-01-11")
+
+    embedded.invalidate()
+
+    assert embedded.count_by_date_range(day, day) == 1
+
+
+def test_empty_bucket(tmp_path):
+    embedded = EmbeddedArrowRepository(_source(tmp_path))
+
+    table, total = embedded.find_by_date_range(date(CURRENT_YEAR, 1, 1), date(CURRENT_YEAR, 12, 31), 1, 10)
+
+    assert (table.num_rows, total) == (0, 0)
+    assert embedded.find_page_after(date(CURRENT_YEAR, 1, 1), date(CURRENT_YEAR, 12, 31), 10)[1] is False
@@ -0,0 +1,128 @@
+import json
+from datetime import date
+
+import pandas as pd
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import pytest
+
+from api.core.pagination import PageKey
+from api.core.parquet_profiles import get_parquet_profile
+from api.models.arrow_schema import to_basin_table
+from api.repositories.gcs_parquet_repository import GCSParquetRepository
+
+CURRENT_YEAR = date.today().year
+
+
+def _write(path, rows, load_date=None):
+    """Grava um arquivo no mesmo layout e perfil usados pelo GCSRepository."""
+    df = pd.DataFrame(rows, columns=['nom_bacia', 'ena_data', 'ena_bruta_bacia_mwmed'])
+    if load_date:
+        df['data_carga_bronze'] = load_date
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile = get_parquet_profile()
+    pq.write_table(profile.prepare_table(to_basin_table(df)), path, row_group_size=2, **profile.writer_kwargs())
+
+
+def _current_path(bucket, partition):
+    return bucket / "basin_data" / "current" / f"year={CURRENT_YEAR}" / f"dt={partition}" / f"basin_data_{CURRENT_YEAR}.parquet"
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    """Bucket simulado em disco com dois anos históricos e duas partições do ano corrente."""
+    historical = tmp_path / "basin_data" / "historical"
+    _write(historical / "basin_data_2021.parquet", [('SUL', date(2021, 12, 31), 1.0)])
+    _write(historical / "basin_data_2022.parquet",
+           [('SUL', date(2022, 1, 1), 2.0), ('GRANDE', date(2022, 1, 1), 3.0), ('SUL', date(2022, 1, 2), 4.0)])
+    _write(_current_path(tmp_path, f"{CURRENT_YEAR}-01-02"),
+           [('SUL', date(CURRENT_YEAR, 1, 1), 10.0), ('GRANDE', date(CURRENT_YEAR, 1, 1), 11.0)],
+           load_date=f"{CURRENT_YEAR}-01-02")
+    # Partição delta: apenas a linha alterada
+    _write(_current_path(tmp_path, f"{CURRENT_YEAR}-01-03"),
+           [('SUL', date(CURRENT_YEAR, 1, 1), 99.0)], load_date=f"{CURRENT_YEAR}-01-03")
+    return tmp_path
+
+
+def _repo(bucket, **kwargs):
+    return GCSParquetRepository(bucket_name=str(bucket), filesystem=pafs.LocalFileSystem(), **kwargs)
+
+
+def test_find_by_date_range_sorted_and_paginated(bucket):
+    repo = _repo(bucket)
+
+    table, total = repo.find_by_date_range(date(2021, 12, 31), date(2022, 1, 1), page=1, size=2)
+
+    assert total == 3
+    assert table.column('nom_bacia').to_pylist() == ['SUL', 'GRANDE']
+    assert table.column('ena_data').to_pylist() == [date(2021, 12, 31), date(2022, 1, 1)]
+
+    table, _ = repo.find_by_date_range(date(2021, 12, 31), date(2022, 1, 1), page=2, size=2)
+    assert table.column('nom_bacia').to_pylist() == ['SUL']
+    assert table.column_names == ['nom_bacia', 'ena_data', 'ena_bruta_bacia_mwmed', 'ena_bruta_bacia_percentualmlt',
+                                'ena_armazenavel_bacia_mwmed', 'ena_armazenavel_bacia_percentualmlt']
+
+
+def test_find_by_date_range_pushes_down_date_filter(bucket):
+    table, total = _repo(bucket).find_by_date_range(date(2022, 1, 2), date(2022, 1, 2), 1, 10)
+
+    assert total == 1
+    assert table.column('ena_bruta_bacia_mwmed').to_pylist() == [4.0]
+
+
+def test_find_by_date_range_reads_only_latest_partition(bucket):
+    table, total = _repo(bucket).find_by_date_range(date(CURRENT_YEAR, 1, 1), date(CURRENT_YEAR, 12, 31), 1, 10)
+
+    # Sem manifesto, a última partição é encontrada por listagem
+    assert total == 1
+    assert table.column('ena_bruta_bacia_mwmed').to_pylist() == [99.0]
+
+
+def test_find_by_date_range_uses_manifest(bucket):
+    manifest = bucket / "basin_state" / "manifest.json"
+    manifest.parent.mkdir(parents=True)
+    manifest.write_text(json.dumps({"years": {str(CURRENT_YEAR): {"latest_partition": f"{CURRENT_YEAR}-01-02"}}}))
+
+    _, total = _repo(bucket).find_by_date_range(date(CURRENT_YEAR, 1, 1), date(CURRENT_YEAR, 12, 31), 1, 10)
+
+    assert total == 2
+
+
+def test_find_by_date_range_merges_delta_partitions(bucket):
+    repo = _repo(bucket, read_all_partitions=True)
+
+    table, total = repo.find_by_date_range(date(CURRENT_YEAR, 1, 1), date(CURRENT_YEAR, 12, 31), 1, 10)
+
+    # A cópia mais recente de cada linha prevalece
+    assert total == 2
+    assert dict(zip(table.column('nom_bacia').to_pylist(), table.column('ena_bruta_bacia_mwmed').to_pylist())) == {'GRANDE': 11.0, 'SUL': 99.0}
+
+
+def test_find_page_after_continues_after_key(bucket):
+    repo = _repo(bucket)
+
+    table, has_more = repo.find_page_after(date(2021, 12, 31), date(2022, 1, 2), 2)
+    assert table.column('nom_bacia').to_pylist() == ['SUL', 'GRANDE']
+    assert has_more is True
+
+    table, has_more = repo.find_page_after(date(2021, 12, 31), date(2022, 1, 2), 2,
+                                        after=PageKey(date(2022, 1, 1), 'GRANDE'))
+    assert table.select(['nom_bacia', 'ena_data']).to_pylist() == [{'nom_bacia': 'SUL', 'ena_data': date(2022, 1, 1)},
+                                                             {'nom_bacia': 'SUL', 'ena_data': date(2022, 1, 2)}]
+    assert has_more is False
+    assert repo.count_by_date_range(date(2021, 12, 31), date(2022, 1, 2)) == 4
+
+    table, has_more, total = repo.find_page_after_with_count(date(2021, 12, 31), date(2022, 1, 2), 3)
+    assert (table.num_rows, has_more, total) == (3, True, 4)
+
+
+def test_find_by_date_range_no_files(bucket):
+    table, total = _repo(bucket).find_by_date_range(date(2010, 1, 1), date(2010, 12, 31), 1, 10)
+
+    assert total == 0
+    assert table.num_rows == 0
+
+
+def test_gcs_parquet_repository_requires_bucket_name():
+    with pytest.raises(ValueError):
+        GCSParquetRepository(bucket_name="", filesystem=pafs.LocalFileSystem())
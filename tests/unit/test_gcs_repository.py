@@ -1,9 +1,20 @@
+import base64
+import io
 import pytest
+import json
 from unittest.mock import MagicMock, patch
 from datetime import date
+from google.api_core.exceptions import PreconditionFailed
+import google_crc32c
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from prometheus_client import REGISTRY
 
-from api.repositories.gcs_repository import GCSRepository
+from api.core.exceptions import GCSIntegrityError
+from api.core.parquet_profiles import ParquetWriterProfile
+from api.models.arrow_schema import conform_table
+from api.repositories.gcs_repository import GCSRepository, HistoricalFile
 
 @pytest.fixture
 def mock_storage_client():
@@ -15,23 +26,97 @@ def gcs_repository(mock_storage_client):
     bucket_name = "test-bucket"
     repo = GCSRepository(bucket_name=bucket_name)
     repo.bucket = MagicMock()
+    repo.bucket.get_blob.return_value = None  # nenhum objeto (ex.: manifesto) existe por padrão
     repo.client = mock_storage_client # Garante que o cliente mockado seja usado
     return repo
 
+def _streaming_blob(corrupt=False):
+    """Blob mockado cujo upload grava em memória e cujo reload expõe o CRC32C do conteúdo."""
+    uploaded = io.BytesIO()
+    uploaded.close = lambda: None  # mantém o conteúdo acessível após o upload
+    mock_blob = MagicMock()
+    mock_blob.open.return_value.__enter__.return_value = uploaded
+
+    def reload():
+        data = uploaded.getvalue() + (b"x" if corrupt else b"")
+        mock_blob.crc32c = base64.b64encode(google_crc32c.Checksum(data).digest()).decode("ascii")
+
+    mock_blob.reload.side_effect = reload
+    return mock_blob, uploaded
+
 def test_save_dataframe_success(gcs_repository):
     df = pd.DataFrame({'data': [1, 2]})
     year = 2023
     ingestion_date = date(2023, 10, 26)
     
-    mock_blob = MagicMock()
+    mock_blob, uploaded = _streaming_blob()
     gcs_repository.bucket.blob.return_value = mock_blob
     
     gcs_repository.save_dataframe(df, year, ingestion_date)
     
     # CORREÇÃO: O caminho real no seu código é este
     expected_blob_name = f"basin_data/historical/basin_data_{year}.parquet"
-    gcs_repository.bucket.blob.assert_called_once_with(expected_blob_name)
-    mock_blob.upload_from_file.assert_called_once()
+    assert gcs_repository.bucket.blob.call_args_list[0].args == (expected_blob_name,)
+    mock_blob.open.assert_called_once_with("wb", chunk_size=gcs_repository.upload_chunk_size, ignore_flush=True,
+                                           content_type="application/octet-stream")
+    assert pq.read_table(io.BytesIO(uploaded.getvalue()))['data'].to_pylist() == [1, 2]
+    mock_blob.delete.assert_not_called()
+
+def test_save_dataframe_writes_row_groups(mock_storage_client):
+    repo = GCSRepository(bucket_name="test-bucket",
+                         parquet_profile=ParquetWriterProfile(name="test", row_group_size=2))
+    repo.bucket = MagicMock()
+    repo.bucket.get_blob.return_value = None
+    mock_blob, uploaded = _streaming_blob()
+    repo.bucket.blob.return_value = mock_blob
+
+    repo.save_dataframe(pd.DataFrame({'data': [1, 2, 3, 4, 5]}), 2022, date(2023, 10, 26))
+
+    assert pq.ParquetFile(io.BytesIO(uploaded.getvalue())).num_row_groups == 3
+
+def test_save_dataframe_records_write_phases(gcs_repository):
+    """A escrita do Parquet registra, por ano, o tempo de serialização e o de envio."""
+    def count(phase):
+        return REGISTRY.get_sample_value("basin_parquet_write_seconds_count", {"phase": phase, "year": "2021"}) or 0.0
+
+    before = (count("serialize"), count("transfer"))
+    mock_blob, _ = _streaming_blob()
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    gcs_repository.save_dataframe(pd.DataFrame({'data': [1, 2]}), 2021, date(2023, 10, 26))
+
+    assert (count("serialize"), count("transfer")) == (before[0] + 1, before[1] + 1)
+
+def test_save_dataframe_checksum_mismatch(gcs_repository):
+    mock_blob, _ = _streaming_blob(corrupt=True)
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    with pytest.raises(GCSIntegrityError):
+        gcs_repository.save_dataframe(pd.DataFrame({'data': [1]}), 2022, date(2023, 10, 26))
+
+    # Um objeto corrompido não deve permanecer no bucket
+    mock_blob.delete.assert_called_once()
+
+def test_save_historical_batches_writes_row_groups(mock_storage_client):
+    repo = GCSRepository(bucket_name="test-bucket",
+                         parquet_profile=ParquetWriterProfile(name="test", row_group_size=2))
+    repo.bucket = MagicMock()
+    repo.bucket.get_blob.return_value = None
+    mock_blob, uploaded = _streaming_blob()
+    mock_blob.name, mock_blob.generation, mock_blob.size = "arquivo", 1, 100  # serializáveis no manifesto
+    repo.bucket.blob.return_value = mock_blob
+    batches = [conform_table(pa.table({'nom_bacia': ['SUL', 'NORTE'], 'ena_data': [date(2022, 1, 1)] * 2})).to_batches()[0],
+               conform_table(pa.table({'nom_bacia': ['SUL'], 'ena_data': [date(2022, 1, 2)]})).to_batches()[0]]
+
+    rows = repo.save_historical_batches(2022, iter(batches))
+
+    written = pq.ParquetFile(io.BytesIO(uploaded.getvalue()))
+    assert rows == 3
+    assert written.num_row_groups == 2
+    # Cada row group sai ordenado pelo perfil
+    assert written.read()['nom_bacia'].cast(pa.string()).to_pylist() == ['NORTE', 'SUL', 'SUL']
+    assert repo.bucket.blob.call_args_list[0].args == ("basin_data/historical/basin_data_2022.parquet",)
+    assert json.loads(mock_blob.upload_from_string.call_args.args[0])["years"]["2022"]["rows"] == 3
 
 def test_historical_data_exists(gcs_repository):
     mock_blob = MagicMock()
@@ -50,25 +135,288 @@ def test_historical_data_does_not_exist(gcs_repository):
     
     assert gcs_repository.historical_data_exists(2022) is False
 
+def _listed_blob(name, generation=1, size=10):
+    blob = MagicMock()
+    blob.name = name
+    blob.generation = generation
+    blob.size = size
+    return blob
+
+def test_refresh_historical_index_lists_once(gcs_repository):
+    gcs_repository.client.list_blobs.return_value = [
+        _listed_blob("basin_data/historical/basin_data_2020.parquet", 11, 100),
+        _listed_blob("basin_data/historical/basin_data_2021.parquet", 12, 200),
+        _listed_blob("basin_data/historical/_tmp/other.txt"),
+    ]
+
+    index = gcs_repository.refresh_historical_index()
+
+    assert index == {2020: HistoricalFile(11, 100), 2021: HistoricalFile(12, 200)}
+    # As verificações seguintes são feitas em memória, sem novas requisições
+    assert gcs_repository.historical_data_exists(2020) is True
+    assert gcs_repository.historical_data_exists(2019) is False
+    gcs_repository.bucket.blob.assert_not_called()
+    gcs_repository.client.list_blobs.assert_called_once()
+
+def test_list_historical_years_reuses_snapshot(gcs_repository):
+    gcs_repository.client.list_blobs.return_value = [_listed_blob("basin_data/historical/basin_data_2020.parquet")]
+
+    gcs_repository.list_historical_years()
+    gcs_repository.list_historical_years()
+
+    gcs_repository.client.list_blobs.assert_called_once()
+
+def test_save_dataframe_updates_historical_snapshot(gcs_repository):
+    gcs_repository.client.list_blobs.return_value = []
+    gcs_repository.refresh_historical_index()
+    mock_blob, _ = _streaming_blob()
+    mock_blob.generation = 42
+    mock_blob.size = 1234
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    gcs_repository.save_dataframe(pd.DataFrame({'data': [1]}), 2022, date(2023, 10, 26))
+
+    assert gcs_repository.historical_data_exists(2022) is True
+    assert gcs_repository.list_historical_years() == {2022: HistoricalFile(42, 1234)}
+
+def _manifest_blob(years, generation=7):
+    blob = MagicMock()
+    blob.generation = generation
+    blob.download_as_text.return_value = json.dumps({"years": years})
+    return blob
+
+def test_get_latest_ingestion_date_from_manifest(gcs_repository):
+    year = gcs_repository.current_year
+    gcs_repository.bucket.get_blob.return_value = _manifest_blob({str(year): {"latest_partition": f"{year}-10-26"}})
+
+    assert gcs_repository.get_latest_ingestion_date() == date(year, 10, 26)
+    # Com o manifesto, nenhuma listagem é necessária
+    gcs_repository.client.list_blobs.assert_not_called()
+    gcs_repository.bucket.get_blob.assert_called_once_with("basin_state/manifest.json")
+
 def test_get_latest_ingestion_date_found(gcs_repository):
-    blob1 = MagicMock()
-    blob1.name = "basin_data/bronze/2023-10-25/file.parquet"
-    blob2 = MagicMock()
-    blob2.name = "basin_data/bronze/2023-10-26/file.parquet"
-    
-    # CORREÇÃO: O mock deve ser no método list_blobs do cliente
-    gcs_repository.client.list_blobs.return_value = [blob1, blob2]
+    # Sem manifesto, a data é recuperada listando os prefixos "dt="
+    year = gcs_repository.current_year
+    listing = MagicMock()
+    listing.prefixes = {
+        f"basin_data/current/year={year}/dt={year}-10-25/",
+        f"basin_data/current/year={year}/dt={year}-10-26/",
+    }
+    gcs_repository.client.list_blobs.return_value = listing
     
     latest_date = gcs_repository.get_latest_ingestion_date()
     
-    assert latest_date == date(2023, 10, 26)
-    gcs_repository.client.list_blobs.assert_called_once_with("test-bucket", prefix="basin_data/bronze/")
+    assert latest_date == date(year, 10, 26)
+    gcs_repository.client.list_blobs.assert_called_once_with(
+        "test-bucket", prefix=f"basin_data/current/year={year}/dt=", delimiter="/"
+    )
 
 def test_get_latest_ingestion_date_not_found(gcs_repository):
-    gcs_repository.client.list_blobs.return_value = []
+    listing = MagicMock()
+    listing.prefixes = set()
+    gcs_repository.client.list_blobs.return_value = listing
     latest_date = gcs_repository.get_latest_ingestion_date()
     assert latest_date is None
 
+def test_save_dataframe_updates_manifest(gcs_repository):
+    mock_blob, _ = _streaming_blob()
+    mock_blob.name = "data-blob"
+    mock_blob.generation = 3
+    manifest_blob = MagicMock()
+    gcs_repository.bucket.blob.side_effect = lambda name: manifest_blob if name == "basin_state/manifest.json" else mock_blob
+    gcs_repository.bucket.get_blob.return_value = _manifest_blob({"2020": {"rows": 1}}, generation=7)
+    ingestion_date = date(gcs_repository.current_year, 10, 26)
+
+    gcs_repository.save_dataframe(pd.DataFrame({'data': [1, 2]}), gcs_repository.current_year, ingestion_date,
+                                  source_signature={"size": "10"})
+
+    payload, kwargs = manifest_blob.upload_from_string.call_args.args[0], manifest_blob.upload_from_string.call_args.kwargs
+    entry = json.loads(payload)["years"][str(gcs_repository.current_year)]
+    assert kwargs["if_generation_match"] == 7
+    assert entry["latest_partition"] == ingestion_date.isoformat()
+    assert entry["rows"] == 2
+    assert entry["crc32c"] == mock_blob.crc32c
+    assert entry["source_signature"] == {"size": "10"}
+    # As entradas dos outros anos são preservadas
+    assert json.loads(payload)["years"]["2020"] == {"rows": 1}
+
+def test_update_manifest_retries_on_generation_conflict(gcs_repository):
+    manifest_blob = MagicMock()
+    manifest_blob.upload_from_string.side_effect = [PreconditionFailed("conflict"), None]
+    gcs_repository.bucket.blob.return_value = manifest_blob
+    gcs_repository.bucket.get_blob.side_effect = [_manifest_blob({}, generation=1), _manifest_blob({}, generation=2)]
+
+    with patch("api.repositories.gcs_repository.time.sleep") as mock_sleep, \
+            patch("api.core.backoff.random.uniform", return_value=0.05) as mock_uniform:
+        gcs_repository._update_manifest(2022, {"rows": 3})
+
+    generations = [c.kwargs["if_generation_match"] for c in manifest_blob.upload_from_string.call_args_list]
+    assert generations == [1, 2]
+    # Espera com jitter entre as tentativas, limitada pelo backoff da primeira tentativa
+    mock_uniform.assert_called_once_with(0, 0.1)
+    mock_sleep.assert_called_once_with(0.05)
+
+def test_update_manifest_keeps_latest_partition(gcs_repository):
+    manifest_blob = MagicMock()
+    gcs_repository.bucket.blob.return_value = manifest_blob
+    gcs_repository.bucket.get_blob.return_value = _manifest_blob({"2025": {"latest_partition": "2025-10-26"}})
+
+    gcs_repository._update_manifest(2025, {"latest_partition": "2025-10-25"})
+
+    manifest_blob.upload_from_string.assert_not_called()
+
+def test_save_dataframe_stores_source_signature(gcs_repository):
+    mock_blob, _ = _streaming_blob()
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    gcs_repository.save_dataframe(pd.DataFrame({'data': [1]}), 2022, date(2023, 10, 26),
+                                  source_signature={"last_modified": "2023-10-25", "size": "10"})
+
+    assert mock_blob.metadata == {"ons_last_modified": "2023-10-25", "ons_size": "10"}
+
+def test_read_file_schema_reads_the_footer_of_the_partition(gcs_repository):
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'nom_bacia': ['SUL'], 'ena_data': ['2023-01-01']}), buffer)
+    buffer.seek(0)
+    mock_blob = MagicMock()
+    mock_blob.open.return_value.__enter__.return_value = buffer
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    schema = gcs_repository.read_file_schema(2025, date(2025, 10, 26))
+
+    assert schema.field('ena_data').type == pa.string()
+    gcs_repository.bucket.blob.assert_called_once_with("basin_data/current/year=2025/dt=2025-10-26/basin_data_2025.parquet")
+    mock_blob.open.assert_called_once_with("rb")
+
+def test_get_source_signature_reads_blob_metadata(gcs_repository):
+    mock_blob = MagicMock()
+    mock_blob.metadata = {"ons_last_modified": "2023-10-25", "ons_size": "10", "other": "x"}
+    gcs_repository.bucket.get_blob.return_value = mock_blob
+    ingestion_date = date(gcs_repository.current_year, 1, 2)
+
+    signature = gcs_repository.get_source_signature(gcs_repository.current_year, ingestion_date)
+
+    assert signature == {"last_modified": "2023-10-25", "size": "10"}
+    gcs_repository.bucket.get_blob.assert_called_once_with(
+        gcs_repository._get_current_blob_name(ingestion_date, gcs_repository.current_year)
+    )
+
+def test_get_source_signature_missing_blob(gcs_repository):
+    gcs_repository.bucket.get_blob.return_value = None
+    assert gcs_repository.get_source_signature(2022) is None
+
+def test_row_index_round_trip(gcs_repository):
+    index_df = pd.DataFrame({
+        'nom_bacia': ['GRANDE'], 'ena_data': [date(2025, 1, 1)], 'row_hash': pd.Series([2**63 + 5], dtype='uint64')
+    })
+    uploaded = {}
+    mock_blob = MagicMock()
+    mock_blob.upload_from_file.side_effect = lambda buffer, **kwargs: uploaded.update(data=buffer.read())
+    mock_blob.download_as_bytes.side_effect = lambda: uploaded['data']
+    gcs_repository.bucket.blob.return_value = mock_blob
+    gcs_repository.bucket.get_blob.return_value = mock_blob
+
+    gcs_repository.save_row_index(2025, index_df)
+    loaded = gcs_repository.load_row_index(2025)
+
+    gcs_repository.bucket.blob.assert_called_once_with("basin_state/row_index/year=2025/row_index.parquet")
+    assert loaded['row_hash'].tolist() == [2**63 + 5]
+    assert loaded['ena_data'].tolist() == [date(2025, 1, 1)]
+
+def test_load_row_index_missing(gcs_repository):
+    gcs_repository.bucket.get_blob.return_value = None
+    assert gcs_repository.load_row_index(2025) is None
+
+def test_summary_round_trip(gcs_repository):
+    summary = pa.table({'nom_bacia': ['SUL'], 'period_start': pa.array([date(2024, 1, 1)], pa.date32()),
+                        'ena_bruta_bacia_mwmed_sum': [10.0]})
+    uploaded = {}
+    mock_blob = MagicMock()
+    mock_blob.upload_from_file.side_effect = lambda buffer, **kwargs: uploaded.update(data=buffer.read())
+    mock_blob.download_as_bytes.side_effect = lambda: uploaded['data']
+    gcs_repository.bucket.blob.return_value = mock_blob
+    gcs_repository.bucket.get_blob.return_value = mock_blob
+
+    gcs_repository.save_summary(2024, "month", summary)
+
+    gcs_repository.bucket.blob.assert_called_once_with("basin_state/summaries/year=2024/month.parquet")
+    assert gcs_repository.load_summary(2024, "month").equals(summary)
+
+def test_load_summary_missing(gcs_repository):
+    assert gcs_repository.load_summary(2024, "week") is None
+
+def test_job_state_round_trip(gcs_repository):
+    uploaded = {}
+    mock_blob = MagicMock()
+    mock_blob.upload_from_string.side_effect = lambda data, **kwargs: uploaded.update(data=data)
+    mock_blob.download_as_text.side_effect = lambda: uploaded['data']
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    gcs_repository.save_job_state("abc", {"job_id": "abc", "status": "PENDENTE"})
+    gcs_repository.bucket.get_blob.return_value = mock_blob
+
+    gcs_repository.bucket.blob.assert_called_once_with("basin_state/ingest_jobs/abc.json")
+    assert gcs_repository.load_job_state("abc") == {"job_id": "abc", "status": "PENDENTE"}
+
+def test_load_job_state_missing(gcs_repository):
+    assert gcs_repository.load_job_state("inexistente") is None
+
 def test_gcs_repository_initialization_requires_bucket_name():
     with pytest.raises(ValueError, match="The GCS bucket name is required."):
-        GCSRepository(bucket_name=None)
\ No newline at end of file
+        GCSRepository(bucket_name=None)
+def test_list_current_partitions_groups_by_year(gcs_repository):
+    gcs_repository.client.list_blobs.return_value = [
+        _listed_blob("basin_data/current/year=2025/dt=2025-01-02/basin_data_2025.parquet", size=20),
+        _listed_blob("basin_data/current/year=2025/dt=2025-01-01/basin_data_2025.parquet", size=10),
+        _listed_blob("basin_data/current/year=2024/dt=2024-12-31/basin_data_2024.parquet", size=5),
+        _listed_blob("basin_data/current/year=2025/dt=2025-01-01/_SUCCESS"),
+    ]
+
+    partitions = gcs_repository.list_current_partitions()
+
+    assert [p.partition for p in partitions[2025]] == [date(2025, 1, 1), date(2025, 1, 2)]
+    assert partitions[2024][0].size == 5
+
+def test_read_basin_table_keeps_load_date(gcs_repository):
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'nom_bacia': ['SUL'], 'ena_data': [date(2025, 1, 1)], 'data_carga_bronze': ['2025-01-02']}), buffer)
+    mock_blob = MagicMock()
+    mock_blob.download_as_bytes.return_value = buffer.getvalue()
+    gcs_repository.bucket.blob.return_value = mock_blob
+
+    table = gcs_repository.read_basin_table("some.parquet")
+
+    assert table.column_names[-1] == 'data_carga_bronze'
+    assert table['ena_bruta_bacia_mwmed'].null_count == 1
+
+def test_read_historical_table(gcs_repository):
+    buffer = io.BytesIO()
+    pq.write_table(pa.table({'nom_bacia': ['SUL'], 'ena_data': [date(2022, 1, 1)]}), buffer)
+    gcs_repository.bucket.blob.return_value.download_as_bytes.return_value = buffer.getvalue()
+
+    table = gcs_repository.read_historical_table(2022)
+
+    gcs_repository.bucket.blob.assert_called_once_with("basin_data/historical/basin_data_2022.parquet")
+    assert table['nom_bacia'].to_pylist() == ['SUL']
+
+def test_write_compacted_historical(gcs_repository):
+    mock_blob, uploaded = _streaming_blob()
+    mock_blob.size = 321
+    gcs_repository.bucket.blob.return_value = mock_blob
+    table = pa.table({'nom_bacia': ['SUL'], 'ena_data': [date(2022, 1, 1)]})
+
+    size = gcs_repository.write_compacted(2022, table)
+
+    assert size == 321
+    assert gcs_repository.bucket.blob.call_args_list[0].args == ("basin_data/historical/basin_data_2022.parquet",)
+    assert pq.read_table(io.BytesIO(uploaded.getvalue())).num_rows == 1
+
+def test_get_content_fingerprint_matches_partition(gcs_repository):
+    gcs_repository.bucket.get_blob.return_value = _manifest_blob(
+        {"2025": {"latest_partition": "2025-10-26", "content_fingerprint": "abc"}}
+    )
+
+    assert gcs_repository.get_content_fingerprint(2025, date(2025, 10, 26)) == "abc"
+    # Um manifesto que aponta para outra partição não serve de comparação
+    assert gcs_repository.get_content_fingerprint(2025, date(2025, 10, 25)) is None
+    assert gcs_repository.get_content_fingerprint(2024) is None
@@ -0,0 +1,113 @@
+import httpx
+import pytest
+
+from api.core.http_cache import HTTPDiskCache
+from api.core.exceptions import ONSCacheMissError
+
+class FakeServer:
+    """Servidor HTTP simulado que responde com ETag e suporta GET condicional."""
+
+    def __init__(self):
+        self.bodies = {}
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        body = self.bodies[request.url.path]
+        etag = f'"{hash(body)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, content=body, headers={"ETag": etag})
+
+@pytest.fixture
+def server():
+    return FakeServer()
+
+@pytest.fixture
+def client(server):
+    return httpx.Client(transport=httpx.MockTransport(server.handler))
+
+def test_fetch_stores_body_and_revalidates(tmp_path, server, client):
+    server.bodies["/2023.csv"] = b"a;b\n1;2\n"
+    cache = HTTPDiskCache(str(tmp_path))
+
+    first = cache.fetch(client, "http://ons/2023.csv")
+    second = cache.fetch(client, "http://ons/2023.csv")
+
+    assert first == second
+    assert first.read_bytes() == b"a;b\n1;2\n"
+    # A segunda chamada é um GET condicional respondido com 304
+    assert "If-None-Match" not in server.requests[0].headers
+    assert server.requests[1].headers["If-None-Match"]
+
+def test_fetch_replaces_changed_body(tmp_path, server, client):
+    server.bodies["/2023.csv"] = b"v1"
+    cache = HTTPDiskCache(str(tmp_path))
+    old_path = cache.fetch(client, "http://ons/2023.csv")
+
+    server.bodies["/2023.csv"] = b"v2"
+    new_path = cache.fetch(client, "http://ons/2023.csv")
+
+    assert new_path.read_bytes() == b"v2"
+    assert not old_path.exists()
+
+def test_identical_bodies_are_stored_once(tmp_path, server, client):
+    server.bodies["/a.csv"] = b"same"
+    server.bodies["/b.csv"] = b"same"
+    cache = HTTPDiskCache(str(tmp_path))
+
+    assert cache.fetch(client, "http://ons/a.csv") == cache.fetch(client, "http://ons/b.csv")
+    assert cache.total_bytes == 4
+
+def test_lru_eviction_by_total_size(tmp_path, server, client):
+    server.bodies["/a.csv"] = b"a" * 10
+    server.bodies["/b.csv"] = b"b" * 10
+    server.bodies["/c.csv"] = b"c" * 10
+    cache = HTTPDiskCache(str(tmp_path), max_bytes=25)
+
+    cache.fetch(client, "http://ons/a.csv")
+    cache.fetch(client, "http://ons/b.csv")
+    cache.fetch(client, "http://ons/a.csv")  # 'a' passa a ser o mais recente
+    cache.fetch(client, "http://ons/c.csv")
+
+    assert cache.get_cached_path("http://ons/b.csv") is None
+    assert cache.get_cached_path("http://ons/a.csv") is not None
+    assert cache.total_bytes == 20
+
+def test_offline_replay(tmp_path, server, client):
+    server.bodies["/2023.csv"] = b"data"
+    HTTPDiskCache(str(tmp_path)).fetch(client, "http://ons/2023.csv", params={"id": "x"})
+    server.requests.clear()
+
+    # Uma nova instância recarrega o índice do disco
+    offline_cache = HTTPDiskCache(str(tmp_path), offline=True)
+
+    assert offline_cache.fetch(client, "http://ons/2023.csv", params={"id": "x"}).read_bytes() == b"data"
+    with pytest.raises(ONSCacheMissError):
+        offline_cache.fetch(client, "http://ons/2024.csv")
+    assert server.requests == []
+
+def test_checked_out_body_survives_eviction(tmp_path, server, client):
+    server.bodies["/a.csv"] = b"a" * 10
+    server.bodies["/b.csv"] = b"b" * 10
+    cache = HTTPDiskCache(str(tmp_path), max_bytes=15)
+
+    downloaded = cache.fetch(client, "http://ons/a.csv", checkout=True)
+    revalidated = cache.fetch(client, "http://ons/a.csv", checkout=True)  # resposta 304
+    # Outro download remove 'a' do cache antes que as cópias sejam lidas
+    cache.fetch(client, "http://ons/b.csv")
+
+    assert cache.get_cached_path("http://ons/a.csv") is None
+    assert downloaded != revalidated
+    assert downloaded.read_bytes() == revalidated.read_bytes() == b"a" * 10
+    assert downloaded.parent == revalidated.parent == tmp_path / "checkout"
+
+def test_stale_checkouts_are_removed(tmp_path, server, client):
+    import os
+    server.bodies["/a.csv"] = b"a"
+    stale = HTTPDiskCache(str(tmp_path)).fetch(client, "http://ons/a.csv", checkout=True)
+    os.utime(stale, (0, 0))
+
+    HTTPDiskCache(str(tmp_path))
+
+    assert not stale.exists()
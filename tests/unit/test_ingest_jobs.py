@@ -0,0 +1,186 @@
+import threading
+import time
+from datetime import date
+from unittest.mock import MagicMock
+
+import pytest
+
+from api.core.exceptions import IngestConflictError, IngestQueueFullError
+from api.core.ingest_jobs import (
+    JOB_FAILED, JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, GCSJobStore, IngestJobManager, InMemoryJobStore
+)
+from api.models.basin import IngestJob
+
+
+def _wait_for(manager, job_id, statuses=(JOB_SUCCEEDED, JOB_FAILED), timeout=5):
+    """Consulta o job até que ele chegue a um dos estados esperados."""
+    for _ in range(int(timeout / 0.01)):
+        job = manager.get(job_id)
+        if job.status in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} não terminou: {manager.get(job_id)}")
+
+
+def _fake_ingest(start_date, end_date, progress):
+    details = []
+    for year in range(start_date.year, end_date.year + 1):
+        progress(year, {"status": "EM_ANDAMENTO"})
+        detail = {"year": year, "status": "SUCESSO", "rows_ingested": 10}
+        progress(year, detail)
+        details.append(detail)
+    return {"summary": {"years_requested": [d["year"] for d in details], "total_rows_ingested": 20}, "details": details}
+
+
+@pytest.fixture
+def manager():
+    manager = IngestJobManager(InMemoryJobStore(), max_concurrent_jobs=1, max_queued_jobs=1)
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def test_job_runs_in_background_and_reports_years(manager):
+    job = manager.submit(date(2022, 1, 1), date(2023, 12, 31), _fake_ingest)
+
+    assert job.years == {2022: JOB_PENDING, 2023: JOB_PENDING}
+    finished = _wait_for(manager, job.job_id)
+    assert finished.status == JOB_SUCCEEDED
+    assert finished.years == {2022: "SUCESSO", 2023: "SUCESSO"}
+    assert finished.summary["total_rows_ingested"] == 20
+    assert finished.started_at is not None and finished.finished_at is not None
+
+
+def test_failed_job_keeps_the_error(manager):
+    def failing_ingest(start_date, end_date, progress):
+        raise RuntimeError("GCS indisponível")
+
+    job = manager.submit(date(2022, 1, 1), date(2022, 12, 31), failing_ingest)
+
+    finished = _wait_for(manager, job.job_id)
+    assert finished.status == JOB_FAILED
+    assert finished.error == "GCS indisponível"
+
+
+def test_submissions_beyond_the_queue_are_rejected(manager):
+    release = threading.Event()
+
+    def blocking_ingest(start_date, end_date, progress):
+        release.wait(5)
+        return {"summary": {}, "details": []}
+
+    running = manager.submit(date(2022, 1, 1), date(2022, 12, 31), blocking_ingest)
+    queued = manager.submit(date(2023, 1, 1), date(2023, 12, 31), blocking_ingest)
+    # Um job executando e um na fila: o limite foi atingido
+    with pytest.raises(IngestQueueFullError):
+        manager.submit(date(2024, 1, 1), date(2024, 12, 31), blocking_ingest)
+
+    assert _wait_for(manager, running.job_id, statuses=(JOB_RUNNING,)).status == JOB_RUNNING
+    assert manager.get(queued.job_id).status == JOB_PENDING
+    release.set()
+    _wait_for(manager, queued.job_id)
+    # Com a fila livre, novos jobs voltam a ser aceitos
+    manager.submit(date(2024, 1, 1), date(2024, 12, 31), blocking_ingest)
+
+
+def test_exclusive_block_excludes_ingestion_jobs(manager):
+    with manager.exclusive():
+        # Durante a compactação nenhuma ingestão é aceita
+        with pytest.raises(IngestConflictError):
+            manager.submit(date(2022, 1, 1), date(2022, 12, 31), _fake_ingest)
+
+    release = threading.Event()
+
+    def blocking_ingest(start_date, end_date, progress):
+        release.wait(5)
+        return {"summary": {}, "details": []}
+
+    job = manager.submit(date(2022, 1, 1), date(2022, 12, 31), blocking_ingest)
+    # E com um job ativo a compactação é recusada
+    with pytest.raises(IngestConflictError):
+        with manager.exclusive():
+            pass
+    release.set()
+    assert _wait_for(manager, job.job_id).status == JOB_SUCCEEDED
+
+
+def test_in_memory_store_keeps_only_recent_jobs():
+    store = InMemoryJobStore(max_jobs=2)
+    jobs = [IngestJob(job_id=str(i), status=JOB_PENDING, start_date=date(2022, 1, 1), end_date=date(2022, 1, 1),
+                      submitted_at="2024-01-01T00:00:00") for i in range(3)]
+    for job in jobs:
+        store.save(job)
+
+    assert store.get("0") is None
+    assert store.get("2").job_id == "2"
+
+
+def test_gcs_store_persists_and_reads_jobs_of_other_instances():
+    gcs_repository = MagicMock()
+    store = GCSJobStore(gcs_repository)
+    job = IngestJob(job_id="abc", status=JOB_PENDING, start_date=date(2022, 1, 1), end_date=date(2022, 12, 31),
+                    submitted_at="2024-01-01T00:00:00", years={2022: JOB_PENDING})
+
+    store.save(job)
+
+    job_id, state = gcs_repository.save_job_state.call_args.args
+    assert job_id == "abc" and state["years"] == {"2022": JOB_PENDING}
+    # Outra instância só encontra o job no GCS
+    gcs_repository.load_job_state.return_value = state
+    assert GCSJobStore(gcs_repository).get("abc") == job
+
+
+def test_gcs_store_failure_does_not_fail_the_job():
+    gcs_repository = MagicMock()
+    gcs_repository.save_job_state.side_effect = Exception("GCS indisponível")
+    manager = IngestJobManager(GCSJobStore(gcs_repository))
+
+    job = manager.submit(date(2022, 1, 1), date(2022, 12, 31), _fake_ingest)
+
+    assert _wait_for(manager, job.job_id).status == JOB_SUCCEEDED
+    manager.shutdown(wait=True)
+
+
+def test_queued_jobs_are_marked_failed_on_shutdown():
+    release = threading.Event()
+    manager = IngestJobManager(InMemoryJobStore(), max_concurrent_jobs=1, max_queued_jobs=1)
+
+    def blocking_ingest(start_date, end_date, progress):
+        release.wait(5)
+        return {"summary": {}, "details": []}
+
+    running = manager.submit(date(2022, 1, 1), date(2022, 12, 31), blocking_ingest)
+    queued = manager.submit(date(2023, 1, 1), date(2023, 12, 31), blocking_ingest)
+    _wait_for(manager, running.job_id, statuses=(JOB_RUNNING,))
+
+    manager.shutdown()
+    release.set()
+
+    # O job na fila não fica PENDENTE para sempre no armazenamento
+    cancelled = manager.get(queued.job_id)
+    assert cancelled.status == JOB_FAILED
+    assert "shut down" in cancelled.error
+    assert _wait_for(manager, running.job_id).status == JOB_SUCCEEDED
+
+
+def test_slow_store_does_not_block_other_jobs():
+    """Um salvamento lento no armazenamento segura apenas o job que está sendo salvo."""
+    slow_save = threading.Event()
+    release_save = threading.Event()
+
+    class SlowStore(InMemoryJobStore):
+        def save(self, job):
+            if job.start_date.year == 2022 and job.status == JOB_RUNNING and job.years[2022] == "SUCESSO":
+                slow_save.set()
+                release_save.wait(5)
+            super().save(job)
+
+    manager = IngestJobManager(SlowStore(), max_concurrent_jobs=2, max_queued_jobs=0)
+    slow = manager.submit(date(2022, 1, 1), date(2022, 12, 31), _fake_ingest)
+    assert slow_save.wait(5)
+
+    # Enquanto o job de 2022 salva, outro job é aceito e concluído
+    other = manager.submit(date(2023, 1, 1), date(2023, 12, 31), _fake_ingest)
+    assert _wait_for(manager, other.job_id).status == JOB_SUCCEEDED
+    release_save.set()
+    assert _wait_for(manager, slow.job_id).status == JOB_SUCCEEDED
+    manager.shutdown(wait=True)
@@ -0,0 +1,205 @@
+import asyncio
+import threading
+import time
+from functools import partial
+
+import pytest
+from prometheus_client import REGISTRY
+
+from api.core.ingest_pipeline import Finished, IngestPipeline, Parsed
+
+
+def _double(value):
+    """Etapa de leitura em nível de módulo, para poder rodar em outro processo."""
+    return value * 2
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = IngestPipeline(download_workers=2, parse_workers=1, upload_workers=1, queue_size=1)
+    yield pipeline
+    pipeline.shutdown()
+
+
+def test_task_goes_through_every_stage(pipeline):
+    future = pipeline.submit(download=lambda: 21, parse=_double, upload=lambda value: {"value": value})
+
+    assert future.result(timeout=5) == {"value": 42}
+
+
+def test_stage_can_finish_the_task_early(pipeline):
+    upload_calls = []
+
+    future = pipeline.submit(download=lambda: Finished("PULADO"), parse=_double, upload=upload_calls.append)
+
+    assert future.result(timeout=5) == "PULADO"
+    assert upload_calls == []
+
+
+def test_without_parse_the_download_goes_to_upload(pipeline):
+    future = pipeline.submit(download=lambda: "dados", upload=str.upper)
+
+    assert future.result(timeout=5) == "DADOS"
+
+
+def test_parsed_download_skips_the_parse_stage(pipeline):
+    future = pipeline.submit(download=lambda: Parsed(21), parse=_double, upload=lambda value: value)
+
+    assert future.result(timeout=5) == 21
+
+
+def test_stage_failure_resolves_the_future_with_the_error(pipeline):
+    def failing_parse(raw):
+        raise ValueError("CSV inválido")
+
+    failed = pipeline.submit(download=lambda: 1, parse=failing_parse, upload=lambda value: value)
+    other = pipeline.submit(download=lambda: 2, parse=_double, upload=lambda value: value)
+
+    with pytest.raises(ValueError, match="CSV inválido"):
+        failed.result(timeout=5)
+    # Os workers continuam atendendo as outras tarefas
+    assert other.result(timeout=5) == 4
+
+
+def test_upload_overlaps_with_downloads(pipeline):
+    upload_started = threading.Event()
+    release_upload = threading.Event()
+    downloads = []
+
+    def slow_upload(value):
+        upload_started.set()
+        release_upload.wait(5)
+        return value
+
+    first = pipeline.submit(download=lambda: 1, upload=slow_upload)
+    assert upload_started.wait(5)
+    # Enquanto o primeiro ano é enviado, o próximo já é baixado
+    second = pipeline.submit(download=lambda: downloads.append(2) or 2, upload=lambda value: value)
+    for _ in range(500):
+        if downloads:
+            break
+        time.sleep(0.01)
+    assert downloads == [2]
+    release_upload.set()
+    assert (first.result(timeout=5), second.result(timeout=5)) == (1, 2)
+
+
+def test_bounded_queues_hold_back_downloads(pipeline):
+    release_upload = threading.Event()
+    downloaded = []
+
+    def download(value):
+        downloaded.append(value)
+        return value
+
+    futures = [pipeline.submit(download=lambda value=value: download(value),
+                               upload=lambda value: release_upload.wait(5) and value)
+               for value in range(6)]
+    time.sleep(0.2)
+    # 1 enviando + 1 na fila de upload + 2 workers de download bloqueados na fila cheia
+    assert len(downloaded) == 4
+    release_upload.set()
+    assert [future.result(timeout=5) for future in futures] == list(range(6))
+
+
+def test_parse_in_processes():
+    pipeline = IngestPipeline(download_workers=1, parse_workers=1, upload_workers=1, parse_in_processes=True)
+    try:
+        future = pipeline.submit(download=lambda: 5, parse=_double, upload=lambda value: value)
+        assert future.result(timeout=30) == 10
+        # Os processos são iniciados com spawn, nunca com fork a partir das threads do servidor
+        assert pipeline._processes._mp_context.get_start_method() == "spawn"
+    finally:
+        pipeline.shutdown()
+
+
+def test_shutdown_can_cancel_pending_tasks():
+    pipeline = IngestPipeline(download_workers=1, parse_workers=1, upload_workers=1)
+    download_started = threading.Event()
+    release_download = threading.Event()
+
+    def slow_download():
+        download_started.set()
+        release_download.wait(5)
+        return 1
+
+    running = pipeline.submit(download=slow_download, upload=lambda value: value)
+    assert download_started.wait(5)
+    pending = pipeline.submit(download=lambda: 2, upload=lambda value: value)
+
+    threading.Timer(0.1, release_download.set).start()
+    pipeline.shutdown(cancel_pending=True)
+
+    # A tarefa em andamento termina; a que aguardava o download falha
+    assert running.result(timeout=5) == 1
+    with pytest.raises(RuntimeError, match="shut down"):
+        pending.result(timeout=5)
+
+
+def test_submit_after_shutdown_is_rejected():
+    pipeline = IngestPipeline()
+    pipeline.shutdown()
+
+    with pytest.raises(RuntimeError):
+        pipeline.submit(download=lambda: 1, upload=lambda value: value)
+
+
+def test_invalid_sizes_are_rejected():
+    with pytest.raises(ValueError):
+        IngestPipeline(parse_workers=0)
+
+
+def test_stage_times_are_recorded_per_label(pipeline):
+    before = {stage: REGISTRY.get_sample_value("basin_ingest_stage_seconds_count",
+                                               {"stage": stage, "year": "1999"}) or 0.0
+              for stage in ("download", "parse", "upload")}
+
+    pipeline.submit(download=lambda: 1, parse=_double, upload=lambda value: value, label="1999").result(timeout=5)
+
+    for stage, count in before.items():
+        assert REGISTRY.get_sample_value("basin_ingest_stage_seconds_count",
+                                         {"stage": stage, "year": "1999"}) == count + 1
+
+
+def test_coroutine_downloads_run_on_the_loop_bounded_by_the_download_workers():
+    pipeline = IngestPipeline(download_workers=2, parse_workers=1, upload_workers=1, queue_size=1)
+    state = {"in_flight": 0, "peak": 0, "closed": False}
+
+    async def download(value):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return value
+
+    async def close():
+        state["closed"] = True
+
+    pipeline.close_on_shutdown(close)
+    futures = [pipeline.submit(download=partial(download, value), parse=_double, upload=lambda value: value)
+               for value in range(6)]
+
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8, 10]
+    # Os downloads assíncronos respeitam o número de workers de download
+    assert state["peak"] == 2
+    pipeline.shutdown()
+    assert state["closed"]
+
+
+def test_shutdown_cancels_coroutine_downloads_waiting_for_a_slot():
+    pipeline = IngestPipeline(download_workers=1, parse_workers=1, upload_workers=1, queue_size=1)
+    started = threading.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(0.2)
+        return 1
+
+    running = pipeline.submit(download=slow, upload=lambda value: value)
+    waiting = pipeline.submit(download=slow, upload=lambda value: value)
+    started.wait(timeout=5)
+    pipeline.shutdown(cancel_pending=True)
+
+    assert running.result(timeout=5) == 1
+    with pytest.raises(RuntimeError, match="shut down"):
+        waiting.result(timeout=5)
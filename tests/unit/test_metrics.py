@@ -0,0 +1,41 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from api.core.metrics import CACHE_REQUESTS, INGEST_STAGE_SECONDS, record_cache_lookup, render_latest, timed
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_record_cache_lookup_counts_hits_and_misses():
+    hits = _sample("basin_cache_requests_total", cache="teste", result="hit")
+    misses = _sample("basin_cache_requests_total", cache="teste", result="miss")
+
+    record_cache_lookup("teste", True)
+    record_cache_lookup("teste", False)
+    record_cache_lookup("teste", False)
+
+    assert _sample("basin_cache_requests_total", cache="teste", result="hit") == hits + 1
+    assert _sample("basin_cache_requests_total", cache="teste", result="miss") == misses + 2
+
+
+def test_timed_observes_even_when_the_block_raises():
+    labels = {"stage": "parse", "year": "timed-test"}
+    before = _sample("basin_ingest_stage_seconds_count", **labels)
+
+    with pytest.raises(ValueError):
+        with timed(INGEST_STAGE_SECONDS, **labels):
+            raise ValueError("falha no parse")
+
+    assert _sample("basin_ingest_stage_seconds_count", **labels) == before + 1
+
+
+def test_render_latest_uses_the_prometheus_text_format():
+    CACHE_REQUESTS.labels(cache="render", result="hit").inc()
+
+    content, content_type = render_latest()
+
+    assert content_type.startswith("text/plain")
+    assert b'basin_cache_requests_total{cache="render",result="hit"}' in content
+    assert b"# TYPE basin_ingest_stage_seconds histogram" in content
@@ -1,10 +1,13 @@
 import pytest
 import httpx
 import pandas as pd
+from datetime import date
 from unittest.mock import MagicMock, patch
 
-from api.core.ons_client import ONSClient, ONS_API_URL, PACKAGE_ID
+from api.core.ons_client import DownloadedFile, ONSClient, ONS_API_URL, PACKAGE_ID, parse_downloaded_file
 from api.core.exceptions import ONSClientError, ONSResourceNotFoundError, ONSDataProcessingError
+from api.core.ons_metadata import ONSMetadataCache
+from api.core.row_hashing import content_fingerprint
 
 @pytest.fixture
 def mock_httpx_client():
@@ -17,7 +20,8 @@ def mock_httpx_client():
 @pytest.fixture
 def ons_client(mock_httpx_client):
     """Fixture que cria uma instância do ONSClient com cliente httpx mockado."""
-    return ONSClient()
+    # Cache isolado para que os metadados não vazem entre os testes
+    return ONSClient(metadata_cache=ONSMetadataCache())
 
 # Mock da resposta da API de metadados
 mock_metadata_response = {
@@ -40,7 +44,7 @@ def test_get_data_for_year_success(ons_client, mock_httpx_client):
     
     mock_csv_data = MagicMock()
     mock_csv_data.status_code = 200
-    mock_csv_data.text = "ena_data;nom_bacia\n2023-01-01;SUDESTE"
+    mock_csv_data.content = b"ena_data;nom_bacia\n2023-01-01;SUDESTE"
     
     mock_httpx_client.get.side_effect = [mock_metadata, mock_csv_data]
 
@@ -50,6 +54,50 @@ def test_get_data_for_year_success(ons_client, mock_httpx_client):
     assert df.iloc[0]['nom_bacia'] == 'SUDESTE'
     assert mock_httpx_client.get.call_count == 2
 
+def test_get_data_for_year_typed_columns(ons_client, mock_httpx_client):
+    """
+    Testa se o CSV é convertido direto para tipos nativos, incluindo decimais com vírgula.
+    """
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_csv_data = MagicMock()
+    mock_csv_data.content = (
+        b"nom_bacia;ena_data;ena_bruta_bacia_mwmed;ena_bruta_bacia_percentualmlt\n"
+        b"SUDESTE;2023-01-01;1234,5;98.7\n"
+        b"SUL;2023-01-02;;\n"
+    )
+    mock_httpx_client.get.side_effect = [mock_metadata, mock_csv_data]
+
+    df = ons_client.get_data_for_year(2023)
+
+    assert df.iloc[0]['ena_data'] == date(2023, 1, 1)
+    assert df.iloc[0]['ena_bruta_bacia_mwmed'] == 1234.5
+    assert df.iloc[0]['ena_bruta_bacia_percentualmlt'] == 98.7
+    assert pd.isna(df.iloc[1]['ena_bruta_bacia_mwmed'])
+    assert df['nom_bacia'].dtype == 'category'
+    # A impressão digital do conteúdo é calculada durante o parse
+    assert df.attrs['content_fingerprint'] == content_fingerprint(df)
+
+def test_get_data_for_year_invalid_value(ons_client, mock_httpx_client):
+    """
+    Testa se uma medida que não é número vira nulo sem falhar o ano, e se uma data
+    inválida ainda levanta ONSDataProcessingError.
+    """
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_csv_data = MagicMock()
+    mock_csv_data.content = b"nom_bacia;ena_data;ena_bruta_bacia_mwmed\nSUL;2023-01-01;abc\nSUL;2023-01-02;2,5\n"
+    mock_bad_date = MagicMock()
+    mock_bad_date.content = b"nom_bacia;ena_data;ena_bruta_bacia_mwmed\nSUL;ontem;1\n"
+    mock_httpx_client.get.side_effect = [mock_metadata, mock_csv_data, mock_bad_date]
+
+    df = ons_client.get_data_for_year(2023)
+
+    assert pd.isna(df.iloc[0]['ena_bruta_bacia_mwmed'])
+    assert df.iloc[1]['ena_bruta_bacia_mwmed'] == 2.5
+    with pytest.raises(ONSDataProcessingError, match="Failed to parse"):
+        ons_client.get_data_for_year(2023)
+
 def test_get_csv_url_resource_not_found(ons_client, mock_httpx_client):
     """
     Testa se ONSResourceNotFoundError é levantado quando o ano não é encontrado nos metadados.
@@ -82,4 +130,260 @@ def test_network_error_on_csv_download(ons_client, mock_httpx_client):
     mock_httpx_client.get.side_effect = [mock_metadata, httpx.RequestError("Network error")]
 
     with pytest.raises(ONSDataProcessingError, match="Network failure while downloading data"):
-        ons_client.get_data_for_year(2023)
\ No newline at end of file
+        ons_client.get_data_for_year(2023)
+
+def test_metadata_is_fetched_once_for_many_years(ons_client, mock_httpx_client):
+    """
+    Testa se o índice de recursos é montado uma única vez e reutilizado para vários anos.
+    """
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_httpx_client.get.return_value = mock_metadata
+
+    assert ons_client.get_resource_for_year(2022).url == "http://example.com/2022.csv"
+    assert ons_client.get_resource_for_year(2023).url == "http://example.com/2023.csv"
+    mock_httpx_client.get.assert_called_once_with(ONS_API_URL, params={"id": PACKAGE_ID})
+
+def _mock_stream(mock_httpx_client, chunks):
+    """Configura o mock de `client.stream` para devolver os blocos de bytes informados."""
+    mock_response = MagicMock()
+    mock_response.iter_bytes.return_value = iter(chunks)
+    mock_httpx_client.stream.return_value.__enter__.return_value = mock_response
+    return mock_response
+
+def test_get_data_for_year_streaming(mock_httpx_client):
+    """
+    Testa o modo streaming: o CSV chega em blocos quebrados no meio das linhas.
+    """
+    client = ONSClient(metadata_cache=ONSMetadataCache(), streaming=True, chunk_size=64)
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_httpx_client.get.return_value = mock_metadata
+    mock_response = _mock_stream(mock_httpx_client, [b"nom_bacia;ena_da", b"ta\nSUDESTE;2023-0", b"1-01\nSUL;2023-01-02\n"])
+
+    df = client.get_data_for_year(2023)
+
+    assert list(df['nom_bacia']) == ['SUDESTE', 'SUL']
+    assert list(df['ena_data']) == [date(2023, 1, 1), date(2023, 1, 2)]
+    mock_httpx_client.stream.assert_called_once_with("GET", "http://example.com/2023.csv")
+    mock_response.iter_bytes.assert_called_once_with(64)
+
+def test_streaming_parse_error(mock_httpx_client):
+    """
+    Testa se um CSV malformado no modo streaming levanta ONSDataProcessingError.
+    """
+    client = ONSClient(metadata_cache=ONSMetadataCache(), streaming=True)
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_httpx_client.get.return_value = mock_metadata
+    _mock_stream(mock_httpx_client, [b"nom_bacia;ena_data\nSUL;2023-01-01;extra\n"])
+
+    with pytest.raises(ONSDataProcessingError, match="Failed to parse"):
+        client.get_data_for_year(2023)
+
+def test_get_data_for_year_offline_cache(tmp_path):
+    """
+    Testa a reexecução offline: metadados e CSV vêm do cache em disco, sem rede.
+    """
+    import json
+    from api.core.http_cache import HTTPDiskCache
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        return httpx.Response(200, content=b"ena_data;nom_bacia\n2023-01-01;SUDESTE")
+
+    online = ONSClient(metadata_cache=ONSMetadataCache(), http_cache=HTTPDiskCache(str(tmp_path)))
+    online.client = httpx.Client(transport=httpx.MockTransport(handler))
+    online.get_data_for_year(2023)
+
+    offline = ONSClient(metadata_cache=ONSMetadataCache(), http_cache=HTTPDiskCache(str(tmp_path), offline=True))
+    offline.client = MagicMock()
+
+    df = offline.get_data_for_year(2023)
+
+    assert df.iloc[0]['nom_bacia'] == 'SUDESTE'
+    offline.client.stream.assert_not_called()
+    # A cópia lida pelo parse é removida; o corpo continua no cache
+    assert list((tmp_path / "checkout").iterdir()) == []
+    assert offline.http_cache.get_cached_path("http://example.com/2023.csv").exists()
+    with pytest.raises(ONSClientError):
+        offline.get_data_for_year(2022)
+
+def test_cache_hits_are_counted_in_download_bytes(tmp_path):
+    """
+    Testa se os bytes servidos pelo cache HTTP também entram na métrica de download.
+    """
+    import json
+    from prometheus_client import REGISTRY
+    from api.core.http_cache import HTTPDiskCache
+
+    body = b"ena_data;nom_bacia\n2023-01-01;SUDESTE"
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        if request.headers.get("If-None-Match"):
+            return httpx.Response(304)
+        return httpx.Response(200, content=body, headers={"ETag": '"v1"'})
+
+    client = ONSClient(metadata_cache=ONSMetadataCache(), http_cache=HTTPDiskCache(str(tmp_path)))
+    client.client = httpx.Client(transport=httpx.MockTransport(handler))
+    before = REGISTRY.get_sample_value("basin_ons_download_bytes_total", {"year": "2023"}) or 0.0
+
+    client.get_data_for_year(2023)
+    client.get_data_for_year(2023)  # 304: lido do cache
+
+    assert REGISTRY.get_sample_value("basin_ons_download_bytes_total", {"year": "2023"}) == before + 2 * len(body)
+
+def test_get_data_for_year_resumable_download(tmp_path):
+    """
+    Testa o download retomável: o arquivo temporário é removido após o parse.
+    """
+    import json
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        return httpx.Response(200, content=b"ena_data;nom_bacia\n2023-01-01;SUDESTE")
+
+    client = ONSClient(metadata_cache=ONSMetadataCache(), download_dir=str(tmp_path))
+    client.client = client.downloader.client = httpx.Client(transport=httpx.MockTransport(handler))
+
+    df = client.get_data_for_year(2023)
+
+    assert df.iloc[0]['nom_bacia'] == 'SUDESTE'
+    assert list(tmp_path.iterdir()) == []
+
+def test_resumable_download_retries_server_errors(tmp_path):
+    """
+    Testa se o download retomável também repete respostas 5xx, como os outros caminhos.
+    """
+    import json
+    failures = [httpx.Response(503)]
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        if failures:
+            return failures.pop(0)
+        return httpx.Response(200, content=b"ena_data;nom_bacia\n2023-01-01;SUDESTE")
+
+    client = _retrying_client(handler, download_dir=str(tmp_path))
+    client.downloader.client = client.client
+
+    df = client.get_data_for_year(2023)
+
+    assert df.iloc[0]['nom_bacia'] == 'SUDESTE'
+    assert failures == []
+
+def test_download_year_does_not_parse(ons_client, mock_httpx_client):
+    """
+    Testa se a etapa de download devolve o CSV bruto, sem convertê-lo.
+    """
+    mock_metadata = MagicMock()
+    mock_metadata.json.return_value = mock_metadata_response
+    mock_csv_data = MagicMock()
+    mock_csv_data.content = b"ena_data;nom_bacia\n2023-01-01;SUDESTE"
+    mock_httpx_client.get.side_effect = [mock_metadata, mock_csv_data]
+
+    download = ons_client.download_year(2023)
+
+    assert download == DownloadedFile(2023, content=mock_csv_data.content)
+    df = parse_downloaded_file(download)
+    assert df.iloc[0]['nom_bacia'] == 'SUDESTE'
+    assert df.attrs['content_fingerprint'] == content_fingerprint(df)
+
+def test_parse_downloaded_file_deletes_temporary_file(tmp_path):
+    csv_path = tmp_path / "2023.csv"
+    csv_path.write_bytes(b"ena_data;nom_bacia\n2023-01-01;SUL")
+
+    df = parse_downloaded_file(DownloadedFile(2023, path=str(csv_path), temporary=True))
+
+    assert len(df) == 1
+    assert not csv_path.exists()
+
+def test_parse_downloaded_file_invalid_content():
+    with pytest.raises(ONSDataProcessingError):
+        parse_downloaded_file(DownloadedFile(2023, content=b"coluna;outra\n1;2"))
+
+def _retrying_client(handler, **kwargs):
+    """ONSClient com transporte simulado e sem espera entre as tentativas."""
+    return ONSClient(metadata_cache=ONSMetadataCache(), backoff_base=0,
+                     http_client=httpx.Client(transport=httpx.MockTransport(handler)), **kwargs)
+
+def test_download_retries_server_errors_and_timeouts():
+    """
+    Testa se erros 5xx e timeouts são repetidos até o download funcionar.
+    """
+    import json
+    failures = [httpx.Response(503), httpx.ReadTimeout("lento")]
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        if failures:
+            failure = failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+        return httpx.Response(200, content=b"ena_data;nom_bacia\n2023-01-01;SUL")
+
+    df = _retrying_client(handler).get_data_for_year(2023)
+
+    assert df.iloc[0]['nom_bacia'] == 'SUL'
+    assert failures == []
+
+def test_download_gives_up_after_max_retries():
+    """
+    Testa se, esgotadas as tentativas, o erro chega na hierarquia ONSClientError.
+    """
+    import json
+    calls = []
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        calls.append(request)
+        return httpx.Response(500)
+
+    with pytest.raises(ONSDataProcessingError):
+        _retrying_client(handler, max_retries=2).download_year(2023)
+    assert len(calls) == 3
+
+def test_stream_year_hands_batches_and_retries_from_start():
+    """
+    Testa se stream_year entrega os lotes ao consumidor e, após uma falha, recomeça
+    o download com um novo iterador.
+    """
+    import json
+    failures = [httpx.Response(503)]
+
+    def handler(request):
+        if str(request.url).startswith(ONS_API_URL):
+            return httpx.Response(200, content=json.dumps(mock_metadata_response).encode())
+        if failures:
+            return failures.pop(0)
+        return httpx.Response(200, content=b"nom_bacia;ena_data;ena_bruta_bacia_mwmed\nSUL;2023-01-01;1,5\n")
+
+    client = _retrying_client(handler, streaming=True)
+    rows = client.stream_year(2023, lambda batches: [row for batch in batches
+                                                     for row in batch.column('ena_bruta_bacia_mwmed').to_pylist()])
+
+    assert client.streams_batches
+    assert rows == [1.5]
+    assert failures == []
+
+def test_client_errors_are_not_retried():
+    """
+    Testa se erros 4xx não são repetidos e viram ONSClientError.
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404)
+
+    with pytest.raises(ONSClientError):
+        _retrying_client(handler).get_resource_for_year(2023)
+    assert len(calls) == 1
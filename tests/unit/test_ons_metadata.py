@@ -0,0 +1,62 @@
+import threading
+from unittest.mock import MagicMock
+
+from api.core.ons_metadata import ONSMetadataCache, ONSResource, build_resource_index
+
+mock_resources = [
+    {"name": "ENA_DIARIO_BACIAS_2022", "format": "CSV", "url": "http://example.com/2022.csv",
+     "last_modified": "2023-01-02T10:00:00", "size": 1024, "hash": "abc"},
+    {"name": "ENA_DIARIO_BACIAS_2022", "format": "PARQUET", "url": "http://example.com/2022.parquet"},
+    {"name": "ENA_DIARIO_BACIAS_2023", "format": "csv", "url": "http://example.com/2023.csv"},
+]
+
+def test_build_resource_index_only_csv_resources():
+    index = build_resource_index(mock_resources)
+
+    assert set(index) == {2022, 2023}
+    assert index[2022].url == "http://example.com/2022.csv"
+    assert index[2022].size == 1024
+
+def test_resource_signature():
+    index = build_resource_index(mock_resources)
+
+    assert index[2022].signature == {
+        "url": "http://example.com/2022.csv", "last_modified": "2023-01-02T10:00:00", "size": "1024", "hash": "abc"
+    }
+    # Sem informações de versão, não há assinatura para comparar
+    assert index[2023].signature is None
+    assert ONSResource(year=2024, url="u", size=0).signature is not None
+
+def test_cache_reuses_index_within_ttl():
+    cache = ONSMetadataCache(ttl_seconds=60)
+    loader = MagicMock(return_value=mock_resources)
+
+    cache.get_index(loader)
+    cache.get_index(loader)
+
+    loader.assert_called_once()
+
+def test_cache_refreshes_after_ttl_and_clear():
+    cache = ONSMetadataCache(ttl_seconds=0)
+    loader = MagicMock(return_value=mock_resources)
+
+    cache.get_index(loader)
+    cache.get_index(loader)
+    assert loader.call_count == 2
+
+    cache.ttl_seconds = 60
+    cache.clear()
+    cache.get_index(loader)
+    assert loader.call_count == 3
+
+def test_cache_concurrent_callers_share_one_fetch():
+    cache = ONSMetadataCache(ttl_seconds=60)
+    loader = MagicMock(return_value=mock_resources)
+
+    threads = [threading.Thread(target=cache.get_index, args=(loader,)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    loader.assert_called_once()
@@ -0,0 +1,30 @@
+from datetime import date
+
+import pytest
+
+from api.core.exceptions import InvalidCursorError
+from api.core.pagination import PageKey, decode_cursor, encode_cursor
+
+START, END = date(2023, 1, 1), date(2023, 12, 31)
+
+
+def test_cursor_round_trip():
+    key = PageKey(date(2023, 5, 2), "SÃO FRANCISCO")
+
+    cursor = encode_cursor(key, START, END)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, START, END) == key
+
+
+@pytest.mark.parametrize("cursor", ["", "não-é-base64", "e30", "eyJkIjoiMjAyMy0xMy0wMSJ9"])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, START, END)
+
+
+def test_decode_cursor_rejects_other_range():
+    cursor = encode_cursor(PageKey(date(2023, 5, 2), "SUL"), START, END)
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, START, date(2024, 1, 1))
@@ -0,0 +1,110 @@
+import io
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from api.core.parquet_profiles import PARQUET_PROFILES, ParquetWriterProfile, get_parquet_profile
+from api.models.arrow_schema import to_basin_table
+from api.repositories.basin_repository import BasinRepository
+
+
+@pytest.fixture
+def basin_df():
+    return pd.DataFrame({
+        'nom_bacia': ['SUL', 'GRANDE', 'SUL', 'GRANDE'],
+        'ena_data': [date(2023, 1, 2), date(2023, 1, 2), date(2023, 1, 1), date(2023, 1, 1)],
+        'ena_bruta_bacia_mwmed': [1.0, 2.0, 3.0, 4.0],
+    })
+
+
+def test_get_parquet_profile_default_and_unknown():
+    assert get_parquet_profile() is PARQUET_PROFILES["balanced"]
+    assert get_parquet_profile("archive").compression_level == 9
+    with pytest.raises(ValueError):
+        get_parquet_profile("inexistente")
+
+
+def test_prepare_table_sorts_by_date_then_basin(basin_df):
+    table = get_parquet_profile().prepare_table(to_basin_table(basin_df))
+
+    assert table['ena_data'].to_pylist() == [date(2023, 1, 1)] * 2 + [date(2023, 1, 2)] * 2
+    assert table['nom_bacia'].cast('string').to_pylist() == ['GRANDE', 'SUL', 'GRANDE', 'SUL']
+    assert table['ena_bruta_bacia_mwmed'].to_pylist() == [4.0, 3.0, 2.0, 1.0]
+
+
+def test_legacy_profile_keeps_row_order(basin_df):
+    table = to_basin_table(basin_df)
+    assert PARQUET_PROFILES["legacy"].prepare_table(table).equals(table)
+
+
+def test_iter_row_groups_matches_prepare_table(basin_df):
+    profile = ParquetWriterProfile(name="test", row_group_size=3)
+    table = to_basin_table(basin_df)
+
+    batches = list(profile.iter_row_groups(table))
+
+    # Um row group ordenado por vez, no tamanho do perfil
+    assert [batch.num_rows for batch in batches] == [3, 1]
+    assert pa.Table.from_batches(batches).equals(profile.prepare_table(table))
+
+
+def test_iter_row_groups_slices_sorted_table_without_copying(basin_df):
+    profile = ParquetWriterProfile(name="test", row_group_size=2)
+    table = profile.prepare_table(to_basin_table(basin_df))
+
+    batches = list(profile.iter_row_groups(table))
+
+    # Já ordenada, os row groups são fatias que compartilham os buffers da tabela
+    source = table.column('ena_bruta_bacia_mwmed').chunk(0).buffers()[1].address
+    assert batches[0].column('ena_bruta_bacia_mwmed').buffers()[1].address == source
+    assert pa.Table.from_batches(batches).equals(table)
+
+
+def test_regroup_batches_sorts_each_row_group(basin_df):
+    profile = ParquetWriterProfile(name="test", row_group_size=3)
+    batches = to_basin_table(basin_df).to_batches(max_chunksize=1)
+
+    groups = list(profile.regroup_batches(iter(batches)))
+
+    # Lotes de uma linha agrupados no tamanho do perfil, cada grupo ordenado por data
+    assert [group.num_rows for group in groups] == [3, 1]
+    assert groups[0].column('ena_data').to_pylist() == [date(2023, 1, 1), date(2023, 1, 2), date(2023, 1, 2)]
+    assert groups[1].column('ena_data').to_pylist() == [date(2023, 1, 1)]
+
+
+@pytest.mark.parametrize("name", list(PARQUET_PROFILES))
+def test_profiles_write_readable_files(name, basin_df):
+    profile = PARQUET_PROFILES[name]
+    buffer = io.BytesIO()
+    pq.write_table(profile.prepare_table(to_basin_table(basin_df)), buffer,
+                   row_group_size=profile.row_group_size, **profile.writer_kwargs())
+
+    metadata = pq.ParquetFile(io.BytesIO(buffer.getvalue())).metadata
+    column = metadata.row_group(0).column(1)
+    assert metadata.num_rows == 4
+    assert column.compression.lower() == profile.compression
+    assert column.is_stats_set == profile.write_statistics
+
+
+def test_row_groups_allow_date_pruning(basin_df):
+    profile = ParquetWriterProfile(name="test", row_group_size=2)
+    buffer = io.BytesIO()
+    pq.write_table(profile.prepare_table(to_basin_table(basin_df)), buffer,
+                   row_group_size=profile.row_group_size, **profile.writer_kwargs())
+
+    metadata = pq.ParquetFile(io.BytesIO(buffer.getvalue())).metadata
+    # Ordenado por data, cada row group cobre um único dia
+    ranges = [(metadata.row_group(i).column(1).statistics.min, metadata.row_group(i).column(1).statistics.max)
+              for i in range(metadata.num_row_groups)]
+    assert ranges == [(date(2023, 1, 1), date(2023, 1, 1)), (date(2023, 1, 2), date(2023, 1, 2))]
+
+
+def test_basin_repository_uses_profile(tmp_path, basin_df):
+    repo = BasinRepository(base_dir=str(tmp_path), parquet_profile=PARQUET_PROFILES["archive"])
+    repo.save_dataframe_for_ingestion(basin_df, 2023, date(2023, 10, 26))
+
+    path = tmp_path / "2023-10-26" / "basin_data_2023.parquet"
+    assert pq.ParquetFile(path).metadata.row_group(0).column(0).compression == "ZSTD"
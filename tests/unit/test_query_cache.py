@@ -0,0 +1,93 @@
+from datetime import date
+import pytest
+from prometheus_client import REGISTRY
+
+from api.core.query_cache import QueryCacheKey, QueryResultCache, estimate_result_size
+from api.models.basin import BasinSilverData
+
+
+def _result(rows):
+    items = [BasinSilverData(nom_bacia="SUL", ena_data=date(2023, 1, 1), ena_bruta_bacia_mwmed=float(i))
+             for i in range(rows)]
+    return {"total_items": rows, "items_on_page": rows, "items": items}
+
+
+def _key(start_year, end_year, page=1):
+    return QueryCacheKey(date(start_year, 1, 1), date(end_year, 12, 31), page, 100, None, True)
+
+
+def test_get_counts_hits_and_misses():
+    cache = QueryResultCache(max_bytes=1024 ** 2, ttl_seconds=60)
+    result = _result(2)
+
+    assert cache.get(_key(2023, 2023)) is None
+    cache.put(_key(2023, 2023), result)
+
+    assert cache.get(_key(2023, 2023)) is result
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+    assert stats["entries"] == 1
+    assert stats["current_bytes"] == estimate_result_size(result)
+
+
+def test_size_bound_evicts_least_recently_used():
+    entry_size = estimate_result_size(_result(10))
+    cache = QueryResultCache(max_bytes=entry_size * 2, ttl_seconds=60)
+    cache.put(_key(2020, 2020), _result(10))
+    cache.put(_key(2021, 2021), _result(10))
+    # Acessar 2020 torna 2021 o menos recentemente usado
+    cache.get(_key(2020, 2020))
+
+    cache.put(_key(2022, 2022), _result(10))
+
+    assert cache.get(_key(2021, 2021)) is None
+    assert cache.get(_key(2020, 2020)) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_result_larger_than_cache_is_not_stored():
+    cache = QueryResultCache(max_bytes=100, ttl_seconds=60)
+
+    cache.put(_key(2023, 2023), _result(5))
+
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_ttl():
+    now = [1000.0]
+    cache = QueryResultCache(max_bytes=1024 ** 2, ttl_seconds=10, timer=lambda: now[0])
+    cache.put(_key(2023, 2023), _result(1))
+    now[0] = 1011.0
+
+    assert cache.get(_key(2023, 2023)) is None
+    # Expiração não conta como despejo por falta de espaço
+    assert cache.stats()["evictions"] == 0
+
+
+def test_invalidate_years_drops_overlapping_ranges():
+    cache = QueryResultCache(max_bytes=1024 ** 2, ttl_seconds=60)
+    cache.put(_key(2021, 2022), _result(1))
+    cache.put(_key(2022, 2022, page=2), _result(1))
+    cache.put(_key(2023, 2024), _result(1))
+
+    dropped = cache.invalidate_years([2022])
+
+    assert dropped == 2
+    assert cache.get(_key(2023, 2024)) is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_query_result_cache_requires_positive_bounds():
+    with pytest.raises(ValueError):
+        QueryResultCache(max_bytes=0)
+
+
+def test_lookups_are_exported_as_metrics():
+    cache = QueryResultCache(max_bytes=1024 ** 2, ttl_seconds=60)
+    labels = {"cache": "query_result", "result": "hit"}
+    hits = REGISTRY.get_sample_value("basin_cache_requests_total", labels) or 0.0
+    cache.put(_key(2023, 2023), _result(1))
+
+    cache.get(_key(2023, 2023))
+
+    assert REGISTRY.get_sample_value("basin_cache_requests_total", labels) == hits + 1
@@ -0,0 +1,97 @@
+import hashlib
+import httpx
+import pytest
+
+from api.core.resumable_download import ResumableDownloader
+from api.core.exceptions import ONSDataProcessingError
+
+CONTENT = b"ena_data;nom_bacia\n" + b"2023-01-01;SUDESTE\n" * 100
+
+class DroppingStream(httpx.SyncByteStream):
+    """Corpo de resposta que entrega parte dos bytes e então derruba a conexão."""
+
+    def __init__(self, data, drop_after):
+        self.data = data
+        self.drop_after = drop_after
+
+    def __iter__(self):
+        yield self.data[:self.drop_after]
+        raise httpx.ReadError("connection dropped")
+
+class RangeServer:
+    """Servidor simulado com suporte a Range/If-Range que cai nas primeiras N respostas."""
+
+    def __init__(self, content, drops=1, drop_after=100, etag='"v1"'):
+        self.content = content
+        self.drops = drops
+        self.drop_after = drop_after
+        self.etag = etag
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        start = 0
+        status = 200
+        range_header = request.headers.get("Range")
+        if range_header and request.headers.get("If-Range") == self.etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            status = 206
+        body = self.content[start:]
+        headers = {"ETag": self.etag, "Content-Length": str(len(body))}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{len(self.content) - 1}/{len(self.content)}"
+        if self.drops:
+            self.drops -= 1
+            return httpx.Response(status, headers=headers, stream=DroppingStream(body, self.drop_after))
+        return httpx.Response(status, headers=headers, content=body)
+
+def make_downloader(tmp_path, server, **kwargs):
+    client = httpx.Client(transport=httpx.MockTransport(server.handler))
+    return ResumableDownloader(client, str(tmp_path), retry_delay=0, **kwargs)
+
+def test_download_resumes_after_connection_drop(tmp_path):
+    server = RangeServer(CONTENT, drops=2, drop_after=100)
+    downloader = make_downloader(tmp_path, server)
+
+    path = downloader.download("http://ons/2023.csv", expected_hash=hashlib.md5(CONTENT).hexdigest())
+
+    assert path.read_bytes() == CONTENT
+    assert "Range" not in server.requests[0].headers
+    assert server.requests[1].headers["Range"] == "bytes=100-"
+    assert server.requests[2].headers["Range"] == "bytes=200-"
+    assert not list(tmp_path.glob("*.part*"))
+
+def test_partial_download_survives_failed_call(tmp_path):
+    server = RangeServer(CONTENT, drops=2, drop_after=50)
+    downloader = make_downloader(tmp_path, server, max_attempts=2)
+
+    with pytest.raises(httpx.ReadError):
+        downloader.download("http://ons/2023.csv")
+
+    # Uma nova chamada continua do checkpoint em disco
+    path = make_downloader(tmp_path, server).download("http://ons/2023.csv")
+
+    assert path.read_bytes() == CONTENT
+    assert server.requests[-1].headers["Range"] == "bytes=100-"
+
+def test_changed_file_restarts_download(tmp_path):
+    server = RangeServer(CONTENT, drops=1, drop_after=100)
+    downloader = make_downloader(tmp_path, server, max_attempts=1)
+    with pytest.raises(httpx.ReadError):
+        downloader.download("http://ons/2023.csv")
+
+    new_content = CONTENT.replace(b"SUDESTE", b"SUL")
+    server.content = new_content
+    server.etag = '"v2"'
+
+    path = make_downloader(tmp_path, server).download("http://ons/2023.csv")
+
+    assert path.read_bytes() == new_content
+
+def test_integrity_check_failure(tmp_path):
+    server = RangeServer(CONTENT, drops=0)
+    downloader = make_downloader(tmp_path, server)
+
+    with pytest.raises(ONSDataProcessingError, match="checksum mismatch"):
+        downloader.download("http://ons/2023.csv", expected_hash="0" * 32)
+    assert not list(tmp_path.glob("*.part*"))
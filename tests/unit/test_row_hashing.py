@@ -0,0 +1,69 @@
+from datetime import date
+
+import pandas as pd
+
+from api.core.row_hashing import build_row_index, compute_row_delta, content_fingerprint, row_hashes
+
+def make_df(rows):
+    return pd.DataFrame(rows, columns=['nom_bacia', 'ena_data', 'ena_bruta_bacia_mwmed', 'ena_armazenavel_bacia_mwmed'])
+
+base_df = make_df([
+    ['GRANDE', date(2025, 1, 1), 100.0, 50.0],
+    ['GRANDE', date(2025, 1, 2), 110.0, 55.0],
+    ['PARANA', date(2025, 1, 1), 200.0, None],
+])
+
+def test_row_hashes_are_deterministic_and_value_sensitive():
+    first = row_hashes(base_df)
+    second = row_hashes(base_df.copy())
+    changed = base_df.copy()
+    changed.loc[0, 'ena_bruta_bacia_mwmed'] = 101.0
+
+    assert list(first) == list(second)
+    assert row_hashes(changed)[0] != first[0]
+    assert row_hashes(changed)[1] == first[1]
+
+def test_compute_row_delta_without_previous_index():
+    delta = compute_row_delta(base_df, None)
+
+    assert (delta.inserted, delta.updated, delta.unchanged) == (3, 0, 0)
+    assert len(delta.changed_rows) == 3
+    assert len(delta.index) == 3
+
+def test_compute_row_delta_classifies_rows():
+    previous_index = build_row_index(base_df)
+    new_df = make_df([
+        ['GRANDE', date(2025, 1, 1), 100.0, 50.0],   # inalterada
+        ['GRANDE', date(2025, 1, 2), 111.0, 55.0],   # alterada
+        ['PARANA', date(2025, 1, 1), 200.0, None],   # inalterada (com nulo)
+        ['GRANDE', date(2025, 1, 3), 120.0, 60.0],   # nova
+    ])
+
+    delta = compute_row_delta(new_df, previous_index)
+
+    assert (delta.inserted, delta.updated, delta.unchanged) == (1, 1, 2)
+    assert list(delta.changed_rows['ena_data']) == [date(2025, 1, 2), date(2025, 1, 3)]
+    assert len(delta.index) == 4
+
+def test_compute_row_delta_keeps_missing_keys_in_index():
+    previous_index = build_row_index(base_df)
+    new_df = base_df.iloc[:1]
+
+    delta = compute_row_delta(new_df, previous_index)
+
+    assert delta.changed_rows.empty
+    assert len(delta.index) == 3
+
+def test_content_fingerprint_ignores_row_order_and_dtypes():
+    shuffled = base_df.iloc[[2, 0, 1]].reset_index(drop=True)
+    shuffled['nom_bacia'] = shuffled['nom_bacia'].astype('category')
+    shuffled['ena_data'] = pd.to_datetime(shuffled['ena_data'])
+
+    assert content_fingerprint(shuffled) == content_fingerprint(base_df)
+
+def test_content_fingerprint_detects_changed_values():
+    changed = base_df.copy()
+    changed.loc[2, 'ena_armazenavel_bacia_mwmed'] = 0.0
+
+    assert content_fingerprint(changed) != content_fingerprint(base_df)
+    assert content_fingerprint(base_df.iloc[:2]) != content_fingerprint(base_df)